@@ -1,34 +1,20 @@
 import sqlite3
 
-dbname = 'MEO.db'
-conn = sqlite3.connect(dbname)
-cur = conn.cursor()
+from db import db_path
+from db_migrate import current_version, migrate
 
-# MEOテーブルの作成
-#cur.execute('''
-#    CREATE TABLE IF NOT EXISTS MEO (
-#        id INTEGER NOT NULL,
-#        cache_key TEXT NOT NULL,
-#        media_url TEXT,
-#        posted DATETIME,
-#        created DATETIME DEFAULT (DATETIME(CURRENT_TIMESTAMP,'localtime')),
-#        PRIMARY KEY (id, cache_key)
-#    )
-#    ''')
+dbname = db_path()
+conn = sqlite3.connect(dbname, isolation_level=None)
 
-cur.execute('''
-        CREATE TABLE IF NOT EXISTS MEO (
-            user_name TEXT,
-            cache_key TEXT,
-            media_url TEXT,
-            created DATETIME DEFAULT (DATETIME(CURRENT_TIMESTAMP,'localtime')),
-            PRIMARY KEY (user_name, cache_key)
-        )
-    ''')
+# テーブルの作成・更新はマイグレーション（db_migrate.py）で行う
+# 既存のDBに対して実行しても、未適用の変更のみ適用される
+#   1: MEO(user_name, cache_key, media_url, datetime_value, created) と created の索引
+#   2: 旧スキーマへの datetime_value 列の追加
+#   3: 重複チェック用の索引 (user_name, datetime_value, cache_key)
+#   4-10: ACCOUNT_VISIT / PROFILE_HEALTH / PUBLISH_JOB / POST_META / GRID_FINGERPRINT / MEDIA_INDEX / IMAGE_PHASH
+#   11-12: SELECTOR_STATS（説明文セレクタの的中率）
+#   13: IMAGE_PHASH への内容のハッシュ列の追加
+applied = migrate(conn)
+print(f'適用したマイグレーション: {applied or "なし"} / スキーマバージョン: {current_version(conn)}')
 
-# インデックスの作成
-# cur.execute('CREATE INDEX IF NOT EXISTS idx_meo_posted ON MEO(posted)')
-cur.execute('CREATE INDEX IF NOT EXISTS idx_meo_created ON MEO(created)')
-
-conn.commit()
-conn.close()
\ No newline at end of file
+conn.close()
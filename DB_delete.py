@@ -6,6 +6,8 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from pathlib import Path
 
+from media_store import purge_media_older_than
+
 load_dotenv()
 
 def setup_logger():
@@ -167,8 +169,13 @@ def cleanup_old_logs(logger):
 # 7日前
 def cleanup_old_medias(logger):   
     try:
-        # media_bkディレクトリのパスを取得
+        # ストアのメディアは索引（MEDIA_INDEX）の取得日時で削除する
+        purge_media_older_than(7, logger)
+
+        # media_bkディレクトリのパスを取得（ストア導入前のファイル・ストア未登録のファイル）
         media_bk_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media', 'media_bk')
+        if not os.path.exists(media_bk_dir):
+            return True
         logger.info(f'メディアバックアップのクリーンアップを開始: {media_bk_dir}')
         
         # 現在の日時と1ヶ月前の日時を取得
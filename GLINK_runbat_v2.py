@@ -1,7 +1,9 @@
+import argparse
 import logging
 import os
-import subprocess
+import queue
 import sys
+import threading
 import time
 import shutil
 from datetime import datetime
@@ -9,8 +11,30 @@ from enum import Enum
 from pathlib import Path
 from dotenv import load_dotenv
 
+# 自作モジュールのインポート
+from account_scheduler import ProfileThrottle, plan_cycle, record_visit
+from chrome_lease import reclaim_stale_leases
+from job_registry import get_account_settings, registry
+from media_store import release_working_file
+from process_supervisor import run_supervised
+from profile_health import get_quarantine_until, wait_for_available_profile
+from publish_queue import (
+    claim_next_job,
+    complete_job,
+    count_pending_jobs,
+    enqueue_publish_jobs,
+    fail_job,
+    recover_running_jobs,
+)
+
 load_dotenv()
 
+# 子スクリプトのタイムアウト（秒）
+SCRIPT_TIMEOUT = int(os.getenv("SCRIPT_TIMEOUT_SECONDS") or "1800")
+
+# 投稿ジョブがない場合の確認間隔（秒）
+PUBLISH_POLL_SECONDS = int(os.getenv("PUBLISH_POLL_SECONDS") or "10")
+
 
 # 実行種別の定義
 class ExecutionType(Enum):
@@ -19,6 +43,10 @@ class ExecutionType(Enum):
     GLINK_V3 = "GLINK_v3"
 
 
+# GBP投稿の排他制御（GBP用プロファイルは1つのみ）
+gbp_lock = threading.Lock()
+
+
 # エンコーディング設定
 if sys.platform == "win32":
     sys.stdout.reconfigure(encoding="utf-8")
@@ -63,6 +91,12 @@ class DailyRotatingFileHandler(logging.FileHandler):
         return str(log_dir / f"{self.script_name}_{self.current_date}.log")
 
 
+### ワーカー用ログ（接頭辞付き） ###
+class WorkerLoggerAdapter(logging.LoggerAdapter):
+    def process(self, msg, kwargs):
+        return f"[{self.extra['worker']}] {msg}", kwargs
+
+
 ### loggerセットアップ ###
 def setup_logger():
     # スクリプト情報を取得
@@ -73,8 +107,10 @@ def setup_logger():
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.INFO)
 
-    # 既存のハンドラをクリア
-    logger.handlers.clear()
+    # 既存のハンドラを閉じて外す（日付の変更で呼び直したときにファイルを開いたままにしない）
+    for handler in logger.handlers[:]:
+        handler.close()
+        logger.removeHandler(handler)
 
     # フォーマッタの設定
     formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
@@ -93,15 +129,35 @@ def setup_logger():
 
 
 ### コマンド実行 ###
-def execute_commands(file_path, logger):
+def execute_commands(file_path, logger, workers=1, in_process=False, schedule=True, publish_queued=True):
+    sessions = {}
+    publisher_stop = threading.Event()
     try:
-        # コマンドリストの読み込み
-        with open(file_path, "r", encoding="utf-8") as f:
-            commands = [line.strip().split() for line in f.readlines() if line.strip()]
-
-        logger.info(f"コマンドファイルを読み込みました: {file_path}")
+        # アカウント定義の読み込み（accounts.json がなければ従来のコマンドリスト）
+        registry.legacy_path = Path(file_path)
+        registry.reload_if_changed(logger)
+        commands = registry.commands()
         logger.info(f"コマンド総数: {len(commands)}")
 
+        # 並列数はInstagram用プロファイル数が上限
+        profiles = get_instagram_profiles()
+        if workers > 1:
+            if len(profiles) < workers:
+                logger.info(f"プロファイル数が不足しているため並列数を調整します: {workers} -> {max(len(profiles), 1)}")
+                workers = max(len(profiles), 1)
+            logger.info(f"並列数: {workers}, プロファイル: {profiles[:workers]}")
+
+        # 常駐モードではプロファイルごとにブラウザを起動したまま使い回す
+        if in_process:
+            sessions = create_driver_sessions(logger, profiles[:workers] if workers > 1 else [None])
+
+        # GBP投稿は別スレッドでジョブキューから実行し、取得処理を待たせない
+        if publish_queued:
+            start_publisher(publisher_stop, logger)
+
+        # プロファイルごとのアクセス間隔（固定のsleep(60)の代わり）
+        throttle = ProfileThrottle()
+
         last_date = datetime.now().date()
         execution_count = 0
 
@@ -119,37 +175,208 @@ def execute_commands(file_path, logger):
                 logger = setup_logger()
                 last_date = current_date
 
-            # コマンドの実行
-            for i, command in enumerate(commands, 1):
-                if len(command) != 2:
-                    logger.error(f"不正なコマンド形式: {' '.join(command)}")
-                    continue
+            cycle_start = time.time()
+
+            # 定義ファイルが更新されていればサイクルの区切りで反映する
+            if registry.reload_if_changed(logger):
+                commands = registry.commands()
+                logger.info(f"コマンド総数: {len(commands)}")
 
-                cmd_type, arg = command
+            # 新規投稿がありそうなアカウントから順に訪問する
+            planned = list(enumerate(commands, 1))
+            if schedule:
                 try:
-                    logger.info(separator)
-                    logger.info(f"{i}/{len(commands)}: {' '.join(command)}")
+                    planned = [(i, command) for i, command, _ in plan_cycle(commands, logger)]
+                except Exception as e:
+                    logger.error(f"訪問計画の作成に失敗したため全アカウントを訪問します: {e}")
+
+            if not planned:
+                logger.info("訪問対象のアカウントがないため待機します: sleep(60)")
+                time.sleep(60)
+                continue
+
+            # すべてのプロファイルが隔離中なら、最初の解除まで待つ
+            wait_for_available_profile(profiles[:workers] if workers > 1 else profiles, logger)
+
+            if workers > 1:
+                execute_cycle_parallel(
+                    planned, len(commands), logger, profiles[:workers], sessions, throttle, publish_queued
+                )
+            else:
+                # コマンドの実行
+                for i, command in planned:
+                    execute_command(
+                        command,
+                        i,
+                        len(commands),
+                        logger,
+                        session=sessions.get(None),
+                        throttle=throttle,
+                        publish_queued=publish_queued,
+                    )
+
+            logger.info(f"実行サイクル #{execution_count} が完了しました: {time.time() - cycle_start:.0f}秒")
+
+    except Exception as e:
+        logger.error(f"コマンド実行プロセスでエラーが発生: {str(e)}")
+        raise
 
-                    try:
-                        execution_type = ExecutionType(cmd_type)
-                        process_command(execution_type, arg, logger)
+    finally:
+        publisher_stop.set()
+        for session in sessions.values():
+            session.close()
 
-                    except ValueError:
-                        logger.error(f"未知のコマンド種別: {cmd_type}")
 
-                    logger.info("sleep(60)")
-                    time.sleep(60)
+### 投稿ワーカー起動 ###
+def start_publisher(stop_event, logger):
+    publisher_logger = WorkerLoggerAdapter(logger, {"worker": "GBP"})
+    try:
+        recover_running_jobs(publisher_logger)
+        publisher_logger.info(f"投稿ワーカーを開始します: 未処理ジョブ {count_pending_jobs()}件")
+    except Exception as e:
+        publisher_logger.error(f"投稿ジョブの確認に失敗しました: {e}")
+
+    thread = threading.Thread(target=run_publisher, args=(stop_event, publisher_logger), name="publisher", daemon=True)
+    thread.start()
+    return thread
+
+
+### 投稿ワーカー ###
+def run_publisher(stop_event, logger):
+    """投稿ジョブを順に取り出し、postGBP.pyで投稿する（失敗時は待機後に再試行）"""
+    while not stop_event.is_set():
+        try:
+            job = claim_next_job()
+            if job is None:
+                stop_event.wait(PUBLISH_POLL_SECONDS)
+                continue
+
+            logger.info(f"投稿ジョブを実行します: {job['idempotency_key']}（{job['attempts']}回目）")
+            returncode = run_python_script(
+                "postGBP.py",
+                job["mode"],
+                job["user_name"],
+                job["business_id"],
+                job["process_id"],
+                job["media_dir"],
+                log=logger,
+            )
+            if handle_returncode("postGBP.py", returncode, logger):
+                complete_job(job, logger)
+            else:
+                fail_job(job, f"終了コード {returncode}", logger)
+
+        except Exception as e:
+            logger.error(f"投稿ワーカーでエラーが発生しました: {e}")
+            stop_event.wait(PUBLISH_POLL_SECONDS)
+
+
+### 常駐ドライバーセッション作成 ###
+def create_driver_sessions(logger, profiles):
+    # post.py / story.py を読み込むため、常駐モードのときだけインポートする
+    from driver_session import DriverSession
+
+    sessions = {}
+    for n, profile_name in enumerate(profiles, 1):
+        session_logger = WorkerLoggerAdapter(logger, {"worker": f"W{n}:{profile_name}"}) if profile_name else logger
+        sessions[profile_name] = DriverSession(profile_name, session_logger)
+    logger.info(f"常駐モードで実行します: {len(sessions)}セッション")
+    return sessions
+
+
+### 1コマンド実行 ###
+def execute_command(
+    command, index, total, logger, profile_name=None, session=None, throttle=None, publish_queued=False
+):
+    separator = "=" * 80
+    if len(command) != 2:
+        logger.error(f"不正なコマンド形式: {' '.join(command)}")
+        return
+
+    cmd_type, arg = command
+    try:
+        logger.info(separator)
+        logger.info(f"{index}/{total}: {' '.join(command)}")
 
-                except Exception as e:
-                    logger.error(f"予期せぬエラーが発生しました: {str(e)}")
+        # 直列実行ではスクリプト側で空きプロファイルを選ぶため、全プロファイル隔離中なら解除を待つ
+        if not profile_name:
+            wait_for_available_profile(get_instagram_profiles(), logger)
+
+        # 同じプロファイルでの前回アクセスから最低間隔を空ける
+        if throttle:
+            throttle.wait(profile_name, logger)
+
+        try:
+            execution_type = ExecutionType(cmd_type)
+            process_command(execution_type, arg, logger, profile_name, session, publish_queued)
+
+        except ValueError:
+            logger.error(f"未知のコマンド種別: {cmd_type}")
+
+        finally:
+            if throttle:
+                throttle.mark(profile_name)
 
     except Exception as e:
-        logger.error(f"コマンド実行プロセスでエラーが発生: {str(e)}")
-        raise
+        logger.error(f"予期せぬエラーが発生しました: {str(e)}")
+
+
+### 並列実行（1サイクル分） ###
+def execute_cycle_parallel(planned, total, logger, profiles, sessions=None, throttle=None, publish_queued=False):
+    """プロファイルごとにワーカーを起動し、コマンドを分担して実行する"""
+    tasks = queue.Queue()
+    for i, command in planned:
+        tasks.put((i, command))
+
+    def worker(worker_no, profile_name):
+        worker_logger = WorkerLoggerAdapter(logger, {"worker": f"W{worker_no}:{profile_name}"})
+        worker_logger.info("ワーカーを開始します")
+        while True:
+            # 隔離中のプロファイルは残りのコマンドを他のワーカーに任せる
+            if get_quarantine_until(profile_name):
+                worker_logger.info(f"プロファイル隔離中のため待機します（残り {tasks.qsize()}件は他のワーカーで処理）")
+                break
+            try:
+                i, command = tasks.get_nowait()
+            except queue.Empty:
+                break
+            execute_command(
+                command,
+                i,
+                total,
+                worker_logger,
+                profile_name,
+                (sessions or {}).get(profile_name),
+                throttle,
+                publish_queued,
+            )
+        worker_logger.info("ワーカーを終了します")
+
+    threads = [
+        threading.Thread(target=worker, args=(n, profile_name), name=f"worker-{n}", daemon=True)
+        for n, profile_name in enumerate(profiles, 1)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if not tasks.empty():
+        logger.info(f"すべてのワーカーが隔離中のため {tasks.qsize()}件を次のサイクルに持ち越します")
+
+
+### Instagram用プロファイル取得 ###
+def get_instagram_profiles():
+    profiles = []
+    for n in range(1, 5):
+        profile_name = os.getenv(f"PROFILE_NAME_{n}")
+        if profile_name:
+            profiles.append(profile_name)
+    return profiles
 
 
 ### コマンド分岐 ###
-def process_command(command_type, arg, logger):
+def process_command(command_type, arg, logger, profile_name=None, session=None, publish_queued=False):
     success = cleanup_media_folder(arg, logger)
     if success:
         logger.info("メディアフォルダを正常にクリーンアップしました")
@@ -170,9 +397,8 @@ def process_command(command_type, arg, logger):
         process_id = datetime.now().strftime("%Y%m%d_%H%M%S")
         logger.info(f"process_id: {process_id}")
 
-        if execute_python_script("story.py", arg, process_id):
-            for business_id in business_ids:
-                execute_python_script("postGBP.py", "story", arg, business_id, process_id)
+        if execute_scrape("story.py", arg, process_id, logger, profile_name, session):
+            publish_to_gbp("story", arg, business_ids, process_id, logger, publish_queued)
 
         # バックアップ処理
         if backup_media_files(arg):
@@ -192,11 +418,10 @@ def process_command(command_type, arg, logger):
         process_id = datetime.now().strftime("%Y%m%d_%H%M%S")
         logger.info(f"process_id: {process_id}")
 
-        post_success = execute_python_script("post.py", arg, process_id)
+        post_success = execute_scrape("post.py", arg, process_id, logger, profile_name, session)
 
         if post_success:
-            for business_id in business_ids:
-                post_gbp_success = execute_python_script("postGBP.py", "post", arg, business_id, process_id)
+            publish_to_gbp("post", arg, business_ids, process_id, logger, publish_queued)
 
         # バックアップ処理
         if backup_media_files(arg):
@@ -218,11 +443,10 @@ def process_command(command_type, arg, logger):
         process_id = datetime.now().strftime("%Y%m%d_%H%M%S")
         logger.info(f"process_id: {process_id}")
 
-        meo_success = execute_python_script("story.py", arg, process_id)
+        meo_success = execute_scrape("story.py", arg, process_id, logger, profile_name, session)
 
         if meo_success:
-            for business_id in business_ids:
-                gbp_success = execute_python_script("postGBP.py", "story", arg, business_id, process_id)
+            publish_to_gbp("story", arg, business_ids, process_id, logger, publish_queued)
 
         # バックアップ処理
         if backup_media_files(arg):
@@ -240,11 +464,10 @@ def process_command(command_type, arg, logger):
         post_process_id = datetime.now().strftime("%Y%m%d_%H%M%S")
         logger.info(f"process_id: {post_process_id}")
 
-        post_success = execute_python_script("post.py", arg, post_process_id)
+        post_success = execute_scrape("post.py", arg, post_process_id, logger, profile_name, session)
 
         if post_success:
-            for business_id in business_ids:
-                post_gbp_success = execute_python_script("postGBP.py", "post", arg, business_id, post_process_id)
+            publish_to_gbp("post", arg, business_ids, post_process_id, logger, publish_queued)
 
         # バックアップ処理
         if backup_media_files(arg):
@@ -258,6 +481,20 @@ def process_command(command_type, arg, logger):
             logger.error("説明文ファイルのバックアップに失敗しました")
 
 
+### GBP投稿 ###
+def publish_to_gbp(mode, username, business_ids, process_id, logger, publish_queued=False):
+    """取得したメディアをGBPに投稿する（キュー使用時はジョブを登録して投稿ワーカーに任せる）"""
+    if publish_queued:
+        try:
+            enqueue_publish_jobs(mode, username, process_id, business_ids, logger)
+            return
+        except Exception as e:
+            logger.error(f"投稿ジョブの登録に失敗したため直接投稿します: {e}")
+
+    for business_id in business_ids:
+        execute_python_script("postGBP.py", mode, username, business_id, process_id, log=logger)
+
+
 ### メディアクリーンアップ ###
 def cleanup_media_folder(user_name, logger):
     try:
@@ -289,40 +526,68 @@ def cleanup_media_folder(user_name, logger):
 
 ### ビジネスID取得 ###
 def get_business_ids(username):
-    business_ids = []
-
-    # 基本のbusiness_idを追加
-    base_id = os.getenv(username)
-    if base_id:
-        business_ids.append(base_id)
-
-    # 追加のbusiness_idを確認
-    counter = 2
-    while True:
-        next_id = os.getenv(f"{username}_num{counter}")
-        if next_id:
-            business_ids.append(next_id)
-            counter += 1
-        else:
-            break
+    return get_account_settings(username)["business_ids"]
 
-    return business_ids
+
+### 取得スクリプト実行 ###
+def execute_scrape(script_name, username, process_id, log, profile_name=None, session=None):
+    """post.py / story.py を実行する（sessionがある場合は常駐ドライバーで関数として実行）"""
+    # 同じコマンド内で先に実行したスクリプトがプロファイルを隔離した場合
+    if profile_name and get_quarantine_until(profile_name):
+        log.info(f"プロファイル隔離中のため{script_name}をスキップします: {profile_name}")
+        return False
+
+    if session is None:
+        returncode = run_python_script(script_name, username, process_id, log=log, profile_name=profile_name)
+    else:
+        log.info(f"{script_name}の実行を開始します（常駐ドライバー）")
+        result = session.run(script_name, username, process_id)
+        if result["error"]:
+            log.error(f"{script_name}でエラーが発生しました: {result['error']}")
+        log.info(f"{script_name}の結果: 終了コード {result['code']}, 所要時間 {result['elapsed']:.1f}秒")
+        returncode = result["code"]
+
+    # 訪問結果をスケジューラに記録（ロック・タイムアウト等はアカウントの傾向ではないため除外）
+    if returncode in (0, 1, 4):
+        try:
+            record_visit(username, Path(script_name).stem, returncode == 0)
+        except Exception as e:
+            log.error(f"訪問履歴の記録に失敗しました: {e}")
+
+    return handle_returncode(script_name, returncode, log)
 
 
 ### Python実行_v2 ###
-def execute_python_script(script_name, *args):
+def execute_python_script(script_name, *args, log=None, profile_name=None):
     """Pythonスクリプトを実行し、結果を返す
 
     Args:
         script_name (str): 実行するスクリプトの名前
         *args: スクリプトに渡す任意の数の引数
+        log: 出力先のロガー（省略時はグローバルのロガー）
+        profile_name (str): 使用するChromeプロファイル（並列実行時）
     """
-    global logger
+    log = log or logger
+    returncode = run_python_script(script_name, *args, log=log, profile_name=profile_name)
+    return handle_returncode(script_name, returncode, log)
+
+
+### Python実行（終了コードを返す） ###
+def run_python_script(script_name, *args, log=None, profile_name=None):
+    log = log or logger
 
     script_dir = Path(__file__).parent
     script_path = str(script_dir / script_name)
 
-    logger.info(f"{script_name}の実行を開始します")
+    # GBP投稿は専用プロファイルが1つのため、並列実行時も直列化する
+    if script_name == "postGBP.py":
+        with gbp_lock:
+            return _run_python_script(script_name, script_path, script_dir, args, log, profile_name)
+    return _run_python_script(script_name, script_path, script_dir, args, log, profile_name)
+
+
+def _run_python_script(script_name, script_path, script_dir, args, log, profile_name):
+    log.info(f"{script_name}の実行を開始します")
 
     try:
         # コマンドの構築
@@ -330,25 +595,71 @@ def execute_python_script(script_name, *args):
         # 全ての引数を文字列に変換して追加
         cmd.extend(str(arg) for arg in args)
 
-        process = subprocess.run(cmd, check=True, text=True, encoding="utf-8", cwd=str(script_dir))
+        # ワーカーに割り当てられたプロファイルを子プロセスに渡す
+        env = os.environ.copy()
+        if profile_name:
+            env["GLINK_PROFILE_NAME"] = profile_name
+
+        # タイムアウト時はこの子プロセスのツリーのみ終了する
+        return run_supervised(
+            cmd, log, timeout=SCRIPT_TIMEOUT, text=True, encoding="utf-8", cwd=str(script_dir), env=env
+        )
+
+    except Exception as e:
+        log.error(f"{script_name}の実行中に予期せぬエラーが発生: {e}")
+        return -1
+
+    finally:
+        # 異常終了した子プロセスが残したChromeをリース単位で回収
+        reclaim_stale_leases(log)
+
 
-        logger.info(f"{script_name}が正常終了しました")
+### 終了コード判定 ###
+def handle_returncode(script_name, returncode, log):
+    # 投稿（postGBP.py）の終了コードは取得スクリプトと意味が異なる
+    if script_name == "postGBP.py":
+        return handle_publish_returncode(returncode, log)
+
+    if returncode == 0:
+        log.info(f"{script_name}が正常終了しました")
         return True
+    elif returncode is None:
+        log.error(f"{script_name}がタイムアウトしました")
+        return False
+    elif returncode == -1:
+        # 起動失敗（ログ出力済み）
+        return False
+    elif returncode == 3:
+        # 該当プロファイルはスクリプト側で隔離済み。他のプロファイルで処理を続ける
+        log.info("アカウントロック、または自動化検出のため使用したプロファイルを隔離しました")
+        return False
+    elif returncode == 1:
+        log.info(f"{script_name}で終了コード1でした")
+        return False
+    elif returncode == 4:
+        log.info(f"{script_name}: 前回からグリッドに変化がないためスキップしました")
+        return False
+    else:
+        log.error(f"{script_name}が予期せぬエラーで終了しました: 終了コード {returncode}")
+        return False
 
-    except subprocess.CalledProcessError as e:
-        if e.returncode == 3:
-            logger.info("アカウントロック、または自動化検出のため60分待機します")
-            time.sleep(60 * 60)
-            return False
-        elif e.returncode == 1:
-            logger.info(f"{script_name}で終了コード1でした")
-            return False
-        else:
-            logger.error(f"{script_name}が予期せぬエラーで終了しました: 終了コード {e.returncode}")
-            return False
 
-    except Exception as e:
-        logger.error(f"{script_name}の実行中に予期せぬエラーが発生: {e}")
+def handle_publish_returncode(returncode, log):
+    """postGBP.py の終了コード判定（取得用のプロファイル隔離・スキップとは無関係）"""
+    if returncode == 0:
+        log.info("GBP投稿が正常終了しました")
+        return True
+    elif returncode is None:
+        log.error("GBP投稿がタイムアウトしました")
+        return False
+    elif returncode == -1:
+        # 起動失敗（ログ出力済み）
+        return False
+    elif returncode == 1:
+        log.error("GBP投稿に失敗しました（投稿画面・アップロード・フォーム送信のいずれか。postGBPのログを確認してください）")
+        return False
+    else:
+        log.error(f"GBP投稿が予期せぬエラーで終了しました: 終了コード {returncode}")
         return False
 
 
@@ -373,10 +684,9 @@ def backup_media_files(username):
         for filename in os.listdir(source_dir):
             if filename.lower().endswith(media_extensions):
                 source_path = os.path.join(source_dir, filename)
-                backup_path = os.path.join(backup_dir, filename)
 
-                # ファイルを移動
-                shutil.move(source_path, backup_path)
+                # ストアに保存済みのものは削除、それ以外はバックアップに移動
+                release_working_file(source_path, backup_dir)
                 files_moved += 1
                 print(f"移動完了: {filename}")
 
@@ -391,15 +701,15 @@ def backup_media_files(username):
 ### 一時ファイルバックアップ ###
 def backup_temp_file(username, process_id):
     # 元のファイルパス
-    # ★パスを変えないといけない★
-    description_dir = os.path.join("media", username, "description")
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    description_dir = os.path.join(script_dir, "media", username, "description")
     temp_file_path = os.path.join(description_dir, f"{process_id}")
     # ファイルが存在しない場合は成功として扱う
     if not os.path.exists(temp_file_path):
         return True
 
     # バックアップディレクトリのパス
-    backup_dir = os.path.join("media", "media_bk", "description")
+    backup_dir = os.path.join(script_dir, "media", "media_bk", "description")
 
     # タイムスタンプを含むバックアップファイル名を生成
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
@@ -415,17 +725,50 @@ def backup_temp_file(username, process_id):
 
 
 if __name__ == "__main__":
-
-    subprocess.run("taskkill /F /IM chrome.exe", shell=True)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("GLINK_WORKERS") or "1"),
+        help="同時に処理するアカウント数（PROFILE_NAME_1..4 の数が上限）",
+    )
+    parser.add_argument(
+        "--isolation",
+        choices=["process", "inprocess"],
+        default=os.getenv("GLINK_ISOLATION") or "process",
+        help="process: スクリプトごとに別プロセスで実行 / inprocess: ブラウザを常駐させて関数として実行",
+    )
+    parser.add_argument(
+        "--no-schedule",
+        action="store_true",
+        help="訪問履歴による並べ替え・見送りを行わず、毎サイクル全アカウントを順番に訪問する",
+    )
+    parser.add_argument(
+        "--publish",
+        choices=["queue", "inline"],
+        default=os.getenv("GLINK_PUBLISH") or "queue",
+        help="queue: GBP投稿をジョブキュー経由で別スレッド実行 / inline: 取得直後にその場で投稿（従来動作）",
+    )
+    cli_args = parser.parse_args()
 
     script_dir = Path(__file__).parent
     file_path = script_dir / "GLINK_LIST.txt"
 
     logger = setup_logger()
+
+    # 前回の実行で残ったChromeをリースファイルから特定して終了（他のChromeには触れない）
+    reclaim_stale_leases(logger)
     print(file_path)
     try:
         logger.info("スクリプトを開始しました")
-        execute_commands(file_path, logger)
+        execute_commands(
+            file_path,
+            logger,
+            workers=cli_args.workers,
+            in_process=cli_args.isolation == "inprocess",
+            schedule=not cli_args.no_schedule,
+            publish_queued=cli_args.publish == "queue",
+        )
     except KeyboardInterrupt:
         logger.info("ユーザーによりスクリプトが終了されました")
     except Exception as e:
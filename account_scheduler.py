@@ -0,0 +1,170 @@
+# 標準ライブラリのインポート
+import math
+import os
+import statistics
+import threading
+import time
+
+# サードパーティのライブラリインポート
+from dotenv import load_dotenv
+
+# 自作モジュールのインポート
+from db import connection, transaction
+
+load_dotenv()
+
+# 訪問履歴テーブル
+VISIT_TABLE = "ACCOUNT_VISIT"
+
+# 新規投稿がある確率がこの値未満のアカウントは今回のサイクルでは訪問しない
+MIN_PROBABILITY = float(os.getenv("SCHED_MIN_PROBABILITY") or "0.1")
+
+# 確率に関わらず、最後の訪問からこの時間が経過したら訪問する（ストーリーの24時間失効より短くする）
+MAX_REVISIT_SECONDS = float(os.getenv("SCHED_MAX_REVISIT_HOURS") or "12") * 3600
+
+# 履歴が少ない場合に仮定する訪問間隔（秒）
+DEFAULT_VISIT_GAP = 3600
+
+# 統計に使う直近の訪問数
+HISTORY_LIMIT = 200
+
+# 実行種別ごとの取得対象
+COMMAND_KINDS = {
+    "GLINK": ["story"],
+    "GLINK_v2": ["post"],
+    "GLINK_v3": ["story", "post"],
+}
+
+
+### 訪問結果の記録 ###
+def record_visit(user_name, kind, found_new, visited_at=None):
+    with transaction() as conn:
+        conn.execute(
+            f"INSERT INTO {VISIT_TABLE} (user_name, kind, visited_at, found_new) VALUES (?, ?, ?, ?)",
+            (user_name, kind, visited_at or time.time(), 1 if found_new else 0),
+        )
+
+
+### アカウント統計の取得 ###
+def get_account_stats(user_name, kind):
+    """直近の訪問履歴から、最終訪問・最終新規投稿・ヒット率・投稿間隔の中央値を求める"""
+    with connection() as conn:
+        rows = conn.execute(
+            f"SELECT visited_at, found_new FROM {VISIT_TABLE} "
+            f"WHERE user_name = ? AND kind = ? ORDER BY visited_at DESC LIMIT ?",
+            (user_name, kind, HISTORY_LIMIT),
+        ).fetchall()
+
+    visits = [r[0] for r in rows]
+    hits = sorted(r[0] for r in rows if r[1])
+    intervals = [b - a for a, b in zip(hits, hits[1:]) if b > a]
+    gaps = [a - b for a, b in zip(visits, visits[1:]) if a > b]
+
+    return {
+        "visits": len(visits),
+        "hits": len(hits),
+        "last_visit": visits[0] if visits else None,
+        "last_new": hits[-1] if hits else None,
+        # 事前分布として1回ヒット・1回ハズレを加えて平滑化
+        "hit_rate": (len(hits) + 1) / (len(visits) + 2),
+        "median_interval": statistics.median(intervals) if intervals else None,
+        "mean_visit_gap": statistics.mean(gaps) if gaps else DEFAULT_VISIT_GAP,
+    }
+
+
+### 新規投稿がある確率 ###
+def new_content_probability(stats, now=None):
+    """最後の訪問以降に新規投稿がある確率（投稿をポアソン過程とみなす）"""
+    if stats["last_visit"] is None:
+        return 1.0
+
+    now = now or time.time()
+    elapsed = max(now - stats["last_visit"], 0)
+
+    if stats["median_interval"]:
+        rate = 1.0 / stats["median_interval"]
+    else:
+        rate = stats["hit_rate"] / stats["mean_visit_gap"]
+
+    return 1.0 - math.exp(-rate * elapsed)
+
+
+### サイクルの訪問計画 ###
+def plan_cycle(commands, logger, now=None):
+    """訪問対象のコマンドを新規投稿の確率が高い順に並べて返す
+
+    Args:
+        commands (list): [実行種別, ユーザー名] のリスト
+        logger: ロガー
+
+    Returns:
+        list: (元の番号, コマンド, 確率) のリスト
+    """
+    now = now or time.time()
+    planned = []
+    skipped = 0
+
+    for i, command in enumerate(commands, 1):
+        skipped += _plan_command(i, command, now, planned)
+
+    planned.sort(key=lambda x: x[2], reverse=True)
+    logger.info(f"訪問計画: 対象 {len(planned)}件 / 見送り {skipped}件（確率 {MIN_PROBABILITY} 未満）")
+    return planned
+
+
+def _plan_command(i, command, now, planned):
+    """訪問対象ならplannedに追加して0を、見送りなら1を返す"""
+    if len(command) != 2:
+        # 不正なコマンドは実行側でエラーログを出す
+        planned.append((i, command, 1.0))
+        return 0
+
+    cmd_type, username = command
+    probability = 0.0
+    overdue = False
+    for kind in COMMAND_KINDS.get(cmd_type, ["post"]):
+        stats = get_account_stats(username, kind)
+        probability = max(probability, new_content_probability(stats, now))
+        if stats["last_visit"] is None or now - stats["last_visit"] >= MAX_REVISIT_SECONDS:
+            overdue = True
+
+    if overdue or probability >= MIN_PROBABILITY:
+        planned.append((i, command, probability))
+        return 0
+    return 1
+
+
+### プロファイルごとの訪問間隔制御 ###
+class ProfileThrottle:
+    """同じプロファイルでの連続アクセスに最低間隔（ポライトネスフロア）を設ける"""
+
+    def __init__(self):
+        self.last_used = {}
+        self.lock = threading.Lock()
+
+    def wait(self, profile_name, logger):
+        floor = get_politeness_floor(profile_name)
+        with self.lock:
+            last_used = self.last_used.get(profile_name)
+        if last_used is None:
+            return
+
+        remaining = last_used + floor - time.time()
+        if remaining > 0:
+            logger.info(f"プロファイル {profile_name or '既定'} の間隔調整: sleep({remaining:.0f})")
+            time.sleep(remaining)
+
+    def mark(self, profile_name):
+        with self.lock:
+            self.last_used[profile_name] = time.time()
+
+
+### ポライトネスフロア取得 ###
+def get_politeness_floor(profile_name):
+    """PROFILE_MIN_INTERVAL_<n>（PROFILE_NAME_<n>に対応）、なければ PROFILE_MIN_INTERVAL（秒）"""
+    for n in range(1, 5):
+        if profile_name and os.getenv(f"PROFILE_NAME_{n}") == profile_name:
+            value = os.getenv(f"PROFILE_MIN_INTERVAL_{n}")
+            if value:
+                return float(value)
+    return float(os.getenv("PROFILE_MIN_INTERVAL") or "60")
@@ -0,0 +1,108 @@
+# 標準ライブラリのインポート
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 自作モジュールのインポート
+from db_migrate import migrate
+
+TABLE = "MEO"
+
+BASE_TIME = datetime(2020, 1, 1)
+
+# checkRecords と同じ検索（cache_key あり / 日付のみ）
+LOOKUPS = [
+    ("cache_keyあり", f"SELECT 1 FROM {TABLE} WHERE user_name = ? AND datetime_value = ? AND cache_key = ?"),
+    ("日付のみ", f"SELECT 1 FROM {TABLE} WHERE user_name = ? AND datetime_value = ?"),
+]
+
+
+### DB作成 ###
+def datetime_of(i):
+    """レコードごとに異なる投稿日時（1投稿1分間隔）"""
+    return (BASE_TIME + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def make_db(path, rows, users=200):
+    """索引追加前（バージョン2）のスキーマに rows 件のレコードを作る"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    migrate(conn, target=2, table=TABLE)
+    conn.execute("BEGIN")
+    conn.executemany(
+        f"INSERT INTO {TABLE} (user_name, cache_key, media_url, datetime_value) VALUES (?, ?, ?, ?)",
+        (
+            (f"user{i % users}", f"key{i}", f"https://example.com/{i}.jpg", datetime_of(i))
+            for i in range(rows)
+        ),
+    )
+    conn.execute("COMMIT")
+    return conn
+
+
+def sample_keys(rows, count, users=200, seed=1):
+    """登録済みと未登録（存在しない日時）が半分ずつの検索条件"""
+    rng = random.Random(seed)
+    keys = []
+    for n in range(count):
+        i = rng.randrange(rows)
+        if n % 2 == 0:
+            keys.append((f"user{i % users}", datetime_of(i), f"key{i}"))
+        else:
+            keys.append((f"user{i % users}", datetime_of(i + rows), f"missing{i}"))
+    return keys
+
+
+### 計測 ###
+def per_lookup_us(conn, sql, keys):
+    params = [key if sql.count("?") == 3 else key[:2] for key in keys]
+    start = time.perf_counter()
+    found = sum(1 for p in params if conn.execute(sql, p).fetchone())
+    return (time.perf_counter() - start) * 1_000_000 / len(keys), found
+
+
+def query_plan(conn, sql):
+    return " / ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", ("u", "d", "k")[: sql.count("?")]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MEOテーブルの重複チェック検索の速度を件数ごとに計測する（索引追加の前後）")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="レコード件数")
+    parser.add_argument("--queries", type=int, default=2_000, help="索引ありの検索回数")
+    parser.add_argument("--scan-queries", type=int, default=50, help="索引なしの検索回数")
+    parser.add_argument("--max-growth", type=float, default=3.0, help="最小件数に対する最大件数の検索時間の比の上限")
+    args = parser.parse_args()
+
+    ok = True
+    indexed_times = {label: [] for label, _ in LOOKUPS}
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.sizes:
+            print(f"{rows:,}件:")
+            conn = make_db(os.path.join(tmp, f"meo_{rows}.db"), rows)
+            try:
+                scan_us = {label: per_lookup_us(conn, sql, sample_keys(rows, args.scan_queries))[0] for label, sql in LOOKUPS}
+                migrate(conn, table=TABLE)
+                keys = sample_keys(rows, args.queries)
+                for label, sql in LOOKUPS:
+                    indexed_us, found = per_lookup_us(conn, sql, keys)
+                    plan = query_plan(conn, sql)
+                    # 全件走査（SCAN）ではなく索引で検索できていること
+                    ok = ok and "SCAN" not in plan and found >= (len(keys) + 1) // 2
+                    indexed_times[label].append(indexed_us)
+                    print(
+                        f"  {label}: 索引なし {scan_us[label]:.1f}µs → 索引あり {indexed_us:.1f}µs / 1回"
+                        f"（{scan_us[label] / indexed_us:.0f}倍） 検索計画: {plan}"
+                    )
+            finally:
+                conn.close()
+
+    for label, times in indexed_times.items():
+        growth = times[-1] / times[0]
+        print(f"{label}: {args.sizes[0]:,}件 → {args.sizes[-1]:,}件での検索時間の比 {growth:.2f}倍（上限 {args.max_growth}倍）")
+        ok = ok and growth <= args.max_growth
+    print("OK" if ok else "NG")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,103 @@
+# 標準ライブラリのインポート
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+# 起動時間の予算（ミリ秒、import完了まで）
+DEFAULT_BUDGETS = {
+    "post": 1500,
+    "story": 1500,
+    "postGBP": 2500,
+}
+
+# 起動時に読み込まれてはいけない重いライブラリ（使用する関数内で読み込む）
+FORBIDDEN_MODULES = {
+    "post": ["anthropic", "openai", "google.cloud.videointelligence", "google.oauth2", "PIL", "story"],
+    "story": ["anthropic", "openai", "google.cloud.videointelligence", "google.oauth2", "PIL"],
+}
+
+LINE_PATTERN = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+### import時間の計測 ###
+def measure(module_name, runs):
+    """python -X importtime で計測し、最も速かった回の結果を返す"""
+    best = None
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+            capture_output=True,
+            text=True,
+            cwd=str(Path(__file__).parent),
+        )
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "不明なエラー"
+            return {"error": error}
+
+        # 各行: self [us] | cumulative [us] | パッケージ名（インデントが深さ）
+        entries = []
+        total = 0
+        index = 0
+        for line in result.stderr.splitlines():
+            match = LINE_PATTERN.match(line)
+            if not match:
+                continue
+            self_us, cumulative_us, indent, name = int(match[1]), int(match[2]), match[3], match[4]
+            entries.append({"name": name, "self": self_us, "cumulative": cumulative_us, "depth": len(indent) // 2})
+            if name == module_name and len(indent) // 2 == 0:
+                total = cumulative_us
+                index = len(entries) - 1
+
+        if best is None or total < best["total"]:
+            best = {"total": total, "entries": entries, "index": index}
+    return best
+
+
+### 結果表示 ###
+def report(module_name, result, budget_ms, top):
+    """結果を表示し、予算内かつ禁止モジュールなしならTrueを返す"""
+    print("=" * 80)
+    if "error" in result:
+        print(f"{module_name}: import に失敗しました: {result['error']}")
+        return False
+
+    total_ms = result["total"] / 1000
+    loaded = {entry["name"] for entry in result["entries"]}
+    forbidden = [m for m in FORBIDDEN_MODULES.get(module_name, []) if m in loaded]
+
+    status = "OK" if total_ms <= budget_ms and not forbidden else "NG"
+    print(f"{module_name}: {total_ms:.1f}ms（予算 {budget_ms}ms） [{status}]")
+    if forbidden:
+        print(f"  起動時に読み込まれている重いモジュール: {', '.join(forbidden)}")
+
+    # 直下で読み込まれたモジュールのうち重いもの（出力は読み込み完了順のため、対象の行から遡る）
+    direct = []
+    for entry in reversed(result["entries"][: result["index"]]):
+        if entry["depth"] == 0:
+            break
+        if entry["depth"] == 1:
+            direct.append(entry)
+    direct.sort(key=lambda entry: entry["cumulative"], reverse=True)
+    for entry in direct[:top]:
+        print(f"  {entry['cumulative'] / 1000:8.1f}ms  {entry['name']}")
+
+    return status == "OK"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="post.py / story.py / postGBP.py の起動時間（import）を計測する")
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_BUDGETS), help="計測するモジュール")
+    parser.add_argument("--runs", type=int, default=3, help="計測回数（最速の回を採用）")
+    parser.add_argument("--top", type=int, default=10, help="表示する重いモジュールの数")
+    parser.add_argument("--budget", type=int, help="予算（ミリ秒）。省略時はモジュールごとの既定値")
+    args = parser.parse_args()
+
+    ok = True
+    for module_name in args.modules:
+        result = measure(module_name, args.runs)
+        budget_ms = args.budget or DEFAULT_BUDGETS.get(module_name, 1500)
+        ok = report(module_name, result, budget_ms, args.top) and ok
+
+    sys.exit(0 if ok else 1)
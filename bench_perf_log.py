@@ -0,0 +1,120 @@
+# 標準ライブラリのインポート
+import argparse
+import json
+import random
+import sys
+import time
+
+# 自作モジュールのインポート
+from perf_log import iter_messages, iter_request_urls
+
+# 合成ログに含めるmp4リクエストの割合
+MP4_RATIO = 0.02
+
+
+### 合成ログの作成 ###
+def make_logs(count, seed=0):
+    """実際のパフォーマンスログに近い形のエントリを count 件作る"""
+    rng = random.Random(seed)
+    headers = {f"x-header-{i}": "v" * 40 for i in range(12)}
+    logs = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < MP4_RATIO:
+            start = rng.randrange(0, 5_000_000, 1000)
+            url = (
+                f"https://scontent-nrt1-1.cdninstagram.com/o1/v/t16/f2/m86/AQ{i % 7}_video_dashinit.mp4"
+                f"?_nc_ht=scontent&bytestart={start}&byteend={start + 99_999}"
+            )
+            method, params = "Network.requestWillBeSent", {"requestId": str(i), "request": {"url": url, "headers": headers}}
+        elif roll < 0.5:
+            url = f"https://www.instagram.com/static/bundle_{i}.js"
+            method, params = "Network.requestWillBeSent", {"requestId": str(i), "request": {"url": url, "headers": headers}}
+        elif roll < 0.8:
+            url = f"https://scontent-nrt1-1.cdninstagram.com/v/t51.2885-15/{i}_n.jpg"
+            method, params = "Network.responseReceived", {"requestId": str(i), "response": {"url": url, "headers": headers}}
+        else:
+            method, params = "Network.dataReceived", {"requestId": str(i), "dataLength": rng.randrange(100, 100_000)}
+        message = {"message": {"method": method, "params": params}, "webview": "ABCDEF"}
+        logs.append({"level": "INFO", "message": json.dumps(message), "timestamp": 1_700_000_000_000 + i})
+    return logs
+
+
+### 従来の処理（比較用） ###
+def legacy_extract_request_urls_v2(logs):
+    request_urls = set()
+    for entry in logs:
+        try:
+            message = json.loads(entry.get("message", "{}"))
+            if "message" not in message:
+                continue
+            params = message.get("message", {}).get("params", {})
+            if "request" in params:
+                url = params["request"].get("url", "")
+                if ".mp4" in url:
+                    request_urls.add(url)
+        except (json.JSONDecodeError, KeyError):
+            continue
+    return request_urls
+
+
+def legacy_analyze_counts(logs):
+    mp4_count = 0
+    scontent_count = 0
+    for entry in logs:
+        message_str = json.dumps(json.loads(entry.get("message", "{}")))
+        if ".mp4" in message_str:
+            mp4_count += 1
+        if "scontent" in message_str:
+            scontent_count += 1
+    return mp4_count, scontent_count
+
+
+### 新しい処理 ###
+def extract_request_urls_v2(logs):
+    return set(iter_request_urls(logs, ".mp4"))
+
+
+def analyze_counts(logs):
+    return sum(1 for _ in iter_messages(logs, ".mp4")), sum(1 for _ in iter_messages(logs, "scontent"))
+
+
+### 計測 ###
+def best_of(func, logs, runs):
+    best = None
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func(logs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="パフォーマンスログ解析（extract_request_urls_v2 / analyze_logs）の速度を比較する")
+    parser.add_argument("--entries", type=int, default=50_000, help="合成ログの件数")
+    parser.add_argument("--runs", type=int, default=3, help="計測回数（最速の回を採用）")
+    parser.add_argument("--min-speedup", type=float, default=2.0, help="これを下回ったら終了コード1")
+    args = parser.parse_args()
+
+    logs = make_logs(args.entries)
+    print(f"合成ログ: {len(logs)}件（mp4リクエスト約{MP4_RATIO:.0%}）")
+
+    ok = True
+    for label, legacy, current in (
+        ("extract_request_urls_v2", legacy_extract_request_urls_v2, extract_request_urls_v2),
+        ("analyze_logs（件数集計）", legacy_analyze_counts, analyze_counts),
+    ):
+        legacy_time, legacy_result = best_of(legacy, logs, args.runs)
+        current_time, current_result = best_of(current, logs, args.runs)
+        same = legacy_result == current_result
+        speedup = legacy_time / current_time if current_time else float("inf")
+        status = "OK" if same and speedup >= args.min_speedup else "NG"
+        print(
+            f"{label}: 従来 {legacy_time * 1000:.1f}ms → 新 {current_time * 1000:.1f}ms "
+            f"（{speedup:.1f}倍, 結果一致: {'はい' if same else 'いいえ'}） [{status}]"
+        )
+        ok = ok and status == "OK"
+
+    sys.exit(0 if ok else 1)
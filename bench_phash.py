@@ -0,0 +1,70 @@
+# 標準ライブラリのインポート
+import argparse
+import random
+import sys
+import time
+
+# 自作モジュールのインポート
+from phash_index import DUPLICATE_DISTANCE, MultiIndexHashTable, hamming
+
+
+### 計測 ###
+def flip_bits(rng, value, count):
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def linear_query(hashes, value, max_distance):
+    """比較用：全件の距離を計算する"""
+    return sorted(hamming(value, h) for h in hashes if hamming(value, h) <= max_distance)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="画像ハッシュの重複検索（マルチインデックス）の速度を計測する")
+    parser.add_argument("--hashes", type=int, default=100_000, help="登録するハッシュ数")
+    parser.add_argument("--queries", type=int, default=1_000, help="検索回数")
+    parser.add_argument("--distance", type=int, default=DUPLICATE_DISTANCE, help="重複とみなす距離")
+    parser.add_argument("--budget-ms", type=float, default=1.0, help="1回あたりの検索時間の予算（ミリ秒）")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(64) for _ in range(args.hashes)]
+
+    start = time.perf_counter()
+    index = MultiIndexHashTable()
+    for i, value in enumerate(hashes):
+        index.add(value, i)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"登録: {len(index)}件（{build_ms:.0f}ms）")
+
+    # 半分は登録済みの画像を少し変えたもの（再エンコード相当）、半分は無関係な画像
+    queries = []
+    for i in range(args.queries):
+        if i % 2 == 0:
+            queries.append((flip_bits(rng, rng.choice(hashes), rng.randint(0, args.distance)), True))
+        else:
+            queries.append((rng.getrandbits(64), False))
+
+    start = time.perf_counter()
+    results = [index.query(value, args.distance) for value, _ in queries]
+    per_query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    detected = sum(1 for (_, expected), found in zip(queries, results) if expected and found)
+    expected_count = sum(1 for _, expected in queries if expected)
+    print(f"検索: 1回あたり {per_query_ms:.3f}ms（{len(queries)}回, 距離{args.distance}以内）")
+    print(f"重複の検出: {detected}/{expected_count}")
+
+    # 全件比較と結果が一致するか（一部のみ確認）
+    sample = queries[:20]
+    start = time.perf_counter()
+    same = all(
+        [m[0] for m in index.query(value, args.distance)] == linear_query(hashes, value, args.distance)
+        for value, _ in sample
+    )
+    linear_ms = (time.perf_counter() - start) * 1000 / len(sample)
+    print(f"全件比較: 1回あたり {linear_ms:.1f}ms（結果一致: {'はい' if same else 'いいえ'}）")
+
+    ok = same and detected == expected_count and per_query_ms <= args.budget_ms
+    print("OK" if ok else "NG")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,117 @@
+# 標準ライブラリのインポート
+import json
+from urllib.parse import parse_qs, urlparse
+
+# 自作モジュールのインポート
+from timeline_extractor import extract_timeline_posts, iter_media_nodes
+
+# 投稿ページに埋め込まれたJSON（カルーセル情報を含むものだけ返す）
+EMBEDDED_JSON_SCRIPT = """
+return Array.from(document.querySelectorAll('script[type="application/json"]'))
+    .map(s => s.textContent || '')
+    .filter(t => t.includes(arguments[0]) && (t.includes('carousel_media') || t.includes('edge_sidecar_to_children')));
+"""
+
+# 表示中のカルーセルの画像URLと枚数の目安を1回で取得する
+DOM_SWEEP_SCRIPT = """
+const best = img => {
+    const srcset = img.getAttribute('srcset');
+    if (srcset) {
+        const parts = srcset.split(',').map(s => s.trim().split(/\\s+/)).filter(p => p[0]);
+        parts.sort((a, b) => parseInt(b[1] || '0') - parseInt(a[1] || '0'));
+        if (parts.length && parts[0][0].startsWith('http')) return parts[0][0];
+    }
+    const src = img.getAttribute('src');
+    return src && src.startsWith('http') ? src : null;
+};
+const urls = Array.from(document.querySelectorAll('ul._acay li._acaz img')).map(best).filter(Boolean);
+return {
+    urls: Array.from(new Set(urls)),
+    indicators: document.querySelectorAll('div._acnb').length,
+    slides: document.querySelectorAll('ul._acay li._acaz').length,
+};
+"""
+
+
+### カルーセルの一括取得 ###
+def extract_carousel_media(driver, shortcode, logger, timeline_post=None):
+    """スライドを送らずにカルーセル全枚の画像URLを取得する
+
+    次の順に試し、最初に確認できたものを返す。
+      1. プロフィール読み込み時のタイムライン応答（timeline_post）
+      2. 投稿ページ読み込み時のAPI応答
+      3. 投稿ページに埋め込まれたJSON
+      4. DOMの一括走査（表示枚数と一致した場合のみ）
+
+    Returns:
+        dict: {urls, source}（取得できない・カルーセルでない場合は None。呼び出し側はクリック送りで取得する）
+    """
+    for source, loader in (
+        ("TIMELINE", lambda: timeline_post),
+        ("API", lambda: _post_from_responses(driver, shortcode, logger)),
+        ("JSON", lambda: _post_from_embedded_json(driver, shortcode)),
+    ):
+        try:
+            post = loader()
+        except Exception as e:
+            logger.info(f"カルーセル情報の取得に失敗しました（{source}）: {e}")
+            continue
+        urls = _image_urls(post, logger)
+        if urls:
+            logger.info(f"カルーセルを一括取得しました（{source}）: {len(urls)}枚")
+            return {"urls": urls, "source": source}
+
+    try:
+        sweep = driver.execute_script(DOM_SWEEP_SCRIPT)
+    except Exception as e:
+        logger.info(f"カルーセルのDOM走査に失敗しました: {e}")
+        return None
+
+    expected = max(sweep["indicators"], sweep["slides"])
+    urls = sweep["urls"]
+    # 遅延描画で全スライドが揃っていない場合は使わない
+    if expected > 1 and len(urls) == expected and all(has_cache_key(u) for u in urls):
+        logger.info(f"カルーセルを一括取得しました（DOM）: {len(urls)}枚")
+        return {"urls": urls, "source": "DOM"}
+    return None
+
+
+def _post_from_responses(driver, shortcode, logger):
+    return extract_timeline_posts(driver, logger).get(shortcode)
+
+
+def _post_from_embedded_json(driver, shortcode):
+    for text in driver.execute_script(EMBEDDED_JSON_SCRIPT, shortcode) or []:
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            continue
+        for post in iter_media_nodes(data):
+            if post["shortcode"] == shortcode:
+                return post
+    return None
+
+
+def _image_urls(post, logger):
+    """カルーセルの画像URLを返す（重複チェックのキーが取れないURLを含む場合は使わない）"""
+    if not post or post["media_type"] != "carousel" or len(post["media"]) < 2:
+        return None
+
+    urls = []
+    for media in post["media"]:
+        if media["type"] != "jpg":
+            # 従来どおり、カルーセル内の動画は取得対象外
+            logger.info("カルーセル内の動画スライドはスキップします")
+            continue
+        if media["url"] not in urls:
+            urls.append(media["url"])
+
+    if not urls or not all(has_cache_key(u) for u in urls):
+        return None
+    return urls
+
+
+### 重複チェック用キーの有無 ###
+def has_cache_key(url):
+    """getkey() で使う ig_cache_key がURLに含まれているか"""
+    return bool(parse_qs(urlparse(url).query).get("ig_cache_key"))
@@ -0,0 +1,305 @@
+# 標準ライブラリのインポート
+import atexit
+import json
+import logging
+import os
+import re
+import shutil
+import socket
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# サードパーティのライブラリインポート
+import psutil
+from dotenv import load_dotenv
+
+# 自作モジュールのインポート
+from process_supervisor import kill_process_records, snapshot_process_tree
+
+load_dotenv()
+
+# リースファイルの保存先
+LEASE_DIR = Path(__file__).parent / "lease"
+
+# プロファイル複製時にコピーしないディレクトリ（キャッシュ類）
+PROFILE_COPY_IGNORE = shutil.ignore_patterns(
+    "Cache", "Code Cache", "GPUCache", "CacheStorage", "ScriptCache", "Crashpad", "*.lock", "Singleton*"
+)
+
+# このプロセスが保持中のリース（リースファイルのパス -> リース）。解放されずに終了した場合は終了時に回収する
+_live_leases = {}
+_live_lock = threading.Lock()
+
+
+### リース取得 ###
+def acquire_chrome_lease(profile_names, logger, timeout=0):
+    """使用可能なプロファイルとリモートデバッグポートを確保する
+
+    Args:
+        profile_names (list): 候補のプロファイル名（先頭から順に試す）
+        logger: ロガー
+        timeout (int): すべて使用中の場合に空きを待つ秒数
+
+    Returns:
+        dict: リース情報（profile_name, port, user_data_dir など）。確保できない場合はNone
+    """
+    deadline = time.time() + timeout
+    while True:
+        lease = _try_acquire(profile_names, logger)
+        if lease or time.time() >= deadline:
+            break
+        time.sleep(5)
+
+    if lease is None:
+        logger.error(f"使用可能なプロファイルがありません: {profile_names}")
+    return lease
+
+
+def _try_acquire(profile_names, logger):
+    LEASE_DIR.mkdir(parents=True, exist_ok=True)
+    reclaim_stale_leases(logger)
+
+    for profile_name in profile_names:
+        if not profile_name:
+            continue
+
+        lease_path = LEASE_DIR / f"profile_{_slugify(profile_name)}.json"
+        lease = {
+            "profile_name": profile_name,
+            "port": None,
+            "user_data_dir": None,
+            "pid": os.getpid(),
+            "pid_create_time": psutil.Process().create_time(),
+            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "processes": [],
+            "path": str(lease_path),
+        }
+
+        # 排他的にリースファイルを作成（既に存在する場合は使用中）
+        try:
+            fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            logger.info(f"プロファイル使用中のためスキップ: {profile_name}")
+            continue
+
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(lease, f, ensure_ascii=False)
+
+        try:
+            lease["user_data_dir"] = prepare_user_data_dir(profile_name, logger)
+            # 同時にリースを取得したプロセスとポートが重複した場合は取り直す
+            for _ in range(5):
+                lease["port"] = _find_free_port(lease_path)
+                write_lease(lease)
+                if not _port_conflicts(lease):
+                    break
+        except Exception as e:
+            logger.error(f"リースの準備に失敗しました: {profile_name} - {e}")
+            release_chrome_lease(lease, logger)
+            continue
+
+        # 異常終了時も起動したChromeを残さないよう終了時に回収する（解放時に一覧から外す）
+        with _live_lock:
+            _live_leases[lease["path"]] = lease
+        logger.info(
+            f"リースを取得しました: profile={profile_name}, port={lease['port']}, user_data_dir={lease['user_data_dir']}"
+        )
+        return lease
+
+    return None
+
+
+### 起動したプロセスの記録 ###
+def record_driver_processes(lease, driver, logger):
+    """chromedriverとその配下のChromeのPIDをリースに記録する"""
+    try:
+        lease["processes"] = snapshot_process_tree(driver.service.process.pid)
+        write_lease(lease)
+        logger.info(f"起動したプロセスを記録しました: {[p['pid'] for p in lease['processes']]}")
+    except Exception as e:
+        logger.warning(f"プロセスの記録に失敗しました: {e}")
+
+
+### ドライバー終了 ###
+def close_driver(driver, logger):
+    """ドライバーを終了し、紐づくリースを解放する"""
+    try:
+        driver.quit()
+    except Exception as e:
+        logger.warning(f"ドライバーの終了でエラーが発生しました: {e}")
+
+    lease = getattr(driver, "glink_lease", None)
+    if lease:
+        cleanup_chrome_lease(lease, logger)
+
+
+### リースの後始末 ###
+def cleanup_chrome_lease(lease, logger=None):
+    """記録したプロセスの残りを終了してリースを解放する"""
+    logger = logger or logging.getLogger(__name__)
+    kill_process_records(lease.get("processes"), logger)
+    release_chrome_lease(lease, logger)
+
+
+### リース更新 ###
+def write_lease(lease):
+    # 一時ファイルに書き込んでから置き換える（途中状態を読ませない）
+    lease_path = Path(lease["path"])
+    tmp_path = lease_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(lease, f, ensure_ascii=False)
+    os.replace(tmp_path, lease_path)
+
+
+### リース解放 ###
+def release_chrome_lease(lease, logger=None):
+    logger = logger or logging.getLogger(__name__)
+    with _live_lock:
+        if _live_leases.get(lease["path"]) is lease:
+            del _live_leases[lease["path"]]
+    try:
+        lease_path = Path(lease["path"])
+        if not lease_path.exists():
+            return
+        # 他プロセスが再取得したリースは削除しない
+        current = read_lease(lease_path)
+        if current and current.get("pid") != lease["pid"]:
+            return
+        lease_path.unlink()
+    except Exception as e:
+        logger.error(f"リース解放でエラーが発生しました: {e}")
+
+
+def _cleanup_live_leases():
+    """終了時に解放されていないリースを、起動したプロセスごと回収する"""
+    with _live_lock:
+        leases = list(_live_leases.values())
+    for lease in leases:
+        cleanup_chrome_lease(lease)
+
+
+atexit.register(_cleanup_live_leases)
+
+
+### リース読み込み ###
+def read_lease(lease_path):
+    try:
+        with open(lease_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+### 全リース取得 ###
+def list_leases():
+    if not LEASE_DIR.exists():
+        return []
+    leases = []
+    for lease_path in LEASE_DIR.glob("profile_*.json"):
+        lease = read_lease(lease_path)
+        if lease:
+            lease["path"] = str(lease_path)
+            leases.append(lease)
+    return leases
+
+
+### 期限切れリースの回収 ###
+def reclaim_stale_leases(logger):
+    """所有プロセスが終了しているリースを、残ったプロセスごと回収する"""
+    reclaimed = []
+    if not LEASE_DIR.exists():
+        return reclaimed
+
+    for lease_path in LEASE_DIR.glob("profile_*.json"):
+        lease = read_lease(lease_path)
+        if lease is None:
+            # 書き込み途中の可能性があるため、古いものだけ削除
+            try:
+                if time.time() - lease_path.stat().st_mtime > 60:
+                    lease_path.unlink()
+            except OSError:
+                pass
+            continue
+
+        if is_owner_alive(lease):
+            continue
+
+        # 所有プロセスが異常終了している場合、起動したChromeが残っていれば終了する
+        kill_process_records(lease.get("processes"), logger)
+
+        try:
+            lease_path.unlink()
+            lease["path"] = str(lease_path)
+            reclaimed.append(lease)
+            logger.info(f"期限切れのリースを回収しました: profile={lease.get('profile_name')}, pid={lease.get('pid')}")
+        except OSError:
+            continue
+
+    return reclaimed
+
+
+### 所有プロセスの生存確認 ###
+def is_owner_alive(lease):
+    try:
+        proc = psutil.Process(lease.get("pid"))
+        # PIDの再利用対策として起動時刻も比較
+        return abs(proc.create_time() - float(lease.get("pid_create_time") or 0)) < 1.0
+    except (psutil.NoSuchProcess, psutil.AccessDenied, ValueError, TypeError):
+        return False
+
+
+### ユーザーデータディレクトリの準備 ###
+def prepare_user_data_dir(profile_name, logger):
+    """プロファイルごとに独立したユーザーデータディレクトリを返す（初回は元のプロファイルを複製）"""
+    base_path = os.getenv("CHROME_PROFILE_PATH")
+    worker_root = Path(os.getenv("CHROME_WORKER_DATA_PATH") or Path(__file__).parent / "chrome_data")
+    user_data_dir = worker_root / _slugify(profile_name)
+
+    if not (user_data_dir / profile_name).exists():
+        logger.info(f"プロファイルを複製します: {profile_name} -> {user_data_dir}")
+        user_data_dir.mkdir(parents=True, exist_ok=True)
+
+        # ログイン情報の復号キーを含むため Local State も複製する
+        local_state = Path(base_path) / "Local State"
+        if local_state.exists():
+            shutil.copy2(local_state, user_data_dir / "Local State")
+
+        source_profile = Path(base_path) / profile_name
+        if source_profile.exists():
+            shutil.copytree(source_profile, user_data_dir / profile_name, ignore=PROFILE_COPY_IGNORE)
+        else:
+            logger.warning(f"複製元のプロファイルが見つかりません: {source_profile}")
+            (user_data_dir / profile_name).mkdir(parents=True, exist_ok=True)
+
+    return str(user_data_dir)
+
+
+### 空きポート検索 ###
+def _find_free_port(own_lease_path):
+    start = int(os.getenv("CHROME_DEBUG_PORT_START") or "9222")
+    used = {lease.get("port") for lease in list_leases() if lease["path"] != str(own_lease_path)}
+
+    for port in range(start, start + 100):
+        if port in used:
+            continue
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            try:
+                sock.bind(("127.0.0.1", port))
+            except OSError:
+                continue
+        return port
+
+    raise RuntimeError(f"空きポートが見つかりません: {start}-{start + 99}")
+
+
+def _port_conflicts(lease):
+    for other in list_leases():
+        if other["path"] != lease["path"] and other.get("port") == lease["port"]:
+            return True
+    return False
+
+
+def _slugify(name):
+    return re.sub(r"[^0-9A-Za-z_-]+", "_", name).strip("_") or "default"
@@ -0,0 +1,95 @@
+# 標準ライブラリのインポート
+import atexit
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# サードパーティのライブラリインポート
+from dotenv import load_dotenv
+
+# 自作モジュールのインポート
+from db_migrate import migrate
+
+load_dotenv()
+
+# ロック中の他プロセスを待つ時間（ミリ秒）
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS") or "30000")
+
+# 接続ごとに保持する解析済みSQLの数
+CACHED_STATEMENTS = 64
+
+# プロセス内で共有する接続（各モジュールのテーブルはすべてこの接続で読み書きする）
+_conn = None
+_conn_pid = None
+_lock = threading.RLock()
+
+
+### DBファイルのパス ###
+def db_path():
+    """DB_NAME が相対パスならスクリプトのフォルダを基準にする（起動時のカレントディレクトリに依存しない）"""
+    name = os.getenv("DB_NAME") or "MEO.db"
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+
+
+### DB接続 ###
+def get_connection():
+    """プロセス内で1つの接続を返す（WAL・busy_timeout設定済み）
+
+    SQLは同じ文字列を使えば解析済みのものが再利用される（sqlite3の文キャッシュ）。
+    """
+    global _conn, _conn_pid
+    with _lock:
+        # fork後の子プロセスでは親の接続を使わない
+        if _conn is None or _conn_pid != os.getpid():
+            conn = sqlite3.connect(
+                db_path(),
+                timeout=BUSY_TIMEOUT_MS / 1000,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=CACHED_STATEMENTS,
+            )
+            # 読み込みは書き込み中も待たずに済み、コミットは1回の追記で済む
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            # 起動後の最初の接続で未適用のスキーマ変更を適用する（適用済みなら確認のみ）
+            migrate(conn)
+            _conn, _conn_pid = conn, os.getpid()
+        return _conn
+
+
+def close_connection():
+    global _conn, _conn_pid
+    with _lock:
+        if _conn is not None and _conn_pid == os.getpid():
+            _conn.close()
+        _conn, _conn_pid = None, None
+
+
+atexit.register(close_connection)
+
+
+@contextmanager
+def connection():
+    """読み込み用に共有の接続を使う（スレッド間で同時に使わないようロックする）"""
+    with _lock:
+        yield get_connection()
+
+
+@contextmanager
+def transaction():
+    """1つのトランザクションで実行する（例外時はロールバック）
+
+    BEGIN IMMEDIATE で最初に書き込みロックを取るため、確認してから挿入するまでの間に
+    他のプロセスが同じレコードを挿入することはない。
+    """
+    with _lock:
+        conn = get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
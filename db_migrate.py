@@ -0,0 +1,252 @@
+# 標準ライブラリのインポート
+import os
+import sqlite3
+import time
+
+# サードパーティのライブラリインポート
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 適用済みのスキーマバージョンを記録するテーブル
+VERSION_TABLE = "schema_version"
+
+
+### マイグレーション ###
+# 各手順は既に同じ変更がされたDB（手動で変更済み等）に対しても安全に実行できるようにする
+def _create_meo(conn, table):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            user_name TEXT,
+            cache_key TEXT,
+            media_url TEXT,
+            datetime_value TEXT,
+            created DATETIME DEFAULT (DATETIME(CURRENT_TIMESTAMP,'localtime')),
+            PRIMARY KEY (user_name, cache_key)
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table.lower()}_created ON {table}(created)")
+
+
+def _add_datetime_value(conn, table):
+    # DB_create.py の旧スキーマには投稿日時の列がない
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if "datetime_value" not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN datetime_value TEXT")
+
+
+def _add_covering_index(conn, table):
+    # checkRecords の検索条件（user_name, datetime_value[, cache_key]）をこの索引だけで解決する
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{table.lower()}_user_datetime_key "
+        f"ON {table}(user_name, datetime_value, cache_key)"
+    )
+    conn.execute(f"ANALYZE {table}")
+
+
+def _add_phash_content_hash(conn, table):
+    # 近い画像を見つけた後、ストアの元画像と画素で比較するため、登録時の内容のハッシュを持たせる
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(IMAGE_PHASH)")}
+    if "content_hash" not in columns:
+        conn.execute("ALTER TABLE IMAGE_PHASH ADD COLUMN content_hash TEXT")
+
+
+def _sql(*statements):
+    """SQLを順に実行するだけの手順"""
+
+    def step(conn, table):
+        for statement in statements:
+            conn.execute(statement)
+
+    return step
+
+
+# (バージョン, 名前, 手順) — 追加する場合は末尾に次の番号で追加し、既存の手順は変更しない
+# 4以降は各モジュールが使用時に作成していたテーブル（作成済みのDBでは何も変わらない）
+MIGRATIONS = [
+    (1, "create_meo", _create_meo),
+    (2, "add_datetime_value", _add_datetime_value),
+    (3, "meo_covering_index", _add_covering_index),
+    (4, "create_account_visit", _sql(
+        """
+        CREATE TABLE IF NOT EXISTS ACCOUNT_VISIT (
+            user_name TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            visited_at REAL NOT NULL,
+            found_new INTEGER NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_account_visit ON ACCOUNT_VISIT(user_name, kind, visited_at)",
+    )),
+    (5, "create_profile_health", _sql(
+        """
+        CREATE TABLE IF NOT EXISTS PROFILE_HEALTH (
+            profile_name TEXT PRIMARY KEY,
+            strikes INTEGER NOT NULL DEFAULT 0,
+            quarantined_until REAL NOT NULL DEFAULT 0,
+            last_locked_at REAL,
+            reason TEXT
+        )
+        """,
+    )),
+    (6, "create_publish_job", _sql(
+        """
+        CREATE TABLE IF NOT EXISTS PUBLISH_JOB (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            mode TEXT NOT NULL,
+            user_name TEXT NOT NULL,
+            business_id TEXT NOT NULL,
+            process_id TEXT NOT NULL,
+            media_dir TEXT NOT NULL,
+            description TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_publish_job_status ON PUBLISH_JOB(status, next_attempt_at)",
+    )),
+    (7, "create_post_meta", _sql(
+        """
+        CREATE TABLE IF NOT EXISTS POST_META (
+            shortcode TEXT PRIMARY KEY,
+            user_name TEXT NOT NULL,
+            posted_at TEXT NOT NULL,
+            pinned INTEGER NOT NULL DEFAULT 0,
+            media_type TEXT,
+            media_count INTEGER,
+            updated_at REAL NOT NULL
+        )
+        """,
+    )),
+    (8, "create_grid_fingerprint", _sql(
+        """
+        CREATE TABLE IF NOT EXISTS GRID_FINGERPRINT (
+            user_name TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+    )),
+    (9, "create_media_index", _sql(
+        """
+        CREATE TABLE IF NOT EXISTS MEDIA_INDEX (
+            hash TEXT NOT NULL,
+            user_name TEXT NOT NULL,
+            shortcode TEXT,
+            kind TEXT NOT NULL,
+            ext TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            PRIMARY KEY (hash, user_name)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_media_index_created ON MEDIA_INDEX(created)",
+    )),
+    (10, "create_image_phash", _sql(
+        """
+        CREATE TABLE IF NOT EXISTS IMAGE_PHASH (
+            user_name TEXT NOT NULL,
+            dhash INTEGER NOT NULL,
+            shortcode TEXT NOT NULL DEFAULT '',
+            file_name TEXT,
+            created REAL NOT NULL,
+            PRIMARY KEY (user_name, dhash, shortcode)
+        )
+        """,
+    )),
+    (11, "create_selector_stats", _sql(
+        """
+        CREATE TABLE IF NOT EXISTS SELECTOR_STATS (
+            layout TEXT NOT NULL,
+            name TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            last_hit TEXT,
+            PRIMARY KEY (layout, name)
+        )
+        """,
+    )),
+    # 順位を段階内の直近の的中率で決めるため、試行回数を持たせ回数を減衰できる実数にする
+    # （以前の回数は採用されたセレクタだけの累計で的中率にならないため引き継がない）
+    (12, "selector_stats_hit_rate", _sql(
+        "DROP TABLE IF EXISTS SELECTOR_STATS",
+        """
+        CREATE TABLE SELECTOR_STATS (
+            layout TEXT NOT NULL,
+            name TEXT NOT NULL,
+            hits REAL NOT NULL DEFAULT 0,
+            attempts REAL NOT NULL DEFAULT 0,
+            last_hit TEXT,
+            PRIMARY KEY (layout, name)
+        )
+        """,
+    )),
+    (13, "image_phash_content_hash", _add_phash_content_hash),
+]
+
+
+### 実行 ###
+def current_version(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at REAL NOT NULL
+        )
+    """)
+    return conn.execute(f"SELECT COALESCE(MAX(version), 0) FROM {VERSION_TABLE}").fetchone()[0]
+
+
+def migrate(conn, logger=None, target=None, table=None):
+    """未適用のマイグレーションを順に適用する（適用済みなら何もしない）
+
+    手順ごとに BEGIN IMMEDIATE で書き込みロックを取り、バージョンを確認し直してから適用するため、
+    複数のプロセスが同時に起動しても同じ手順が2回適用されることはない。
+    conn は自動コミット（isolation_level=None）の接続を渡す。
+
+    Returns:
+        list: 今回適用したバージョン
+    """
+    table = table or os.getenv("TABLE_NAME") or "MEO"
+    target = MIGRATIONS[-1][0] if target is None else target
+    if current_version(conn) >= target:
+        return []
+
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if version > target:
+            break
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if current_version(conn) >= version:
+                conn.execute("COMMIT")
+                continue
+            step(conn, table)
+            conn.execute(
+                f"INSERT INTO {VERSION_TABLE} (version, name, applied_at) VALUES (?, ?, ?)",
+                (version, name, time.time()),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        applied.append(version)
+        if logger:
+            logger.info(f"スキーマを更新しました: {version} {name}")
+    return applied
+
+
+if __name__ == "__main__":
+    from db import db_path
+
+    conn = sqlite3.connect(db_path(), timeout=30, isolation_level=None)
+    try:
+        applied = migrate(conn)
+        print(f"適用したマイグレーション: {applied or 'なし'}")
+        print(f"現在のスキーマバージョン: {current_version(conn)}")
+    finally:
+        conn.close()
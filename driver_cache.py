@@ -0,0 +1,178 @@
+# 標準ライブラリのインポート
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# サードパーティのライブラリインポート
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 解決済みchromedriverの記録（Chromeのメジャーバージョンごと）
+CACHE_PATH = Path(os.getenv("CHROMEDRIVER_CACHE") or Path(__file__).parent / "driver_cache.json")
+
+# 同じプロセス内での解決結果
+_memo = {}
+_lock = threading.Lock()
+
+# 同じプロセス内で調べたChromeのメジャーバージョン（バージョン不一致で無効化されるまで調べ直さない）
+_UNCHECKED = object()
+_chrome_major = _UNCHECKED
+
+
+### chromedriverのパス取得 ###
+def get_chromedriver_path(logger):
+    """インストール済みChromeに対応するchromedriverのパスを返す
+
+    Chromeのメジャーバージョンごとに解決結果を保存し、2回目以降はwebdriver-managerを呼ばない。
+    Chromeが更新された場合のみwebdriver-managerで取得し直す。オフラインでも保存済みのパスを使う。
+    バージョンはプロセス内で1回だけ調べ、バージョン不一致（invalidate_chromedriver_cache）の後に調べ直す
+    """
+    # 明示的に指定されている場合はそれを使う
+    if os.getenv("CHROMEDRIVER_PATH"):
+        return os.getenv("CHROMEDRIVER_PATH")
+
+    major = _current_chrome_major()
+    key = major or "unknown"
+
+    with _lock:
+        if key in _memo and Path(_memo[key]).exists():
+            return _memo[key]
+
+        cache = _read_cache()
+        entry = cache.get(key)
+        if major and entry and Path(entry["path"]).exists():
+            _memo[key] = entry["path"]
+            return entry["path"]
+
+        # バージョンが判定できない場合は最後に使えたドライバーを使う
+        if major is None and _latest_cached_path(cache):
+            _memo[key] = _latest_cached_path(cache)
+            return _memo[key]
+
+        try:
+            path = _install_chromedriver(logger)
+        except Exception as e:
+            # オフライン等で取得できない場合は最後に使えたドライバーで試す
+            fallback = _latest_cached_path(cache)
+            if fallback:
+                logger.warning(f"chromedriverの取得に失敗したため保存済みのドライバーを使用します: {fallback} - {e}")
+                _memo[key] = fallback
+                return fallback
+            raise
+
+        if major:
+            cache[key] = {"path": path, "resolved": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+            _write_cache(cache)
+        logger.info(f"chromedriverを解決しました: Chrome {key} -> {path}")
+        _memo[key] = path
+        return path
+
+
+### キャッシュ無効化 ###
+def invalidate_chromedriver_cache(logger, error=None):
+    """バージョン不一致でドライバーが起動できなかった場合に、現在のChromeの記録を削除する"""
+    if error is not None and not is_version_mismatch(error):
+        return False
+
+    global _chrome_major
+    major = _current_chrome_major()
+    key = major or "unknown"
+    with _lock:
+        _memo.pop(key, None)
+        cache = _read_cache()
+        if cache.pop(key, None) is not None:
+            _write_cache(cache)
+        # Chromeが更新された可能性があるため、次回はバージョンを調べ直す
+        _chrome_major = _UNCHECKED
+    logger.info(f"chromedriverの記録を削除しました: Chrome {key}")
+    return True
+
+
+def is_version_mismatch(error):
+    return "This version of ChromeDriver only supports" in str(error)
+
+
+### Chromeのバージョン取得 ###
+def _current_chrome_major():
+    """プロセス内で調べ済みのメジャーバージョン（未確認の場合のみ調べる）"""
+    global _chrome_major
+    with _lock:
+        if _chrome_major is _UNCHECKED:
+            _chrome_major = get_chrome_major_version()
+        return _chrome_major
+
+
+def get_chrome_major_version():
+    """インストール済みChromeのメジャーバージョン（取得できない場合はNone）"""
+    version = _chrome_version_from_registry() or _chrome_version_from_binary()
+    if not version:
+        return None
+    return version.split(".")[0]
+
+
+def _chrome_version_from_registry():
+    if sys.platform != "win32":
+        return None
+    import winreg
+
+    for root in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
+        try:
+            with winreg.OpenKey(root, r"Software\Google\Chrome\BLBeacon") as key:
+                return winreg.QueryValueEx(key, "version")[0]
+        except OSError:
+            continue
+    return None
+
+
+def _chrome_version_from_binary():
+    candidates = [os.getenv("CHROME_BINARY"), "google-chrome", "google-chrome-stable", "chromium", "chromium-browser"]
+    for binary in candidates:
+        if not binary:
+            continue
+        try:
+            output = subprocess.run([binary, "--version"], capture_output=True, text=True, timeout=10).stdout
+        except (OSError, subprocess.SubprocessError):
+            continue
+        match = re.search(r"(\d+)\.\d+\.\d+\.\d+", output)
+        if match:
+            return match.group(0)
+    return None
+
+
+def _install_chromedriver(logger):
+    # 取得が必要なときだけ読み込む
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    logger.info("webdriver-managerでchromedriverを取得します")
+    return ChromeDriverManager().install()
+
+
+def _latest_cached_path(cache):
+    entries = [e for e in cache.values() if Path(e["path"]).exists()]
+    if not entries:
+        return None
+    entries.sort(key=lambda e: e.get("resolved") or "", reverse=True)
+    return entries[0]["path"]
+
+
+def _read_cache():
+    try:
+        with open(CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _write_cache(cache):
+    # 複数プロセスが同時に書いても壊れないよう一時ファイルから置き換える
+    tmp_path = CACHE_PATH.with_name(f"{CACHE_PATH.name}.{os.getpid()}.{int(time.time() * 1000)}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, CACHE_PATH)
@@ -0,0 +1,108 @@
+# 標準ライブラリのインポート
+import os
+import time
+import traceback
+
+# 自作モジュールのインポート
+import post
+import story
+from chrome_lease import close_driver
+from profile_health import record_profile_result
+
+# 1つのドライバーを使い回す最大回数（メモリ増加対策で定期的に再起動する）
+WARM_DRIVER_MAX_RUNS = int(os.getenv("WARM_DRIVER_MAX_RUNS") or "50")
+
+# スクリプト名と取得処理の対応
+SCRAPERS = {
+    "post.py": post.scrape_post,
+    "story.py": story.scrape_story,
+}
+
+
+### 常駐ドライバーセッション ###
+class DriverSession:
+    """プロファイルごとにWebDriverを起動したまま保持し、アカウント間で使い回す"""
+
+    def __init__(self, profile_name, logger):
+        # 割り当てがない場合（直列実行）は起動のたびに空いているプロファイルを選ぶ
+        self.assigned_profile = profile_name
+        self.profile_name = profile_name
+        self.logger = logger
+        self.driver = None
+        self.runs = 0
+
+    def run(self, script_name, username, process_id):
+        """post.py / story.py の取得処理を関数として実行し、結果をdictで返す
+
+        Returns:
+            dict: script, username, process_id, profile_name, code, elapsed, error
+        """
+        result = {
+            "script": script_name,
+            "username": username,
+            "process_id": process_id,
+            "profile_name": self.profile_name,
+            "code": 1,
+            "elapsed": 0.0,
+            "error": None,
+        }
+        start = time.time()
+
+        driver = self._get_driver()
+        if driver is None:
+            result["error"] = "Chromeドライバーの初期化に失敗しました"
+            result["elapsed"] = time.time() - start
+            return result
+
+        # スクリプト単体実行時と同じユーザー別ログに出力する
+        module = post if script_name == "post.py" else story
+        script_logger = module.setup_logger(username)
+        script_logger.info(f"処理開始 PROCESSID:{process_id}（常駐ドライバー: {self.profile_name}）")
+        script_logger.info(f"対象ユーザー: {username}")
+
+        try:
+            code = SCRAPERS[script_name](driver, username, process_id, script_logger)
+            # sys.exit(None) と同様に None は正常終了として扱う
+            result["code"] = 0 if code is None else code
+        except Exception as e:
+            result["error"] = str(e)
+            script_logger.error(f"予期せぬエラー: {e}\n{traceback.format_exc()}")
+            self.close()
+
+        self.runs += 1
+        result["elapsed"] = time.time() - start
+        record_profile_result(self.profile_name, result["code"], self.logger)
+
+        # 自動化検出・ロック時やセッション切れの場合は次回に新しいブラウザで始める
+        if result["code"] == 3 or self.runs >= WARM_DRIVER_MAX_RUNS or not self._is_alive():
+            self.close()
+
+        return result
+
+    def close(self):
+        if self.driver is not None:
+            self.logger.info(f"常駐ドライバーを終了します: {self.profile_name}")
+            close_driver(self.driver, self.logger)
+        self.driver = None
+        self.runs = 0
+
+    def _get_driver(self):
+        if self.driver is not None and self._is_alive():
+            return self.driver
+
+        self.close()
+        self.logger.info(f"常駐ドライバーを起動します: {self.profile_name or '自動選択'}")
+        driver, _ = post.get_chrome_driver_v2(self.logger, profile_name=self.assigned_profile)
+        if driver is not None:
+            self.driver = driver
+            self.profile_name = driver.glink_lease["profile_name"]
+        return driver
+
+    def _is_alive(self):
+        if self.driver is None:
+            return False
+        try:
+            _ = self.driver.current_url
+            return True
+        except Exception:
+            return False
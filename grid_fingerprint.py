@@ -0,0 +1,63 @@
+# 標準ライブラリのインポート
+import os
+import time
+
+# サードパーティのライブラリインポート
+from dotenv import load_dotenv
+
+# 自作モジュールのインポート
+from db import connection, transaction
+
+load_dotenv()
+
+# グリッドの指紋テーブル
+FINGERPRINT_TABLE = "GRID_FINGERPRINT"
+
+# 指紋が一致していても、この時間（時間）が経過したら通常どおり確認する
+FINGERPRINT_TTL_SECONDS = float(os.getenv("GRID_FINGERPRINT_TTL_HOURS") or "24") * 3600
+
+
+### 指紋の作成 ###
+def make_fingerprint(shortcodes, pinned_flags, settings=""):
+    """グリッド先頭の投稿（順序・ピン留め）と判定条件から指紋を作る
+
+    開始日・最大経過日数が変わった場合は別の指紋になるよう settings も含める
+    """
+    cards = "|".join(f"{code}:{1 if pinned else 0}" for code, pinned in zip(shortcodes, pinned_flags))
+    return f"{cards}#{settings}"
+
+
+### 前回から変化がないか ###
+def is_unchanged(user_name, fingerprint, now=None):
+    now = now or time.time()
+    with connection() as conn:
+        row = conn.execute(
+            f"SELECT fingerprint, updated_at FROM {FINGERPRINT_TABLE} WHERE user_name = ?", (user_name,)
+        ).fetchone()
+
+    return bool(row) and row[0] == fingerprint and now - row[1] < FINGERPRINT_TTL_SECONDS
+
+
+### 指紋の保存 ###
+def save_fingerprint(user_name, fingerprint):
+    """最後まで確認できた（新規取得・既存のみ・対象外）場合のみ保存する（is_complete で判定）"""
+    with transaction() as conn:
+        conn.execute(
+            f"INSERT OR REPLACE INTO {FINGERPRINT_TABLE} (user_name, fingerprint, updated_at) VALUES (?, ?, ?)",
+            (user_name, fingerprint, time.time()),
+        )
+
+
+### 確認が完了したか ###
+def is_complete(expected, confirmed, failed=0):
+    """指紋を保存してよい（対象をすべて確認できた）かを返す
+
+    途中で失敗したまま指紋を保存すると、次回以降は変化なしとしてスキップされ、
+    取りこぼしたメディアが再取得されなくなる。
+
+    Args:
+        expected: 確認すべき件数（グリッドの候補数・投稿内のメディア数）
+        confirmed: 確認できた件数（日時を取得できた候補・既存レコード・取得できたメディア）
+        failed: 失敗した件数
+    """
+    return expected > 0 and failed == 0 and confirmed == expected
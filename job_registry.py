@@ -0,0 +1,207 @@
+# 標準ライブラリのインポート
+import json
+import os
+import threading
+from pathlib import Path
+
+# サードパーティのライブラリインポート
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# アカウント定義ファイル（存在しない場合は GLINK_LIST.txt と .env から組み立てる）
+REGISTRY_PATH = Path(os.getenv("GLINK_REGISTRY") or Path(__file__).parent / "accounts.json")
+
+# 旧形式のコマンドリスト
+LEGACY_LIST_PATH = Path(__file__).parent / "GLINK_LIST.txt"
+
+# 実行種別
+VALID_MODES = ("GLINK", "GLINK_v2", "GLINK_v3")
+
+
+### アカウント定義 ###
+class JobRegistry:
+    """アカウント定義を読み込んで保持し、ファイルの更新時刻が変わったら読み直す
+
+    読み直しは参照を差し替えるだけなので、実行中の処理は読み込み済みの定義のまま続行する
+    """
+
+    def __init__(self, path=None, legacy_path=None):
+        self.path = Path(path or REGISTRY_PATH)
+        self.legacy_path = Path(legacy_path or LEGACY_LIST_PATH)
+        self.source = None
+        self.mtime = None
+        self.accounts = []
+        self.by_username = {}
+        self.lock = threading.Lock()
+
+    def reload_if_changed(self, logger=None):
+        """定義ファイルが変更されていれば読み直す（変更があった場合True）"""
+        source = self.path if self.path.exists() else self.legacy_path
+        try:
+            mtime = source.stat().st_mtime
+        except OSError:
+            if logger:
+                logger.error(f"アカウント定義ファイルが見つかりません: {source}")
+            return False
+
+        if source == self.source and mtime == self.mtime:
+            return False
+
+        try:
+            if source == self.path:
+                accounts = load_registry_file(source)
+            else:
+                accounts = load_legacy_list(source)
+        except Exception as e:
+            # 編集途中などで読めない場合は前回の定義で続行する
+            if logger:
+                logger.error(f"アカウント定義の読み込みに失敗したため前回の定義を使用します: {source} - {e}")
+            return False
+
+        by_username = {account["username"]: account for account in accounts}
+        with self.lock:
+            self.accounts = accounts
+            self.by_username = by_username
+            self.source = source
+            self.mtime = mtime
+
+        if logger:
+            logger.info(f"アカウント定義を読み込みました: {source}（{len(accounts)}件）")
+        return True
+
+    def commands(self):
+        """[実行種別, ユーザー名] のリストを優先度の高い順に返す（同じ優先度は定義順）"""
+        with self.lock:
+            accounts = self.accounts
+        enabled = [account for account in accounts if account["enabled"]]
+        enabled.sort(key=lambda account: account["priority"], reverse=True)
+        return [[account["mode"], account["username"]] for account in enabled]
+
+    def get_account(self, username):
+        with self.lock:
+            return self.by_username.get(username)
+
+
+### 定義ファイル読み込み ###
+def load_registry_file(path):
+    """accounts.json を読み込み、既定値を補ったアカウントのリストを返す"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    defaults = data.get("defaults", {})
+    accounts = []
+    seen = set()
+    for entry in data.get("accounts", []):
+        account = _normalize_account({**defaults, **entry})
+        if account["username"] in seen:
+            raise ValueError(f"ユーザー名が重複しています: {account['username']}")
+        seen.add(account["username"])
+        accounts.append(account)
+    return accounts
+
+
+### 旧形式の読み込み ###
+def load_legacy_list(path):
+    """GLINK_LIST.txt と .env（<ユーザー名>, <ユーザー名>_numN, <ユーザー名>_start）から組み立てる"""
+    accounts = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.strip().split()
+            if len(parts) != 2:
+                continue
+            mode, username = parts
+            accounts.append(_normalize_account({"username": username, "mode": mode, **env_account_settings(username)}))
+    return accounts
+
+
+### .envからの設定取得 ###
+def env_account_settings(username):
+    return {
+        "business_ids": get_env_business_ids(username),
+        "start_date": os.getenv(f"{username}_start"),
+        "max_age_days": os.getenv(f"{username}_max_age_days") or os.getenv("MAX_AGE_DAYS"),
+    }
+
+
+### ビジネスID取得（.env） ###
+def get_env_business_ids(username):
+    business_ids = []
+
+    # 基本のbusiness_idを追加
+    base_id = os.getenv(username)
+    if base_id:
+        business_ids.append(base_id)
+
+    # 追加のbusiness_idを確認
+    counter = 2
+    while True:
+        next_id = os.getenv(f"{username}_num{counter}")
+        if next_id:
+            business_ids.append(next_id)
+            counter += 1
+        else:
+            break
+
+    return business_ids
+
+
+def _normalize_account(entry):
+    username = entry.get("username")
+    if not username:
+        raise ValueError(f"username がありません: {entry}")
+
+    mode = entry.get("mode", "GLINK_v3")
+    if mode not in VALID_MODES:
+        raise ValueError(f"未知の実行種別です: {username} - {mode}")
+
+    business_ids = entry.get("business_ids") or []
+    if isinstance(business_ids, str):
+        business_ids = [business_ids]
+
+    max_age_days = entry.get("max_age_days")
+    start_date = entry.get("start_date")
+
+    return {
+        "username": username,
+        "mode": mode,
+        "business_ids": [str(b) for b in business_ids],
+        "start_date": str(start_date) if start_date else None,
+        "max_age_days": int(max_age_days) if max_age_days not in (None, "") else None,
+        "priority": int(entry.get("priority") or 0),
+        "enabled": _parse_bool(entry.get("enabled", True), f"{username} の enabled"),
+    }
+
+
+# 手で編集した定義ファイルで使われる文字列の真偽値
+TRUE_STRINGS = {"true", "1", "yes", "on"}
+FALSE_STRINGS = {"false", "0", "no", "off"}
+
+
+def _parse_bool(value, label):
+    """真偽値・0/1・"true"/"false" 等を bool にする（それ以外は定義ミスとして ValueError）"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in TRUE_STRINGS:
+            return True
+        if text in FALSE_STRINGS:
+            return False
+    raise ValueError(f"{label} は true / false で指定してください: {value!r}")
+
+
+# プロセス内で共有する定義
+registry = JobRegistry()
+
+
+### アカウント設定取得 ###
+def get_account_settings(username):
+    """post.py 等から使うアカウント設定（定義ファイルになければ .env から取得）"""
+    registry.reload_if_changed()
+    account = registry.get_account(username)
+    if account is None:
+        account = _normalize_account({"username": username, **env_account_settings(username)})
+    return account
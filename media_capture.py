@@ -0,0 +1,142 @@
+# 標準ライブラリのインポート
+import time
+from collections import OrderedDict, deque
+from urllib.parse import urlparse
+
+# 自作モジュールのインポート
+from page_ready import NETWORK_IDLE_TIMEOUT
+from perf_log import decode_event
+from scraper_core import get_complete_media_url
+
+# 動画の配信元（これ以外のmp4リクエストは無視する）
+MEDIA_HOSTS = ("cdninstagram.com", "fbcdn.net")
+
+# 保持する分割リクエストURLの上限（動画ごと）と動画数の上限
+MAX_FRAGMENTS = 64
+MAX_VIDEOS = 16
+
+# 対象のイベント（文字列で先に絞り込み、該当するものだけJSONを解析する）
+CAPTURE_METHODS = ("Network.requestWillBeSent", "Network.responseReceived")
+
+
+### パフォーマンスログの設定 ###
+def enable_network_logging(chrome_options):
+    """パフォーマンスログをネットワークイベントのみに絞る（バッファの肥大化を防ぐ）"""
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    chrome_options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+
+
+### 動画URLの取得 ###
+class MediaCapture:
+    """パフォーマンスログを少しずつ読み、配信元のmp4分割リクエストURLだけを動画ごとに保持する
+
+    ログ全体を保持・解析せず、読み込んだ分はその場で捨てる。
+    """
+
+    def __init__(self, driver, logger=None, max_fragments=MAX_FRAGMENTS, max_videos=MAX_VIDEOS):
+        self.driver = driver
+        self.logger = logger
+        self.max_fragments = max_fragments
+        self.max_videos = max_videos
+        self._fragments = OrderedDict()  # 動画ID -> deque(URL)
+
+    def reset(self):
+        """これまでのログと取得済みのURLを捨てる（対象の動画を開く直前に呼ぶ）"""
+        self.driver.get_log("performance")
+        self._fragments.clear()
+
+    def poll(self):
+        """新しいログを読み込み、追加された分割リクエストの数を返す"""
+        added = 0
+        for entry in self.driver.get_log("performance"):
+            if self.feed(entry.get("message", "")):
+                added += 1
+        return added
+
+    def feed(self, message):
+        """ログ1件を処理する（mp4の分割リクエストを追加した場合は True）"""
+        if ".mp4" not in message or not any(method in message for method in CAPTURE_METHODS):
+            return False
+        event = decode_event(message)
+        if event is None:
+            return False
+
+        params = event.get("params", {})
+        if event.get("method") == "Network.requestWillBeSent":
+            url = params.get("request", {}).get("url", "")
+        elif event.get("method") == "Network.responseReceived":
+            url = params.get("response", {}).get("url", "")
+        else:
+            return False
+        return self._add(url)
+
+    def _add(self, url):
+        parsed = urlparse(url)
+        if not parsed.path.endswith(".mp4") or not parsed.hostname:
+            return False
+        if not parsed.hostname.endswith(MEDIA_HOSTS):
+            return False
+
+        video_id = video_id_from_path(parsed.path)
+        fragments = self._fragments.get(video_id)
+        if fragments is None:
+            fragments = self._fragments[video_id] = deque(maxlen=self.max_fragments)
+            # 最初の動画（開いたページのプレーヤー）は残し、その次に古い動画から捨てる
+            while len(self._fragments) > self.max_videos:
+                del self._fragments[list(self._fragments)[1]]
+        if url in fragments:
+            return False
+        fragments.append(url)
+        return True
+
+    def collect(self, timeout=None, idle=0.5, poll_interval=0.2):
+        """分割リクエストが idle 秒増えなくなるまで（最大 timeout 秒）ログを読み続ける"""
+        timeout = timeout or NETWORK_IDLE_TIMEOUT
+        start = time.time()
+        last_added = start
+        seen_any = bool(self._fragments)
+        while time.time() - start < timeout:
+            if self.poll():
+                seen_any = True
+                last_added = time.time()
+            elif seen_any and time.time() - last_added >= idle:
+                break
+            time.sleep(poll_interval)
+        if self.logger:
+            self.logger.info(
+                f"[capture] 動画{len(self._fragments)}件 / 分割リクエスト{len(self.urls())}件（{time.time() - start:.2f}秒）"
+            )
+
+    def video_ids(self):
+        return list(self._fragments)
+
+    def urls(self, video_id=None):
+        """分割リクエストURLを返す（video_id 省略時はすべての動画）"""
+        if video_id is not None:
+            return list(self._fragments.get(video_id, ()))
+        return [url for fragments in self._fragments.values() for url in fragments]
+
+    def primary_video_id(self):
+        """開いたページの動画ID（reset() 後に最初に要求された動画）を返す
+
+        おすすめ投稿や次のストーリーの先読みは、開いた動画より後に要求される。
+        """
+        return next(iter(self._fragments), None)
+
+    def complete_url(self, video_id=None):
+        """1つの動画の分割リクエストから全体URLを返す（get_complete_media_url と同じ規則）
+
+        別の動画の分割リクエストとは混ぜない（video_id 省略時は primary_video_id の動画）。
+        """
+        video_id = self.primary_video_id() if video_id is None else video_id
+        if video_id is None:
+            return None
+        if self.logger and len(self._fragments) > 1:
+            self.logger.info(f"[capture] 動画{len(self._fragments)}件のうち {video_id} を使用します")
+        return get_complete_media_url(self.urls(video_id))
+
+
+def video_id_from_path(path):
+    """URLのパス末尾から動画IDを取り出す（getkey_blob と同じ規則）"""
+    key = path.rstrip("/").rsplit("/", 1)[-1].split(".mp4")[0]
+    return key.split("_video_dashinit")[0]
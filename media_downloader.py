@@ -0,0 +1,321 @@
+# 標準ライブラリのインポート
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse, urlunparse
+
+# サードパーティのライブラリインポート
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+load_dotenv()
+
+# 1投稿分のメディアを同時に取得する数
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS") or "4")
+
+# 分割ダウンロードの1区間のサイズ（バイト）と同時接続数
+RANGE_CHUNK_BYTES = int(os.getenv("DOWNLOAD_RANGE_CHUNK_MB") or "2") * 1024 * 1024
+RANGE_WORKERS = int(os.getenv("DOWNLOAD_RANGE_WORKERS") or "4")
+
+# 1区間あたりの再試行回数
+RANGE_ATTEMPTS = 3
+
+# 途中まで取得した動画（.part）と取得済み区間の記録（.json）の置き場所。次回の取得で続きから再開する
+PARTIAL_DIR = os.getenv("DOWNLOAD_PARTIAL_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "media", "partial")
+
+# この時間（時間）更新のない途中ファイルは再開せず削除する
+PARTIAL_MAX_AGE_SECONDS = float(os.getenv("DOWNLOAD_PARTIAL_MAX_AGE_HOURS") or "48") * 3600
+
+# 書き込み単位（メモリ使用量はこのサイズ×同時接続数程度に収まる）
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# 接続・読み込みのタイムアウト（秒）
+TIMEOUT = (10, 60)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class RangeNotSupported(Exception):
+    """区間指定が無視された（全体が返ってきた）場合"""
+
+
+### 接続の共有 ###
+def get_session():
+    """接続を使い回すSession（スレッド間で共有。一時的なエラーは間隔を空けて再試行する）"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            retry = Retry(
+                total=3,
+                backoff_factor=1,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",),
+            )
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=max(RANGE_WORKERS * DOWNLOAD_WORKERS, 10),
+                max_retries=retry,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+### 分割ダウンロード ###
+def byte_range_of(url):
+    """bytestart / byteend 付きのURLなら (bytestart, byteend) を返す"""
+    params = parse_qs(urlparse(url).query)
+    try:
+        return int(params["bytestart"][0]), int(params["byteend"][0])
+    except (KeyError, ValueError, IndexError):
+        return None
+
+
+def with_byte_range(url, start, end):
+    """bytestart / byteend だけを差し替えたURL（他のパラメータは署名があるため元の表記のまま残す）"""
+    parsed = urlparse(url)
+    params = [p for p in parsed.query.split("&") if p and p.split("=", 1)[0] not in ("bytestart", "byteend")]
+    params += [f"bytestart={start}", f"byteend={end}"]
+    return urlunparse(parsed._replace(query="&".join(params)))
+
+
+def download_ranged(url, filename, logger, chunk_bytes=None, workers=None):
+    """get_complete_media_url のURL（bytestart=0&byteend=最大）を区間ごとに並列で取得する
+
+    事前に確保したファイルへ各区間を直接書き込む。通信が途中で切れた区間は、
+    書き込み済みの位置から取得し直す。それでも失敗した場合は途中ファイルと取得済み区間の記録を残し、
+    同じ動画を次に取得するとき（同じ実行内の再試行・次回の実行）に残りの区間だけを取得する。
+
+    Returns:
+        bool: 取得・検証に成功したら True
+    """
+    byte_range = byte_range_of(url)
+    if byte_range is None or byte_range[0] != 0:
+        raise ValueError(f"区間指定のないURLです: {url}")
+
+    chunk_bytes = chunk_bytes or RANGE_CHUNK_BYTES
+    total = byte_range[1] + 1
+    ranges = [(start, min(start + chunk_bytes, total) - 1) for start in range(0, total, chunk_bytes)]
+
+    purge_stale_partials(logger)
+    part_path, progress_path = partial_paths(url, total)
+    done = _load_progress(part_path, progress_path, total, chunk_bytes)
+    if done:
+        logger.info(f"途中まで取得済みの動画を再開します: {len(done)}/{len(ranges)}区間取得済み")
+    else:
+        # 事前にファイルを確保し、完成するまでは .part のまま置く
+        os.makedirs(os.path.dirname(part_path), exist_ok=True)
+        with open(part_path, "wb") as f:
+            f.truncate(total)
+        _save_progress(progress_path, total, chunk_bytes, done)
+    pending = [r for r in ranges if r[0] not in done]
+    logger.info(f"分割ダウンロードを開始します: {total}バイト / {len(pending)}区間")
+
+    progress_lock = threading.Lock()
+
+    def fetch(byte_range):
+        written = _fetch_range(url, part_path, byte_range)
+        # 完了した区間を記録する（中断しても次回はこの区間を取得しない）
+        with progress_lock:
+            done.add(byte_range[0])
+            _save_progress(progress_path, total, chunk_bytes, done)
+        return written
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers or RANGE_WORKERS) as executor:
+            list(executor.map(fetch, pending))
+
+        size = os.path.getsize(part_path)
+        if len(done) != len(ranges) or size != total:
+            raise IOError(f"ダウンロードサイズが一致しません: {len(done)}/{len(ranges)}区間, {size} / {total}バイト")
+        os.replace(part_path, filename)
+        _remove_partial(progress_path)
+    except RangeNotSupported:
+        # 一括取得に切り替えるため、途中ファイルは使わない
+        _remove_partial(part_path, progress_path)
+        raise
+    except Exception:
+        logger.warning(f"分割ダウンロードを中断しました（次回は続きから取得します）: {len(done)}/{len(ranges)}区間取得済み")
+        raise
+
+    logger.info(f"分割ダウンロード完了: {filename}（{total}バイト）")
+    return True
+
+
+def partial_paths(url, total):
+    """同じ動画なら実行をまたいでも同じ途中ファイルになるパス
+
+    署名やホスト名は取得のたびに変わることがあるため、URLのパスと全体のサイズで動画を識別する。
+    """
+    key = hashlib.sha1(f"{urlparse(url).path}:{total}".encode("utf-8")).hexdigest()
+    base = os.path.join(PARTIAL_DIR, key)
+    return f"{base}.part", f"{base}.json"
+
+
+def _load_progress(part_path, progress_path, total, chunk_bytes):
+    """取得済み区間の開始位置の集合（途中ファイルがない・条件が変わった場合は空）"""
+    try:
+        with open(progress_path, "r", encoding="utf-8") as f:
+            progress = json.load(f)
+        if (
+            progress.get("total") == total
+            and progress.get("chunk_bytes") == chunk_bytes
+            and os.path.getsize(part_path) == total
+        ):
+            return set(progress.get("done", []))
+    except (OSError, ValueError):
+        pass
+    return set()
+
+
+def _save_progress(progress_path, total, chunk_bytes, done):
+    # 中断されても記録が壊れないよう一時ファイルから置き換える
+    tmp_path = f"{progress_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"total": total, "chunk_bytes": chunk_bytes, "done": sorted(done)}, f)
+    os.replace(tmp_path, progress_path)
+
+
+def _remove_partial(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def purge_stale_partials(logger):
+    """長く再開されていない途中ファイルを削除する（動画が削除された等で二度と完成しないもの）"""
+    if not os.path.isdir(PARTIAL_DIR):
+        return
+    cutoff = time.time() - PARTIAL_MAX_AGE_SECONDS
+    for name in os.listdir(PARTIAL_DIR):
+        path = os.path.join(PARTIAL_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                logger.info(f"古い途中ファイルを削除しました: {name}")
+        except OSError:
+            continue
+
+
+def _fetch_range(url, part_path, byte_range):
+    """1区間を取得して書き込み、書き込んだバイト数を返す（切れた場合は続きから再試行）"""
+    start, end = byte_range
+    expected = end - start + 1
+    written = 0
+    last_error = None
+    for _ in range(RANGE_ATTEMPTS):
+        position = start + written
+        try:
+            with get_session().get(with_byte_range(url, position, end), stream=True, timeout=TIMEOUT) as response:
+                response.raise_for_status()
+                length = response.headers.get("Content-Length")
+                if length and int(length) != end - position + 1:
+                    raise RangeNotSupported(f"区間 {position}-{end} の応答サイズが {length} バイトです")
+
+                with open(part_path, "r+b") as f:
+                    f.seek(position)
+                    for chunk in response.iter_content(STREAM_CHUNK_BYTES):
+                        if written + len(chunk) > expected:
+                            raise RangeNotSupported(f"区間 {start}-{end} の応答が想定より大きいです")
+                        f.write(chunk)
+                        written += len(chunk)
+            if written == expected:
+                return written
+            last_error = IOError(f"区間 {start}-{end} が途中で切れました: {written}/{expected}バイト")
+        except RangeNotSupported:
+            raise
+        except (requests.RequestException, IOError) as e:
+            last_error = e
+    raise last_error
+
+
+### 通常のダウンロード ###
+def download_stream(url, filename):
+    """全体を1回で取得し、少しずつファイルに書き込む
+
+    途中で失敗した場合は .part を残し、同じURLを次に取得するときは Range ヘッダーで続きから取得する
+    （サーバーが区間指定に応じない場合は最初から取得し直す）。
+    """
+    part_path = stream_partial_path(url)
+    os.makedirs(os.path.dirname(part_path), exist_ok=True)
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else None
+
+    with get_session().get(url, stream=True, timeout=TIMEOUT, headers=headers) as response:
+        if response.status_code == 416:
+            # 記録と内容が合わない途中ファイル。次の取得では最初から取得する
+            _remove_partial(part_path)
+        response.raise_for_status()
+
+        resumed = offset and response.status_code == 206
+        with open(part_path, "ab" if resumed else "wb") as f:
+            for chunk in response.iter_content(STREAM_CHUNK_BYTES):
+                f.write(chunk)
+
+        # 続きから取得した場合は全体のサイズ（Content-Range: bytes a-b/全体）と照合する
+        content_range = response.headers.get("Content-Range", "")
+        if resumed and "/" in content_range and content_range.rsplit("/", 1)[1].isdigit():
+            expected = int(content_range.rsplit("/", 1)[1])
+            if os.path.getsize(part_path) != expected:
+                raise IOError(f"ダウンロードサイズが一致しません: {os.path.getsize(part_path)} / {expected}バイト")
+
+    os.replace(part_path, filename)
+    return True
+
+
+def stream_partial_path(url):
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return os.path.join(PARTIAL_DIR, f"{key}.stream.part")
+
+
+def download_to_file(url, filename, logger):
+    """区間指定付きの動画URLは分割・並列で、それ以外は1回で取得する"""
+    if byte_range_of(url):
+        try:
+            return download_ranged(url, filename, logger)
+        except RangeNotSupported as e:
+            logger.warning(f"区間指定に対応していないため一括で取得します: {e}")
+    return download_stream(url, filename)
+
+
+### 並列ダウンロード ###
+def download_all(jobs, logger, workers=None, on_complete=None):
+    """[(url, filename)] を同時に取得する（同時実行数は workers まで）
+
+    Args:
+        on_complete: 取得できたファイルごとに呼ぶ関数（画像の加工等）。ファイル名を変えた場合は新しい名前を返す
+
+    Returns:
+        list: jobs と同じ順序の保存先（失敗したものは None）
+    """
+
+    def run(job):
+        url, filename = job
+        try:
+            print(f"ダウンロードを開始します: {filename}")
+            logger.info(f"ダウンロードを開始します: {filename}")
+            download_to_file(url, filename, logger)
+            if on_complete:
+                return on_complete(filename) or filename
+            return filename
+        except Exception as e:
+            print(f"メディアダウンロードでエラーが発生しました: {str(e)}")
+            logger.error(f"メディアダウンロードでエラーが発生しました: {filename} - {str(e)}")
+            if os.path.exists(filename):
+                os.remove(filename)
+            return None
+
+    if len(jobs) == 1:
+        return [run(jobs[0])]
+    with ThreadPoolExecutor(max_workers=min(workers or DOWNLOAD_WORKERS, len(jobs))) as executor:
+        return list(executor.map(run, jobs))
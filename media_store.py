@@ -0,0 +1,140 @@
+# 標準ライブラリのインポート
+import hashlib
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+# サードパーティのライブラリインポート
+from dotenv import load_dotenv
+
+# 自作モジュールのインポート
+from db import transaction
+
+load_dotenv()
+
+# 内容のハッシュ（SHA-256）で保存するメディアの置き場所
+STORE_DIR = Path(__file__).parent / "media" / "store"
+
+# メディアの索引テーブル
+INDEX_TABLE = "MEDIA_INDEX"
+
+# ハッシュ計算の読み込み単位
+READ_CHUNK_BYTES = 1024 * 1024
+
+# 拡張子と種類
+KINDS = {".jpg": "image", ".jpeg": "image", ".png": "image", ".mp4": "video", ".mov": "video", ".avi": "video"}
+
+
+### ハッシュ計算 ###
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_path(digest, ext):
+    """store/ab/cd/<hash>.<ext>（1フォルダのファイル数が増えすぎないよう先頭4文字で分ける）"""
+    return STORE_DIR / digest[:2] / digest[2:4] / f"{digest}{ext}"
+
+
+### メディアの登録 ###
+def add_media(path, user_name, shortcode=None, logger=None, ext=None):
+    """取得したファイルをストアに登録する（同じ内容が既にあれば保存しない）
+
+    作業用のファイル（path）はGBP投稿に使うため残し、ストア側はコピーで持つ
+    （ハードリンクだと作業用ファイルの加工がストアの内容まで変えてしまい、ハッシュと一致しなくなる）。
+    ext はファイル名の拡張子と異なる場合（取得中の一時ファイル等）に指定する。
+
+    Returns:
+        tuple: (ハッシュ, 新規に保存したか)
+    """
+    path = Path(path)
+    ext = (ext or path.suffix).lower()
+    digest = file_sha256(path)
+    target = store_path(digest, ext)
+
+    is_new = not target.exists()
+    if is_new:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # 書き込み途中のファイルを登録済みと誤認しないよう、一時ファイルにコピーしてから置き換える
+        tmp_path = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.copy2(path, tmp_path)
+        os.replace(tmp_path, target)
+
+    with transaction() as conn:
+        conn.execute(
+            f"INSERT INTO {INDEX_TABLE} (hash, user_name, shortcode, kind, ext, size, created) "
+            f"VALUES (?, ?, ?, ?, ?, ?, ?) "
+            f"ON CONFLICT(hash, user_name) DO UPDATE SET "
+            f"shortcode = COALESCE(excluded.shortcode, shortcode), created = excluded.created",
+            (digest, user_name, shortcode, KINDS.get(ext, "other"), ext, path.stat().st_size, time.time()),
+        )
+
+    if logger and not is_new:
+        logger.info(f"同じ内容のメディアが保存済みです: {digest[:12]}（{path.name}）")
+    return digest, is_new
+
+
+def is_stored(path):
+    """同じ内容のファイルがストアにあるか"""
+    path = Path(path)
+    return store_path(file_sha256(path), path.suffix.lower()).exists()
+
+
+### 作業用ファイルの片付け ###
+def release_working_file(path, backup_dir):
+    """投稿済みの作業用ファイルを片付ける
+
+    ストアに登録済みであれば削除し、未登録（変換後の動画等）であれば従来どおり backup_dir に移動する。
+
+    Returns:
+        bool: ストア登録済みだったか
+    """
+    path = Path(path)
+    if is_stored(path):
+        path.unlink()
+        return True
+    Path(backup_dir).mkdir(parents=True, exist_ok=True)
+    shutil.move(str(path), str(Path(backup_dir) / path.name))
+    return False
+
+
+### 古いメディアの削除 ###
+def purge_media_older_than(days, logger):
+    """最後に取得されてから days 日以上経ったメディアを索引とストアから削除する
+
+    Returns:
+        int: 削除したファイル数
+    """
+    cutoff = time.time() - days * 86400
+    with transaction() as conn:
+        expired = conn.execute(
+            f"SELECT DISTINCT hash, ext FROM {INDEX_TABLE} WHERE created <= ?", (cutoff,)
+        ).fetchall()
+        conn.execute(f"DELETE FROM {INDEX_TABLE} WHERE created <= ?", (cutoff,))
+        # 他のユーザーで最近取得された同じ内容は残す
+        still_used = {
+            digest
+            for digest, _ in expired
+            if conn.execute(f"SELECT 1 FROM {INDEX_TABLE} WHERE hash = ? LIMIT 1", (digest,)).fetchone()
+        }
+
+    deleted = 0
+    for digest, ext in expired:
+        if digest in still_used:
+            continue
+        target = store_path(digest, ext)
+        try:
+            target.unlink()
+            deleted += 1
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            logger.error(f"メディアの削除に失敗しました: {target} - {e}")
+
+    logger.info(f"ストアの古いメディアを削除しました: {deleted}件（{days}日以上前）")
+    return deleted
@@ -0,0 +1,95 @@
+# 標準ライブラリのインポート
+import os
+import time
+
+# Seleniumに関連するインポート
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+# 各ステップの待機上限（秒）
+PROFILE_READY_TIMEOUT = float(os.getenv("PROFILE_READY_TIMEOUT") or "20")
+POST_READY_TIMEOUT = float(os.getenv("POST_READY_TIMEOUT") or "12")
+NETWORK_IDLE_TIMEOUT = float(os.getenv("NETWORK_IDLE_TIMEOUT") or "5")
+
+# プロフィールページの状態判定（表示されたものを返す。まだなら null）
+PROFILE_STATE_SCRIPT = """
+const username = arguments[0];
+const hasText = (selector, pattern) =>
+    Array.from(document.querySelectorAll(selector)).some(el => pattern.test(el.textContent || ''));
+if (hasText('h1, div.core p', /Sorry, something went wrong|working on getting this fixed/)) return 'error';
+if (hasText('span', /このページはご利用いただけません|リンクに問題があるか|エラーが発生しました|問題が発生したため/)) return 'error';
+if (document.querySelector('a._a6hd[href*="/p/"], a._a6hd[href*="/reel/"]')) return 'grid';
+if (hasText('span', /投稿はまだありません/)) return 'empty';
+if (arguments[1] && document.querySelector(`img[alt*="${username}のプロフィール写真"]`)) return 'profile';
+return null;
+"""
+
+
+### 条件待機 ###
+def wait_for(driver, condition, timeout, logger, label, poll=0.2):
+    """条件が満たされるまで待ち、所要時間をログに出す（タイムアウト時は None を返す）"""
+    start = time.time()
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=poll).until(condition)
+        if logger:
+            logger.info(f"[ready] {label}: {time.time() - start:.2f}秒")
+        return result
+    except TimeoutException:
+        if logger:
+            logger.warning(f"[ready] {label}: {timeout:.0f}秒以内に準備できませんでした")
+        return None
+
+
+### プロフィールページ ###
+def wait_for_profile_ready(driver, username, logger, timeout=None, include_profile_image=False):
+    """グリッド・投稿なし表示・エラー表示のいずれかが出るまで待つ
+
+    Returns:
+        str: 'grid' / 'empty' / 'error' / 'profile'（タイムアウト時は None）
+    """
+    return wait_for(
+        driver,
+        lambda d: d.execute_script(PROFILE_STATE_SCRIPT, username, include_profile_image),
+        timeout or PROFILE_READY_TIMEOUT,
+        logger,
+        "プロフィールページ",
+    )
+
+
+### 投稿ページ ###
+def wait_for_post_ready(driver, logger, timeout=None):
+    """投稿ページの time[datetime] が出るまで待つ"""
+    return wait_for(
+        driver,
+        lambda d: d.execute_script("return document.querySelector('time[datetime]') !== null;") or None,
+        timeout or POST_READY_TIMEOUT,
+        logger,
+        "投稿ページ",
+    )
+
+
+### 要素のテキスト変化 ###
+def wait_for_text_change(driver, element, previous_text, logger=None, timeout=2):
+    """クリック後に要素のテキストが変わる（展開される）まで待つ"""
+    return wait_for(
+        driver,
+        lambda d: (element.get_attribute("innerText") or "") != previous_text,
+        timeout,
+        logger,
+        "テキスト展開",
+        poll=0.1,
+    )
+
+
+### 画像の読み込み ###
+def wait_for_image_loaded(driver, css_selector, logger, timeout=3):
+    """表示中の画像の読み込みが完了するまで待つ（遅延読み込み対策）"""
+    script = "const img = document.querySelector(arguments[0]); return !!img && img.complete && img.naturalWidth > 0;"
+    return wait_for(
+        driver,
+        lambda d: d.execute_script(script, css_selector) or None,
+        timeout,
+        logger,
+        "画像読み込み",
+        poll=0.1,
+    )
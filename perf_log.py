@@ -0,0 +1,51 @@
+# 標準ライブラリのインポート
+import json
+
+# パフォーマンスログ（driver.get_log("performance")）の共通処理
+# 全件をJSON解析せず、生の文字列で先に絞り込んでから該当するものだけ解析する
+
+
+### 生メッセージの絞り込み ###
+def iter_messages(logs, *markers):
+    """markers をすべて含むエントリの生のメッセージ文字列を返す（JSON解析しない）"""
+    for entry in logs:
+        message = entry.get("message", "")
+        if all(marker in message for marker in markers):
+            yield message
+
+
+### イベントの解析 ###
+def decode_event(message):
+    """メッセージ文字列を解析し、CDPイベント（method / params）を返す（解析できなければ None）"""
+    try:
+        event = json.loads(message).get("message")
+    except (json.JSONDecodeError, AttributeError):
+        return None
+    return event if isinstance(event, dict) else None
+
+
+def iter_events(logs, *markers, methods=None):
+    """markers をすべて含むエントリだけを解析し、CDPイベントを返す
+
+    Args:
+        methods: 対象のイベント名（例: ("Network.responseReceived",)）。省略時はすべて
+    """
+    for message in iter_messages(logs, *markers):
+        event = decode_event(message)
+        if event is None:
+            continue
+        if methods and event.get("method") not in methods:
+            continue
+        yield event
+
+
+### リクエストURLの取得 ###
+def iter_request_urls(logs, *url_markers):
+    """url_markers をすべて含むリクエストURLを返す（重複はそのまま）"""
+    for event in iter_events(logs, '"request"', *url_markers):
+        request = event.get("params", {}).get("request")
+        if not isinstance(request, dict):
+            continue
+        url = request.get("url", "")
+        if all(marker in url for marker in url_markers):
+            yield url
@@ -0,0 +1,257 @@
+# 標準ライブラリのインポート
+import os
+import shutil
+import time
+from pathlib import Path
+
+# サードパーティのライブラリインポート
+from dotenv import load_dotenv
+
+# 自作モジュールのインポート
+from db import connection, transaction
+from media_store import file_sha256, store_path
+
+load_dotenv()
+
+# 画像の知覚ハッシュテーブル
+PHASH_TABLE = "IMAGE_PHASH"
+
+# このハミング距離以下の画像は同じ画像（再エンコード・再アップロード）とみなす
+DUPLICATE_DISTANCE = int(os.getenv("PHASH_DUPLICATE_DISTANCE") or "3")
+
+# 重複の確認対象とする期間（日）
+PHASH_WINDOW_DAYS = float(os.getenv("PHASH_WINDOW_DAYS") or "90")
+
+# ハッシュが近い画像は、ストアの元画像と同じ大きさで、グレースケールの画素の差がすべてこの値以下の場合のみ
+# 同じ画像とみなす（単色背景に文字だけの画像は、日付が違うだけでもハッシュがほぼ同じになるため）
+# JPEGの再圧縮による差は50前後まで、小さい文字1つの違いは80以上になる。縮小すると文字の違いが薄まるため原寸で比べる
+CONFIRM_MAX_DIFF = int(os.getenv("PHASH_CONFIRM_MAX_DIFF") or "64")
+
+# 同じ画像と判定した画像の移動先（削除せずに残す）
+DUPLICATE_BACKUP_DIR = Path(__file__).parent / "media" / "media_bk" / "duplicates"
+
+# ハッシュのビット数と、マルチインデックスの分割数（16ビットずつ4つ）
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+# プロセス内で構築済みのインデックス（ユーザーごと）
+_indexes = {}
+
+
+### 知覚ハッシュ（dHash） ###
+def dhash(path, hash_size=8):
+    """縮小したグレースケール画像の隣接画素の明暗から64ビットのハッシュを作る
+
+    再圧縮・リサイズ・軽い色調整では数ビットしか変わらない
+    """
+    # 画像処理時のみ読み込む
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(path) as img:
+        gray = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = np.asarray(gray, dtype=np.int16)
+
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+### 画素の比較 ###
+def confirm_duplicate(path, other_path, max_diff=None):
+    """2つの画像が同じ大きさで、グレースケールの画素の差がすべて max_diff 以下なら True"""
+    import numpy as np
+    from PIL import Image
+
+    max_diff = CONFIRM_MAX_DIFF if max_diff is None else max_diff
+    pixels = []
+    for p in (path, other_path):
+        with Image.open(p) as img:
+            if pixels and img.size != pixels[0].shape[::-1]:
+                return False
+            pixels.append(np.asarray(img.convert("L"), dtype=np.int16))
+    return int(np.abs(pixels[0] - pixels[1]).max()) <= max_diff
+
+
+### マルチインデックス・ハミング検索 ###
+class MultiIndexHashTable:
+    """64ビットハッシュを16ビットずつ4分割して索引する
+
+    距離 DUPLICATE_DISTANCE（<4）以内のハッシュは、いずれかの分割が完全一致する（鳩の巣原理）ため、
+    一致した候補だけ距離を計算すればよい。距離が4以上の場合はNumPyで全件を比較する。
+    """
+
+    def __init__(self):
+        self.hashes = []
+        self.labels = []
+        self.tables = [{} for _ in range(CHUNKS)]
+        self._array = None
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, value, label=None):
+        index = len(self.hashes)
+        self.hashes.append(value)
+        self.labels.append(label)
+        for i, chunk in enumerate(_chunks(value)):
+            self.tables[i].setdefault(chunk, []).append(index)
+        self._array = None
+
+    def query(self, value, max_distance=DUPLICATE_DISTANCE):
+        """max_distance 以内の (距離, label) を距離の近い順に返す"""
+        if max_distance >= CHUNKS:
+            return self._scan(value, max_distance)
+
+        candidates = set()
+        for i, chunk in enumerate(_chunks(value)):
+            candidates.update(self.tables[i].get(chunk, ()))
+        matches = []
+        for index in candidates:
+            distance = hamming(value, self.hashes[index])
+            if distance <= max_distance:
+                matches.append((distance, self.labels[index]))
+        return sorted(matches, key=lambda m: m[0])
+
+    def _scan(self, value, max_distance):
+        import numpy as np
+
+        if not self.hashes:
+            return []
+        if self._array is None:
+            self._array = np.array(self.hashes, dtype=np.uint64)
+        xor = np.bitwise_xor(self._array, np.uint64(value))
+        # 8ビットずつに分けて立っているビットを数える
+        distances = np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+        found = np.nonzero(distances <= max_distance)[0]
+        return sorted(((int(distances[i]), self.labels[i]) for i in found), key=lambda m: m[0])
+
+
+def _chunks(value):
+    return [(value >> (CHUNK_BITS * i)) & CHUNK_MASK for i in range(CHUNKS)]
+
+
+### 保存済みハッシュの読み込み ###
+def load_index(user_name):
+    """ユーザーの保存済みハッシュからインデックスを作る（プロセス内で1回のみ）
+
+    label は (shortcode, 内容のハッシュ)。内容のハッシュはストアの元画像と画素で比較するために使う。
+    """
+    if user_name in _indexes:
+        return _indexes[user_name]
+
+    since = time.time() - PHASH_WINDOW_DAYS * 86400
+    with connection() as conn:
+        rows = conn.execute(
+            f"SELECT dhash, shortcode, content_hash FROM {PHASH_TABLE} WHERE user_name = ? AND created >= ?",
+            (user_name, since),
+        ).fetchall()
+
+    index = MultiIndexHashTable()
+    for value, shortcode, content_hash in rows:
+        index.add(_from_signed(value), (shortcode, content_hash))
+    _indexes[user_name] = index
+    return index
+
+
+def save_hashes(user_name, records):
+    """[(dhash, shortcode, file_name, 内容のハッシュ)] を保存する"""
+    now = time.time()
+    with transaction() as conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {PHASH_TABLE} (user_name, dhash, shortcode, file_name, content_hash, created) "
+            f"VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (user_name, _to_signed(value), shortcode or "", file_name, content_hash, now)
+                for value, shortcode, file_name, content_hash in records
+            ],
+        )
+
+
+def _to_signed(value):
+    # SQLiteのINTEGERは符号付き64ビット
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _from_signed(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+### 重複画像の除外 ###
+def filter_near_duplicates(paths, user_name, shortcode, logger):
+    """過去に取得した画像とほぼ同じ画像を投稿対象から外し、残った画像のパスを返す
+
+    キャッシュキーが変わった再配信や、同じ写真の再アップロードをGBPに再投稿しないためのもの。
+    ハッシュが近いだけでは外さず、ストアの元画像と画素で比較して同じと確認できた場合のみ
+    DUPLICATE_BACKUP_DIR に移動する（元画像がない場合は外さない）。
+    同じ投稿（shortcode）内の画像同士は比較しない。
+    """
+    if not paths:
+        return []
+    try:
+        index = load_index(user_name)
+    except Exception as e:
+        logger.warning(f"画像ハッシュの読み込みに失敗したため、重複確認を省略します: {e}")
+        return list(paths)
+
+    kept = []
+    records = []
+    for path in paths:
+        try:
+            value = dhash(path)
+            content_hash = file_sha256(path)
+        except Exception as e:
+            logger.warning(f"画像ハッシュの計算に失敗しました: {path} - {e}")
+            kept.append(path)
+            continue
+
+        matches = [m for m in index.query(value) if not shortcode or m[1][0] != shortcode]
+        duplicate = _find_confirmed_duplicate(path, content_hash, matches, logger)
+        if duplicate:
+            distance, (other, _) = duplicate
+            DUPLICATE_BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+            shutil.move(path, DUPLICATE_BACKUP_DIR / os.path.basename(path))
+            logger.info(
+                f"過去の画像と同じため投稿対象から除外します: {os.path.basename(path)}"
+                f"（距離{distance}, 投稿 {other or '不明'}）-> {DUPLICATE_BACKUP_DIR}"
+            )
+            continue
+
+        kept.append(path)
+        records.append((value, shortcode, os.path.basename(path), content_hash))
+        index.add(value, (shortcode or "", content_hash))
+
+    if records:
+        try:
+            save_hashes(user_name, records)
+        except Exception as e:
+            logger.warning(f"画像ハッシュの保存に失敗しました: {e}")
+    return kept
+
+
+def _find_confirmed_duplicate(path, content_hash, matches, logger):
+    """ハッシュが近い候補のうち、ストアの元画像と画素でも同じと確認できたものを返す（なければNone）"""
+    ext = os.path.splitext(path)[1].lower()
+    for distance, (other, other_hash) in matches:
+        if other_hash == content_hash:
+            return distance, (other, other_hash)
+        other_path = store_path(other_hash, ext) if other_hash else None
+        if other_path is None or not other_path.exists():
+            continue
+        try:
+            if confirm_duplicate(path, other_path):
+                return distance, (other, other_hash)
+        except Exception as e:
+            logger.warning(f"画像の比較に失敗しました: {os.path.basename(path)} - {e}")
+
+    if matches:
+        logger.info(
+            f"ハッシュが近い過去の画像がありますが、画素の比較で別の画像と判断しました: {os.path.basename(path)}"
+            f"（候補{len(matches)}件, 最短距離{matches[0][0]}）"
+        )
+    return None
@@ -4,7 +4,6 @@ import logging
 import os
 import random
 import sys
-import time
 import shutil
 import tempfile
 from datetime import datetime as dt, timezone, timedelta
@@ -22,30 +21,44 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 # 自作モジュールのインポート
-from story import (
+from chrome_lease import acquire_chrome_lease, close_driver, record_driver_processes, release_chrome_lease
+from driver_cache import get_chromedriver_path, invalidate_chromedriver_cache
+from job_registry import get_account_settings
+from profile_health import available_profiles, record_profile_result
+from scraper_core import (
+    MEDIA_DIR,
     download_media,
-    extract_request_urls_v2,
-    get_complete_media_url,
+    download_media_batch,
     getkey_blob,
-    checkRecord,
+    checkRecords,
     getkey,
     extract_datetime
 )
-
-# 標準出力のエンコーディングをUTF-8に設定
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8")
+from timeline_extractor import extract_timeline_posts, shortcode_from_url
+from carousel_extractor import extract_carousel_media
+from media_capture import MediaCapture, enable_network_logging
+from perf_log import iter_messages
+from phash_index import filter_near_duplicates
+from selector_engine import FALLBACK, find_by_strategies
+from page_ready import (
+    wait_for_image_loaded,
+    wait_for_post_ready,
+    wait_for_profile_ready,
+    wait_for_text_change,
+)
+from post_meta import get_post_meta, save_post_meta
+from grid_fingerprint import is_complete, is_unchanged, make_fingerprint, save_fingerprint
 
 # サードパーティのライブラリインポート
 from dotenv import load_dotenv
 
 load_dotenv()
+# 投稿の最大経過日数の既定値（アカウント定義・.envで上書き）
 MAX_AGE_DAYS = 3
 
 ### Loggerセットアップ ###
@@ -74,9 +87,10 @@ def setup_logger(username):
     logger = logging.getLogger(f"InstagramScraper_{username}")
     logger.setLevel(logging.INFO)
 
-    # 既存のハンドラをクリア（同じユーザーの複数回の実行で重複を防ぐ）
-    if logger.hasHandlers():
-        logger.handlers.clear()
+    # 既存のハンドラを閉じて外す（同じプロセスでの複数回の実行で重複・ファイルの開きっぱなしを防ぐ）
+    for handler in logger.handlers[:]:
+        handler.close()
+        logger.removeHandler(handler)
 
     logger.addHandler(file_handler)
 
@@ -91,32 +105,43 @@ def setup_logger(username):
 
 
 ### Seleniumセットアップ ###
-def get_chrome_driver_v2(logger):
-    """Chromeドライバーの設定（並列実行対応）"""
+def get_chrome_driver_v2(logger, profile_name=None):
+    """Chromeドライバーの設定（並列実行対応）
+
+    profile_nameを指定した場合はそのプロファイルを使用する（常駐実行用）
+    """
     load_dotenv()
     chrome_options = Options()
     # .envから設定を読み込む
-    base_path = os.getenv("CHROME_PROFILE_PATH")
-    # プロファイルをランダムに選択
-    profile_name, cookies_file = random.choice(
-        [
-            [os.getenv("PROFILE_NAME_1"),os.getenv("INSTAGRAM_COOKIE_1")],
-            [os.getenv("PROFILE_NAME_2"),os.getenv("INSTAGRAM_COOKIE_2")],
-            [os.getenv("PROFILE_NAME_3"),os.getenv("INSTAGRAM_COOKIE_3")],
-            [os.getenv("PROFILE_NAME_4"),os.getenv("INSTAGRAM_COOKIE_4")],
-        ]
-    )
+    profiles = [
+        [os.getenv("PROFILE_NAME_1"),os.getenv("INSTAGRAM_COOKIE_1")],
+        [os.getenv("PROFILE_NAME_2"),os.getenv("INSTAGRAM_COOKIE_2")],
+        [os.getenv("PROFILE_NAME_3"),os.getenv("INSTAGRAM_COOKIE_3")],
+        [os.getenv("PROFILE_NAME_4"),os.getenv("INSTAGRAM_COOKIE_4")],
+    ]
+    # 並列実行時はワーカーに割り当てられたプロファイルを使用、それ以外はランダムな順で空きを探す
+    assigned_profile = profile_name or os.getenv("GLINK_PROFILE_NAME")
+    if assigned_profile:
+        candidates = [assigned_profile]
+    else:
+        # 隔離中（ロック・自動化検出後）のプロファイルは使用しない
+        candidates = available_profiles([p[0] for p in profiles], logger)
+        random.shuffle(candidates)
+
+    # 同時実行できるようにポートとユーザーデータディレクトリをリースで確保
+    lease = acquire_chrome_lease(candidates, logger)
+    if lease is None:
+        return None, None
+    profile_name = lease["profile_name"]
+    cookies_file = next((p[1] for p in profiles if p[0] == profile_name), None)
     logger.info(f"選択されたプロファイル: {profile_name}")
-
-    # 完全なユーザーデータディレクトリのパスを構築
-    user_data_dir = os.path.join(base_path, profile_name)
-    logger.info(f"使用するパス: {user_data_dir}")
+    logger.info(f"使用するパス: {os.path.join(lease['user_data_dir'], profile_name)}")
 
     # オプションを設定
     # リモートデバッグのためのオプション修正
-    chrome_options.add_argument(f"--user-data-dir={base_path}")
-    chrome_options.add_argument(f"--profile-directory={profile_name}")      
-    chrome_options.add_argument("--remote-debugging-port=9222")
+    chrome_options.add_argument(f"--user-data-dir={lease['user_data_dir']}")
+    chrome_options.add_argument(f"--profile-directory={profile_name}")
+    chrome_options.add_argument(f"--remote-debugging-port={lease['port']}")
 
     # その他の必要なオプション
     chrome_options.add_argument("--no-sandbox")
@@ -145,43 +170,64 @@ def get_chrome_driver_v2(logger):
     }
     chrome_options.add_experimental_option("prefs", prefs)
 
-    # パフォーマンスログの設定
-    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    # パフォーマンスログの設定（ネットワークイベントのみ）
+    enable_network_logging(chrome_options)
 
     try:
-        service = Service(ChromeDriverManager().install())
+        service = Service(get_chromedriver_path(logger))
         driver = webdriver.Chrome(service=service, options=chrome_options)
+        record_driver_processes(lease, driver, logger)
+        driver.glink_lease = lease
         return driver, cookies_file
     except Exception as e:
+        # Chrome更新でドライバーが合わなくなった場合は次回取得し直す
+        invalidate_chromedriver_cache(logger, e)
         error_msg = f"Chromeドライバーの設定でエラーが発生しました: {e}"
         logger.error(error_msg)
         logger.error("注意: Chromeを完全に終了してから実行してください")
-        return None
-
-# --- 追加: ピン留め判定 ---
-def _is_pinned_post(card):
-    try:
-        # SVGは namespace の都合で name()='svg' を使うと安定
-        card.find_element(
-            By.XPATH,
-            ".//*[name()='svg' and (contains(@aria-label,'ピン') or contains(@aria-label,'Pinned'))]"
-            " | .//*[name()='title' and (contains(.,'ピン留め') or contains(.,'Pinned'))]"
-        )
-        return True
-    except NoSuchElementException:
-        return False
-
-# --- 追加: img alt から投稿日(ざっくり)を拾う（失敗したら None）---
-def _date_from_card_alt(card):
-    try:
-        alt = card.find_element(By.CSS_SELECTOR, "img[alt]").get_attribute("alt") or ""
-        # 例: "Photo by xxx on September 16, 2024." を拾う
-        m = re.search(r"on\s+([A-Za-z]+)\s+(\d{1,2}),\s+(\d{4})", alt)
-        if m:
-            mon, day, year = m.groups()
+        release_chrome_lease(lease, logger)
+        return None, None
+
+# --- プロフィールグリッドのカード情報を1回のexecute_scriptでまとめて取得 ---
+GRID_CARD_SELECTOR = 'a._a6hd[href*="/p/"], a._a6hd[href*="/reel/"]'
+
+GRID_HARVEST_SCRIPT = """
+const limit = arguments[0];
+const cards = Array.from(document.querySelectorAll(arguments[1])).slice(0, limit);
+const hasLabel = (card, pattern) =>
+    Array.from(card.querySelectorAll('svg[aria-label]')).some(svg => pattern.test(svg.getAttribute('aria-label'))) ||
+    Array.from(card.querySelectorAll('title')).some(t => pattern.test(t.textContent || ''));
+return cards.map(card => {
+    const img = card.querySelector('img[alt]') || card.querySelector('img');
+    const isReel = card.href.includes('/reel/') || hasLabel(card, /リール|Reel|Clip|動画|Video/);
+    const isCarousel = hasLabel(card, /カルーセル|Carousel|複数|Multiple/);
+    return {
+        href: card.href || '',
+        pinned: hasLabel(card, /ピン|Pinned/),
+        alt: img ? (img.getAttribute('alt') || '') : '',
+        media_type: isReel ? 'video' : (isCarousel ? 'carousel' : 'image'),
+        srcset: img ? (img.getAttribute('srcset') || img.getAttribute('src') || '') : '',
+    };
+});
+"""
+
+
+def harvest_grid_cards(driver, limit=6):
+    """グリッドの先頭limit件のカードについて href / pinned / alt / media_type / srcset を返す"""
+    cards = driver.execute_script(GRID_HARVEST_SCRIPT, limit, GRID_CARD_SELECTOR) or []
+    return [card for card in cards if card.get("href")]
+
+
+# --- img alt から投稿日(ざっくり)を拾う（失敗したら None）---
+def _date_from_alt_text(alt):
+    # 例: "Photo by xxx on September 16, 2024." を拾う
+    m = re.search(r"on\s+([A-Za-z]+)\s+(\d{1,2}),\s+(\d{4})", alt or "")
+    if m:
+        mon, day, year = m.groups()
+        try:
             return dt.strptime(f"{mon} {day} {year}", "%B %d %Y")
-    except Exception:
-        pass
+        except ValueError:
+            return None
     return None
 
 # --- 追加: 投稿URLから厳密な投稿日を取って「N日より古いか」確認 ---
@@ -201,7 +247,39 @@ def _is_older_than_days(driver, url, days, wait):
         ))
     return False
 
-def get_page_caption(driver, username, timeout=12):
+def _is_caption_text(txt):
+    """「Meta」のみ等、説明文ではないテキストを除外する"""
+    txt_lower = (txt or "").lower().strip()
+    if not txt_lower:
+        return False
+    return not (txt_lower == "meta" or (txt_lower.startswith("meta") and len(txt_lower) <= 10))
+
+
+# 説明文の「もっと見る」ボタン（ボタン自身のテキストが一致するもののみ。本文中の「…」や単語には一致させない）
+MORE_BUTTON_XPATH = (
+    ".//*[self::span or self::div or self::button or @role='button']"
+    "[normalize-space(text())='もっと見る' or normalize-space(text())='続きを読む'"
+    " or normalize-space(text())='more' or normalize-space(text())='See more'"
+    " or normalize-space(text())='… more' or normalize-space(text())='... more']"
+)
+
+
+def expand_caption(driver, cap_el, logger=None, max_clicks=5):
+    """「もっと見る」を最大 max_clicks 回クリックする（クリックしても展開されなければその時点で終了）"""
+    for _ in range(max_clicks):
+        try:
+            buttons = [b for b in cap_el.find_elements(By.XPATH, MORE_BUTTON_XPATH) if b.is_displayed()]
+            if not buttons:
+                break  # 「もっと見る」ボタンがない（全文表示済み）
+            before = cap_el.get_attribute("innerText") or ""
+            driver.execute_script("arguments[0].click()", buttons[0])
+            if wait_for_text_change(driver, cap_el, before, logger) is None:
+                break  # 展開されなかった（ボタンではなかった）
+        except Exception:
+            break
+
+
+def get_page_caption(driver, username, timeout=12, logger=None):
     wait = WebDriverWait(driver, timeout)
 
     # ユーザー名リンクがDOMに出るまで待つ
@@ -211,73 +289,53 @@ def get_page_caption(driver, username, timeout=12):
 
     XPATHS = [
         # article要素内に限定して説明文を取得
-        f"(//article//div[.//a[contains(@href,'/{username}/')] and .//time]"
-        f"/following-sibling::span)[1]",
+        ("article_time_sibling",
+         f"(//article//div[.//a[contains(@href,'/{username}/')] and .//time]"
+         f"/following-sibling::span)[1]"),
 
-        f"(//article//a[contains(@href,'/{username}/')]/ancestor::div[1]"
-        f"/following-sibling::span)[1]",
+        ("article_user_sibling",
+         f"(//article//a[contains(@href,'/{username}/')]/ancestor::div[1]"
+         f"/following-sibling::span)[1]"),
 
-        f"(//article//div[.//a[contains(@href,'/{username}/')]]"
-        f"//time/parent::span/following-sibling::span)[1]",
+        ("article_time_span",
+         f"(//article//div[.//a[contains(@href,'/{username}/')]]"
+         f"//time/parent::span/following-sibling::span)[1]"),
 
         # 追加: time を起点に「次に現れるキャプション候補」を広めに拾う（article内に限定）
-        "(//article//time/ancestor::div[1]/following-sibling::*"
-        "//h1[contains(@class,'_ap3a')] | "
-        "//article//time/ancestor::div[1]/following-sibling::*"
-        "//span[contains(@class,'_ap3a')])[1]",
+        ("article_ap3a",
+         "(//article//time/ancestor::div[1]/following-sibling::*"
+         "//h1[contains(@class,'_ap3a')] | "
+         "//article//time/ancestor::div[1]/following-sibling::*"
+         "//span[contains(@class,'_ap3a')])[1]"),
 
         # 追加: time から前進して最初の「テキストを持つ span」（article内に限定）
-        "(//article//time/ancestor::div[1]/following::span"
-        "[normalize-space()][1])",
+        ("article_next_span",
+         "(//article//time/ancestor::div[1]/following::span"
+         "[normalize-space()][1])", FALLBACK),
 
         # 追加: ハッシュタグの a が含まれるブロックの直近の親（article内に限定）
-        "(//article//a[contains(@href,'/explore/tags')]/ancestor::span[1])[1]",
-        
+        ("article_hashtag",
+         "(//article//a[contains(@href,'/explore/tags')]/ancestor::span[1])[1]", FALLBACK),
+
         # フォールバック: article要素がない場合の既存のXPath
-        f"(//div[.//a[contains(@href,'/{username}/')] and .//time]"
-        f"/following-sibling::span)[1]",
+        ("page_time_sibling",
+         f"(//div[.//a[contains(@href,'/{username}/')] and .//time]"
+         f"/following-sibling::span)[1]", FALLBACK),
     ]
 
-    cap_el = None
-    for xp in XPATHS:
-        try:
-            el = wait.until(EC.presence_of_element_located((By.XPATH, xp)))
-            txt = (el.get_attribute("innerText") or "").strip()
-            if not txt:
-                # 中身が空のラッパ要素対策：子要素側の可視テキストを読む
-                txt = (el.text or "").strip()
-            
-            # 「Meta」のみの場合はスキップして次のXPathを試す
-            if txt:
-                txt_lower = txt.lower().strip()
-                if txt_lower == "meta" or (txt_lower.startswith("meta") and len(txt.strip()) <= 10):
-                    continue  # この要素をスキップして次のXPathを試す
-            
-            if txt:
-                cap_el = el
-                break
-        except Exception:
-            continue
+    # 広く一致する候補（FALLBACK）は正確な候補の後に置いたまま、同じ段階の中で直近の的中率が高いものを優先する
+    # 全候補を1回でまとめて評価する
+    # 「Meta」のみの要素は採用せず次の候補を使う
+    layout = "article" if driver.find_elements(By.TAG_NAME, "article") else "fallback"
+    cap_el, _ = find_by_strategies(
+        driver, layout, XPATHS, logger=logger, timeout=timeout, accept=_is_caption_text
+    )
 
     if cap_el is None:
         return None
 
-    # 「もっと見る」を複数回クリックして全文を取得
-    max_clicks = 5  # 最大5回までクリックを試みる
-    for _ in range(max_clicks):
-        try:
-            more = cap_el.find_element(
-                By.XPATH,
-                ".//*[contains(text(),'もっと見る') or contains(text(),'more') or contains(text(),'See more') or contains(.,'…')]"
-            )
-            # ボタンが表示されているか確認
-            if more.is_displayed():
-                driver.execute_script("arguments[0].click()", more)
-                time.sleep(0.5)  # 展開を待つ
-            else:
-                break  # ボタンが表示されていない場合は終了
-        except Exception:
-            break  # 「もっと見る」ボタンが見つからない場合は終了
+    # 「もっと見る」をクリックして全文を取得
+    expand_caption(driver, cap_el, logger)
 
     # 説明文の全文を取得（innerTextで子要素のテキストも含めて取得）
     txt = (cap_el.get_attribute("innerText") or cap_el.text or "").strip()
@@ -323,38 +381,24 @@ def get_caption_by_username(driver, username, logger=None, timeout=12):
             ))
         )
         # h1 でも span でもOKにする
-        cap_el = None
-        for xp in [
-            ".//h1[contains(@class,'_ap3a')]",
-            ".//span[contains(@class,'_ap3a')]",
-            # 念のためフォールバック（テキストを持つ最初のspan）
-            ".//span[normalize-space()][1]"
-        ]:
-            try:
-                cap_el = root.find_element(By.XPATH, xp)
-                if (cap_el.get_attribute("innerText") or cap_el.text or "").strip():
-                    break
-            except Exception:
-                continue
+        cap_el, _ = find_by_strategies(
+            driver,
+            "dialog",
+            [
+                ("dialog_h1_ap3a", ".//h1[contains(@class,'_ap3a')]"),
+                ("dialog_span_ap3a", ".//span[contains(@class,'_ap3a')]"),
+                # 念のためフォールバック（テキストを持つ最初のspan）
+                ("dialog_first_span", ".//span[normalize-space()][1]", FALLBACK),
+            ],
+            logger=logger,
+            timeout=2,
+            root=root,
+        )
 
         if cap_el:
-            # 「もっと見る」を複数回クリックして全文を取得
-            max_clicks = 5  # 最大5回までクリックを試みる
-            for _ in range(max_clicks):
-                try:
-                    more = cap_el.find_element(
-                        By.XPATH,
-                        ".//*[contains(text(),'もっと見る') or contains(text(),'more') or contains(text(),'See more') or contains(.,'…')]"
-                    )
-                    # ボタンが表示されているか確認
-                    if more.is_displayed():
-                        driver.execute_script("arguments[0].click()", more)
-                        time.sleep(0.5)  # 展開を待つ
-                    else:
-                        break  # ボタンが表示されていない場合は終了
-                except Exception:
-                    break  # 「もっと見る」ボタンが見つからない場合は終了
-            
+            # 「もっと見る」をクリックして全文を取得
+            expand_caption(driver, cap_el, logger)
+
             # 説明文の全文を取得（innerTextで子要素のテキストも含めて取得）
             txt = (cap_el.get_attribute("innerText") or cap_el.text or "").strip()
             
@@ -386,37 +430,27 @@ def get_caption_by_username(driver, username, logger=None, timeout=12):
             return txt
 
         # どうしても見つからなければページ版にフォールバック
-        return get_page_caption(driver, username, timeout)
+        return get_page_caption(driver, username, timeout, logger)
 
     # ダイアログでないとき
-    return get_page_caption(driver, username, timeout)
+    return get_page_caption(driver, username, timeout, logger)
 
 
 
 ### デバッグ用 ###
-import json
 def analyze_logs(logs):
-    mp4_count = 0
-    scontent_count = 0
-    for entry in logs:
-        message = json.loads(entry.get("message", "{}"))
-        message_str = json.dumps(message)
-        if ".mp4" in message_str:
-            mp4_count += 1
-        if "scontent" in message_str:
-            scontent_count += 1
+    # 生の文字列のまま数える（JSON解析しない）
+    mp4_count = sum(1 for _ in iter_messages(logs, ".mp4"))
+    scontent_count = sum(1 for _ in iter_messages(logs, "scontent"))
     
     print(f"MP4を含むログエントリ: {mp4_count}")
     print(f"scontentを含むログエントリ: {scontent_count}")
     
-    # 最初のMP4とscontentを含むエントリを表示
-    for entry in logs:
-        message = json.loads(entry.get("message", "{}"))
-        message_str = json.dumps(message)
-        if ".mp4" in message_str:
-            print("最初のMP4エントリ:")
-            print(message_str[:500] + "...")  # 最初の500文字のみ表示
-            break
+    # 最初のMP4を含むエントリを表示
+    message_str = next(iter_messages(logs, ".mp4"), None)
+    if message_str:
+        print("最初のMP4エントリ:")
+        print(message_str[:500] + "...")  # 最初の500文字のみ表示
 
 
 ### メイン ###
@@ -439,11 +473,32 @@ def main():
         logger.error("Chromeドライバーの初期化に失敗しました")
         return 1
 
+    try:
+        result = scrape_post(driver, USERNAME, process_id, logger)
+        record_profile_result(driver.glink_lease["profile_name"], result, logger)
+        return result
+    finally:
+        close_driver(driver, logger)
+
+
+### 投稿取得 ###
+def scrape_post(driver, USERNAME, process_id, logger):
+    """起動済みのドライバーで最新投稿を取得する（ドライバーの終了は呼び出し側で行う）
+
+    Returns:
+        int: 0=新規メディアあり / 1=対象なし・エラー / 3=アカウントロック・自動化検出 / 4=前回からグリッドに変化なし
+    """
+    # アカウントごとの開始日・最大経過日数
+    settings = get_account_settings(USERNAME)
+    max_age_days = MAX_AGE_DAYS if settings["max_age_days"] is None else settings["max_age_days"]
+    start_date = settings["start_date"]
+
     ########## Instagramのプロフィールページにアクセス ##########
     try:
         logger.info(f"{USERNAME} のプロフィールページにアクセスします")
         driver.get(f"https://www.instagram.com/{USERNAME}/?hl=ja")
-        time.sleep(10)
+        # グリッド・投稿なし・エラーのいずれかが表示されるまで待つ（固定のsleep(10)の代わり）
+        wait_for_profile_ready(driver, USERNAME, logger)
         # # cookieの読み込み
         # json_open = open(cookies_file, 'r') 
         # cookies = json.load(json_open) 
@@ -457,7 +512,6 @@ def main():
         error_msg = f"実行中にエラーが発生しました: {e}"
         logger.error(error_msg)
         print(error_msg)
-        driver.quit()
         return 1
 
     # Facebookのエラーページをチェック
@@ -494,34 +548,71 @@ def main():
         return 1
 
     ########## 最新投稿読み込み ##########
+    # グリッドを確認できなかった場合は指紋を保存しない
+    fingerprint = None
+    timeline = {}
+    # 動画の分割リクエストは最新投稿を開く直前から記録する（プロフィールページ・前のアカウントの分は使わない）
+    capture = MediaCapture(driver, logger)
     try:
         logger.info("最新投稿を読み込みます")
 
-        time.sleep(5)
-
         wait = WebDriverWait(driver, 20)
 
-        # プロフィールグリッドから投稿リンクを直接取得
-        # プロフィールグリッドから投稿リンクを取得
-        post_links = wait.until(
-            EC.presence_of_all_elements_located(
-                (By.CSS_SELECTOR, 'a._a6hd[href*="/p/"], a._a6hd[href*="/reel/"]')
-            )
-        )
+        # プロフィールグリッドに投稿リンクが出るまで待つ
+        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, GRID_CARD_SELECTOR)))
 
-        # まず href、ピン留めかどうか、リンク要素をリスト化（最初の6件くらい見れば十分）
+        # 最初の6件くらい見れば十分。カード情報は1回のexecute_scriptでまとめて取得し、以降はPython側で判定する
+        cards = harvest_grid_cards(driver, limit=6)
+        logger.info(f"検索対象: 取得投稿数={len(cards)}件")
         candidates_with_link = []
-        max_candidates = min(6, len(post_links))  # 実際に取得できた数と6件の小さい方
-        logger.info(f"検索対象: 取得投稿数={len(post_links)}件, max_candidates={max_candidates}件")
-        for link in post_links[:max_candidates]:
-            href = link.get_attribute("href") or ""
-            if not href:
-                continue
-            pinned = _is_pinned_post(link)
-            candidates_with_link.append((href, pinned, link))
+        for card in cards:
+            logger.info(f"カード: {card['href']} (ピン留め: {card['pinned']}, 種別: {card['media_type']})")
+            candidates_with_link.append((card["href"], card["pinned"], card))
+
+        # グリッド先頭の投稿が前回の確認時と同じなら、新規投稿はないため以降の処理を省く
+        fingerprint = make_fingerprint(
+            [shortcode_from_url(card["href"]) for card in cards],
+            [card["pinned"] for card in cards],
+            settings=f"{start_date}:{max_age_days}",
+        )
+        try:
+            if cards and is_unchanged(USERNAME, fingerprint):
+                logger.info("前回の確認からグリッドに変化がないためスキップします")
+                return 4
+        except Exception as e:
+            logger.warning(f"グリッドの指紋の確認に失敗しました: {e}")
 
         logger.info(f"候補数: {len(candidates_with_link)}件")
 
+        # 過去のサイクルで投稿日時を確定済みの投稿（投稿日時は変わらないため再取得しない）
+        try:
+            cached_meta = get_post_meta([shortcode_from_url(href) for href, _, _ in candidates_with_link])
+        except Exception as e:
+            logger.warning(f"投稿メタデータの読み込みに失敗しました: {e}")
+            cached_meta = {}
+        logger.info(f"投稿メタデータ: {len(cached_meta)}/{len(candidates_with_link)}件が確定済み")
+
+        # プロフィール読み込み時のタイムラインAPI応答から日時・ピン留めを取得（投稿ページへの遷移を省く）
+        if len(cached_meta) < len(candidates_with_link):
+            try:
+                timeline = extract_timeline_posts(driver, logger)
+            except Exception as e:
+                logger.warning(f"タイムライン応答の解析に失敗したため、従来の方法で日時を取得します: {e}")
+
+        # 新たに確定した投稿日時（サイクル終了時に保存）
+        resolved_meta = [
+            {
+                "shortcode": post["shortcode"],
+                "user_name": USERNAME,
+                "posted_at": post["taken_at"],
+                "pinned": post["pinned"],
+                "media_type": post["media_type"],
+                "media_count": len(post["media"]),
+            }
+            for post in timeline.values()
+        ]
+        cards_by_href = {href: card for href, _, card in candidates_with_link}
+
         # すべての候補について投稿日時を取得して、最新のものを選択
         # 日付が分かっていない投稿は全て日時を確認した後に最新の投稿を検索する
         post_with_dates = []  # (href, pinned, post_datetime) のリスト
@@ -533,9 +624,24 @@ def main():
         # まず、すべての候補についてカードから日付を取得を試みる
         for i, (href, pinned, link) in enumerate(candidates_with_link, 1):
             logger.info(f"[{i}/{len(candidates_with_link)}] 候補 {href} (ピン留め: {pinned}) の日付取得を開始")
-            
+
+            # 確定済みの投稿はナビゲーション不要
+            meta = cached_meta.get(shortcode_from_url(href))
+            if meta:
+                post_with_dates.append((href, pinned, meta["posted_at"]))
+                logger.info(f"候補 {href} (ピン留め: {pinned}) - 保存済みの日時を使用: {meta['posted_at']}")
+                continue
+
+            # タイムライン応答に含まれていれば正確な日時が分かる
+            timeline_post = timeline.get(shortcode_from_url(href))
+            if timeline_post:
+                pinned = pinned or timeline_post["pinned"]
+                post_with_dates.append((href, pinned, timeline_post["taken_at"]))
+                logger.info(f"候補 {href} (ピン留め: {pinned}) - タイムライン応答から日時取得: {timeline_post['taken_at']}")
+                continue
+
             # まずプロフィールページのカードから投稿日を取得を試みる
-            card_date = _date_from_card_alt(link)
+            card_date = _date_from_alt_text(link["alt"])
             
             if card_date:
                 # カードから取得できた場合
@@ -582,6 +688,16 @@ def main():
                         post_dt = dt.fromisoformat(dt_str.replace("Z", "+00:00"))
                         logger.info(f"候補 {href} (ピン留め: {pinned}) - 投稿ページから日付取得: {post_dt}")
                         post_with_dates.append((href, pinned, post_dt))
+                        resolved_meta.append(
+                            {
+                                "shortcode": shortcode_from_url(href),
+                                "user_name": USERNAME,
+                                "posted_at": post_dt,
+                                "pinned": pinned,
+                                "media_type": cards_by_href.get(href, {}).get("media_type"),
+                                "media_count": None,
+                            }
+                        )
                     else:
                         logger.warning(f"候補 {href} - datetime属性が見つかりませんでした → スキップ")
                 except Exception as e:
@@ -610,7 +726,7 @@ def main():
                             # プロフィールページに直接アクセス
                             try:
                                 driver.get(f"https://www.instagram.com/{USERNAME}/?hl=ja")
-                                time.sleep(5)
+                                wait_for_profile_ready(driver, USERNAME, logger)
                             except (InvalidSessionIdException, Exception) as get_error:
                                 logger.error(f"プロフィールページへのアクセスも失敗しました: {get_error} → 処理を終了します")
                                 break  # ループを抜ける
@@ -645,13 +761,20 @@ def main():
                             # プロフィールページに直接アクセス
                             try:
                                 driver.get(f"https://www.instagram.com/{USERNAME}/?hl=ja")
-                                time.sleep(5)
+                                wait_for_profile_ready(driver, USERNAME, logger)
                             except (InvalidSessionIdException, Exception) as get_error:
                                 logger.error(f"プロフィールページへのアクセスも失敗しました: {get_error} → 処理を終了します")
                                 break  # ループを抜ける
 
         # すべての候補について日時を取得した後、最新の投稿を検索
         logger.info(f"日時取得完了: {len(post_with_dates)}件の候補から日時を取得しました")
+
+        try:
+            saved = save_post_meta(resolved_meta)
+            if saved:
+                logger.info(f"投稿メタデータを保存しました: {saved}件")
+        except Exception as e:
+            logger.warning(f"投稿メタデータの保存に失敗しました: {e}")
         
         # セッションが無効になっている可能性があるため、チェック
         session_valid = True
@@ -672,8 +795,8 @@ def main():
             now_utc = dt.now(timezone.utc)
             for href, pinned, post_dt in post_with_dates:
                 age = now_utc - post_dt
-                if MAX_AGE_DAYS > 0 and age > timedelta(days=MAX_AGE_DAYS):
-                    logger.info(f"候補 {href} (ピン留め: {pinned}) - {MAX_AGE_DAYS}日より古い({age.days}日) → スキップ")
+                if max_age_days > 0 and age > timedelta(days=max_age_days):
+                    logger.info(f"候補 {href} (ピン留め: {pinned}) - {max_age_days}日より古い({age.days}日) → スキップ")
                     continue
                 else:
                     latest_post_url = href
@@ -686,41 +809,34 @@ def main():
         if latest_post_url:
             if session_valid:
                 try:
+                    capture.reset()
                     driver.get(latest_post_url)
-                    time.sleep(2)
+                    wait_for_post_ready(driver, logger)
                     print(f"最新投稿のURL: {latest_post_url}")
                     logger.info("最新投稿ページにアクセスしました")
                 except (InvalidSessionIdException, Exception) as e:
                     error_msg = str(e)
                     if "invalid session id" in error_msg.lower() or "target frame detached" in error_msg.lower() or "session deleted" in error_msg.lower():
                         logger.error(f"ブラウザセッションが無効のため、最新投稿ページにアクセスできませんでした: {e}")
-                        try:
-                            driver.quit()
-                        except:
-                            pass
                         return 1
                     else:
                         raise
             else:
                 logger.error("ブラウザセッションが無効のため、最新投稿ページにアクセスできませんでした")
-                try:
-                    driver.quit()
-                except:
-                    pass
                 return 1
         else:
-            logger.info(f"条件に合致する投稿が見つかりませんでした（すべての候補が{MAX_AGE_DAYS}日より古い等）")
-            if session_valid:
-                try:
-                    driver.quit()
-                except:
-                    pass
+            logger.info(f"条件に合致する投稿が見つかりませんでした（すべての候補が{max_age_days}日より古い等）")
+            # 日時を取得できなかった候補がある（セッション切れ等）場合は、次回も確認させるため保存しない
+            if is_complete(len(candidates_with_link), len(post_with_dates)):
+                _save_fingerprint(USERNAME, fingerprint, logger)
             return 1
 
     except Exception as e:
         print(f"エラーが発生しました: {str(e)}")
         logger.error(f"最新投稿読み込みでエラーが発生しました: {str(e)}")
         logger.error(f"エラーの種類: {type(e).__name__}")
+        # 最新投稿を選定できていないため、以降の結果にかかわらず指紋は保存しない
+        fingerprint = None
 
         try:
             timestamp = dt.now().strftime("%Y%m%d_%H%M%S")
@@ -768,12 +884,11 @@ def main():
 
             date = dt.fromisoformat(date_str.replace("Z", "+00:00"))
             # 👇 追加：古い投稿を共通でスキップするガード（ピン留め/非ピン留め共通）
-            max_age_days = int(os.getenv(f"{USERNAME}_max_age_days") or os.getenv("MAX_AGE_DAYS") or "0")
-            if MAX_AGE_DAYS > 0:
+            if max_age_days > 0:
                 age = dt.now(timezone.utc) - date  # UTC同士で比較
-                if age > timedelta(days=MAX_AGE_DAYS):
-                    logger.info(f"投稿日が {MAX_AGE_DAYS}日より古いためスキップ: posted={date.isoformat()}, age={age}")
-                    driver.quit()
+                if age > timedelta(days=max_age_days):
+                    logger.info(f"投稿日が {max_age_days}日より古いためスキップ: posted={date.isoformat()}, age={age}")
+                    _save_fingerprint(USERNAME, fingerprint, logger)
                     return 1
 
             jst = timezone(timedelta(hours=+9), "JST")
@@ -784,13 +899,12 @@ def main():
             logger.info(f"post_date:{post_date}")
             print(f"post_date:{post_date}")
 
-            start_date = os.getenv(f"{USERNAME}_start")
             print(f"start_date:{start_date}")
             # 日付を比較
-            if post_date < start_date:
+            if start_date and post_date < start_date:
                 print(f"投稿日付 {post_date} は開始日 {start_date} より前のため、処理を終了します")
                 logger.info(f"投稿日付 {post_date} は開始日 {start_date} より前のため、処理を終了します")
-                driver.quit()
+                _save_fingerprint(USERNAME, fingerprint, logger)
                 return 1
 
         except Exception as e:
@@ -848,16 +962,30 @@ def main():
                 el = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div._aagv img")))
                 return _best_url_from_img(el)
 
-            # 枚数の目安
-            indicator_cnt = len(driver.find_elements(By.CSS_SELECTOR, "div._acnb"))
-            ul_img_cnt = len(driver.find_elements(By.CSS_SELECTOR, "ul._acay li._acaz"))
-            total_images = max(indicator_cnt, ul_img_cnt) or 1
-            logger.info(f"カルーセル推定: {total_images}枚")
+            # まずスライドを送らずに全枚のURLを取得する（API応答・埋め込みJSON・DOM一括走査）
+            shortcode = shortcode_from_url(driver.current_url)
+            carousel = extract_carousel_media(driver, shortcode, logger, timeline.get(shortcode))
+            if carousel:
+                for u in carousel["urls"]:
+                    _add(u, carousel["source"])
+                total_images = len(carousel["urls"])
+            else:
+                # 枚数の目安
+                indicator_cnt = len(driver.find_elements(By.CSS_SELECTOR, "div._acnb"))
+                ul_img_cnt = len(driver.find_elements(By.CSS_SELECTOR, "ul._acay li._acaz"))
+                total_images = max(indicator_cnt, ul_img_cnt) or 1
+                logger.info(f"カルーセル推定: {total_images}枚")
+
+                # 初回：UL全体から直取り
+                _collect_from_ul()
 
-            # 初回：UL全体から直取り
-            _collect_from_ul()
+            if carousel:
+                media_type = "image_carousel"
+                expected_images = total_images
 
-            if total_images > 1:
+            elif total_images > 1:
+                # 一括取得できなかった場合のみ、次へで切り替えて収集する
+                logger.info("カルーセルを一括取得できなかったため、スライドを送って収集します")
                 # 次へで切り替え → UL再収集 を繰り返し（ユニーク数が目標に達するまで）
                 tries = 0
                 while len(seen) < total_images and tries < total_images + 5:
@@ -886,7 +1014,7 @@ def main():
                     except Exception:
                         pass
 
-                    time.sleep(0.3)  # 遅延ロード対策
+                    wait_for_image_loaded(driver, "div._aagv img", logger)  # 遅延ロード対策
                     _collect_from_ul()                  # UL全体から再収集
                     _add(_current_main_src(), "CLICK")  # 表示中の1枚も明示的に追加
                     tries += 1
@@ -924,7 +1052,7 @@ def main():
                 logger.info(f"[caption/by_username] 説明文確定（先頭100）: '{description[:100]}'")
 
             # 保存
-            description_dir = os.path.join("media", USERNAME, "description")
+            description_dir = os.path.join(MEDIA_DIR, USERNAME, "description")
             os.makedirs(description_dir, exist_ok=True)
             temp_file_path = os.path.join(description_dir, f"{process_id}")
             with open(temp_file_path, "w", encoding="utf-8") as f:
@@ -939,72 +1067,86 @@ def main():
             with open(dump, "w", encoding="utf-8") as f:
                 f.write(driver.page_source)
             logger.exception(f"[caption/by_username] 取得失敗。page_source保存: {dump}")
-            driver.quit()
             return 1
 
     except Exception as e:
         print(f"最新投稿の要素読み込みでエラーが発生しました: {str(e)}")
 
     # メディア取得
+    # 投稿内のメディアをすべて確認できた（既存・取得済み）場合のみ指紋を保存する
+    media_complete = False
     try:
         flg = False
         dl_images = 0           # 新規にDLできた画像の枚数
         skipped_existing = 0    # 既存レコードでスキップした枚数
         failed_images = 0       # 失敗カウント（例外等）
+        failed_videos = 0       # 動画の取得失敗
+        confirmed = 0           # 既存レコード・取得できたメディアの数
+        pending_images = []     # 新規の画像URL（ループ後にまとめて並列DL）
+        records = []            # (cache_key, URL, blobか) — 投稿内の全メディアをまとめてDB確認する
         for media_url in media_urls:
             # URLがblobで始まる場合の特別処理
             if media_url == media_url and media_url.startswith("blob:"):
                 print("blobで始まるURLを検出しました")
-                time.sleep(1)
-                # ネットワーク取得
-                netlog = driver.get_log("performance")
-
-                #デバッグ用
-                #analyze_logs(netlog)
-                # url(部分的)取得
-                #urls = extract_request_urls(netlog)
-                urls = extract_request_urls_v2(netlog)
+                # 動画の分割リクエストが出揃うまでログを少しずつ読み、mp4のURLだけを保持する
+                capture.collect()
 
                 # url結合
-                complete_url = get_complete_media_url(urls)
+                complete_url = capture.complete_url()
                 print(complete_url)
                 logger.info(f"生成URL:{complete_url}")
 
                 cache_key = getkey_blob(complete_url)
                 if cache_key is None:
                     logger.error("Keyの取得に失敗しました")
-                    driver.quit()
                     return 1
+                records.append((cache_key, complete_url, True))
 
-                result_blob = checkRecord(USERNAME, cache_key, complete_url, logger, datetime_value)
-                if result_blob:
+            else:
+                logger.info("画像URLを取得しました")
+                records.append((getkey(media_url), media_url, False))
+
+        # 確認と保存は1トランザクション（1回のコミット）で行う
+        results = checkRecords(USERNAME, [(key, url) for key, url, _ in records], logger, datetime_value)
+        for (cache_key, url, is_blob), result in zip(records, results):
+            if is_blob:
+                if result:
                     # 動画DL
-                    download_media(logger, complete_url, USERNAME, "mp4")
+                    if download_media(logger, url, USERNAME, "mp4", shortcode_from_url(driver.current_url)):
+                        confirmed += 1
+                    else:
+                        failed_videos += 1
                     flg = True
                 else:
+                    confirmed += 1
                     logger.info("このレコードは存在します")
-                    # driver.quit()
-                    # return 1
-                    continue
 
+            elif result:
+                logger.info("メディアを取得します")
+                pending_images.append(url)
             else:
-                logger.info("画像URLを取得しました")
-                cache_key = getkey(media_url)
-                result = checkRecord(USERNAME, cache_key, media_url, logger, datetime_value)
+                skipped_existing += 1
+                confirmed += 1
+                logger.info("このレコードは存在します")
+
+        # 新規の画像は投稿内の順序どおりのファイル名で並列に取得する
+        if pending_images:
+            shortcode = shortcode_from_url(driver.current_url)
+            results = download_media_batch(logger, pending_images, USERNAME, "jpg", shortcode)
+            downloaded = [path for path in results if path]
+            failed_images = len(results) - len(downloaded)
+            confirmed += len(downloaded)
+            if failed_images:
+                logger.error(f"画像ダウンロード失敗: {failed_images}/{len(results)}枚")
+
+            # キャッシュキーが変わっただけの再配信・再アップロードはGBPに投稿しない
+            kept = filter_near_duplicates(downloaded, USERNAME, shortcode, logger)
+            dl_images = len(kept)
+            skipped_existing += len(downloaded) - len(kept)
+            if kept or failed_images:
+                flg = True
+        media_complete = is_complete(len(records), confirmed, failed_images + failed_videos)
 
-                if result:
-                    logger.info("メディアを取得します")
-                    try:
-                        download_media(logger, media_url, USERNAME, "jpg")
-                        dl_images += 1
-                        flg = True
-                    except Exception as e:
-                        failed_images += 1
-                        logger.error(f"画像ダウンロード失敗: {e}")
-                else:
-                    skipped_existing += 1
-                    logger.info("このレコードは存在します")
-                    continue
         # 収集とDLの整合性チェック（カルーセルのみ厳しめに）
         if media_type == "image_carousel":
             extracted_images = len([u for u in media_urls if u and not u.startswith("blob:")])
@@ -1013,6 +1155,7 @@ def main():
             )
 
             if extracted_images != expected_images:
+                media_complete = False
                 logger.info(
                     f"カルーセル取得不一致: 想定{expected_images}枚なのに収集{extracted_images}枚（新規DL{dl_images}, 既存{skipped_existing}, 失敗{failed_images}）"
                 )
@@ -1027,7 +1170,8 @@ def main():
                     )
         if not flg:
             logger.info("全件レコードが存在します")
-            driver.quit()
+            if media_complete:
+                _save_fingerprint(USERNAME, fingerprint, logger)
             return 1
         else:
             print(f"説明文:{description}")
@@ -1035,14 +1179,32 @@ def main():
 
     except Exception as e:
         print(f"メディア取得でエラーが発生しました: {str(e)}")
+        media_complete = False
 
-    driver.quit()
     logger.info("処理終了")
+    if media_complete:
+        _save_fingerprint(USERNAME, fingerprint, logger)
+    else:
+        logger.info("取得できなかったメディアがあるため、グリッドの指紋は保存しません（次回も確認します）")
 
     return 0
 
 
+### グリッドの指紋保存 ###
+def _save_fingerprint(username, fingerprint, logger):
+    if fingerprint is None:
+        return
+    try:
+        save_fingerprint(username, fingerprint)
+    except Exception as e:
+        logger.warning(f"グリッドの指紋の保存に失敗しました: {e}")
+
+
 if __name__ == "__main__":
+    # 標準出力のエンコーディングをUTF-8に設定（ライブラリとして読み込まれた場合は変更しない）
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8")
+
     result = main()
 
     # print(result)
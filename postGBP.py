@@ -16,7 +16,6 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.keys import Keys
 
 # サードパーティライブラリ
@@ -26,6 +25,10 @@ import ssl
 import cv2  # 追加：動画サイズ確認用
 import shutil  # 追加：ファイルコピー用
 
+# 自作モジュールのインポート
+from chrome_lease import acquire_chrome_lease, close_driver, record_driver_processes, release_chrome_lease
+from driver_cache import get_chromedriver_path, invalidate_chromedriver_cache
+
 load_dotenv()
 
 
@@ -128,12 +131,13 @@ def create_business_post(business_id, logger):
     if driver is None:
         logger.error("Chromeドライバーの取得に失敗しました")
         return None
-    driver.get("https://www.google.com/")
-    time.sleep(3)  # 遷移を待機
-    driver.get(url)
-    time.sleep(5)  # 遷移を待機
 
     try:
+        driver.get("https://www.google.com/")
+        time.sleep(3)  # 遷移を待機
+        driver.get(url)
+        time.sleep(5)  # 遷移を待機
+
         wait = WebDriverWait(driver, 10)
         # 投稿を作成ボタンの要素を待機して取得
         post_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, '[jsname="nFHyHb"]')))
@@ -144,7 +148,7 @@ def create_business_post(business_id, logger):
 
     except Exception as e:
         logger.error(f"Error: {e}")
-        driver.quit()
+        close_driver(driver, logger)
         return None
 
 
@@ -159,18 +163,22 @@ def encode_google_business_param(business_id):
 
 ###  Selenium Chrome Driverのセットアップ ###
 def get_chrome_driver_v2(logger):
-    
-    subprocess.run("taskkill /F /IM chrome.exe", shell=True)
     load_dotenv()
     chrome_options = Options()
     # .envから設定を読み込む
-    user_data_dir = os.getenv("CHROME_PROFILE_PATH")
     profile_name = os.getenv("PROFILE_NAME_GBP")
+
+    # GBP用プロファイルをリースで確保（他のpostGBPが使用中なら空くまで待つ）
+    lease = acquire_chrome_lease([profile_name], logger, timeout=600)
+    if lease is None:
+        return None
+
     chrome_options.add_argument("--start-maximized")
 
     # オプションを設定
-    chrome_options.add_argument(f"--user-data-dir={user_data_dir}")
-    chrome_options.add_argument(f"--profile-directory={profile_name}")      
+    chrome_options.add_argument(f"--user-data-dir={lease['user_data_dir']}")
+    chrome_options.add_argument(f"--profile-directory={profile_name}")
+    chrome_options.add_argument(f"--remote-debugging-port={lease['port']}")
 
     # その他の必要なオプション
     chrome_options.add_argument("--no-sandbox")
@@ -189,7 +197,6 @@ def get_chrome_driver_v2(logger):
     chrome_options.add_argument("--no-service-autorun") 
     chrome_options.add_argument("--password-store=basic")
     chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-    # chrome_options.add_argument("--remote-debugging-port=9222")
 
     # プリファレンス設定
     prefs = {
@@ -204,13 +211,19 @@ def get_chrome_driver_v2(logger):
     chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
 
     try:
-        service = Service(ChromeDriverManager().install())
+        service = Service(get_chromedriver_path(logger))
         driver = webdriver.Chrome(service=service, options=chrome_options)
+        record_driver_processes(lease, driver, logger)
+        # close_driver で終了時にリースも解放する
+        driver.glink_lease = lease
         return driver
     except Exception as e:
+        # Chrome更新でドライバーが合わなくなった場合は次回取得し直す
+        invalidate_chromedriver_cache(logger, e)
         error_msg = f"Chromeドライバーの設定でエラーが発生しました: {e}"
         logger.error(error_msg)
         logger.error("注意: Chromeを完全に終了してから実行してください")
+        release_chrome_lease(lease, logger)
         return None
 
 
@@ -225,7 +238,8 @@ def upload_images_to_post_v2(driver, media_folder, logger):
         media_extensions = (".mp4", ".mov", ".avi", ".wmv", ".png", ".jpg", ".jpeg")
 
         # フォルダ内のメディアファイルを探す
-        media_files = [f for f in os.listdir(media_folder) if f.lower().endswith(media_extensions)]
+        # ファイル名（連番・日時）の順にアップロードする
+        media_files = sorted(f for f in os.listdir(media_folder) if f.lower().endswith(media_extensions))
         print(media_folder)
         print(media_files)
         if not media_files:
@@ -306,10 +320,11 @@ def switch_to_post_frame(driver):
 
 
 ### 説明文取得 ###
-def get_description(username, logger, process_id):
+def get_description(username, logger, process_id, temp_file_path=None):
 
-    description_dir = os.path.join("media", username, "description")
-    temp_file_path = os.path.join(description_dir, f"{process_id}")
+    if temp_file_path is None:
+        description_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "media", username, "description")
+        temp_file_path = os.path.join(description_dir, f"{process_id}")
 
     try:
         with open(temp_file_path, "r", encoding="utf-8") as f:
@@ -428,11 +443,17 @@ def main():
     # ロガーのセットアップ
     logger = setup_logger(mode, username)
 
-    # メディアフォルダのパス設定
-    media_folder = os.path.join("media", username)
+    # メディアフォルダのパス設定（投稿ジョブからはジョブ用フォルダが渡される）
+    if len(sys.argv) > 5:
+        media_folder = sys.argv[5]
+        description_path = os.path.join(media_folder, "description")
+    else:
+        media_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "media", username)
+        description_path = None
 
     logger.info(f"処理開始: Mode={mode}, Username={username}, GBP={business_id}")
 
+    driver = None
     try:
         # GBP投稿画面を開く
         driver = create_business_post(business_id, logger)
@@ -444,7 +465,6 @@ def main():
         upload_result = upload_images_to_post_v2(driver, media_folder, logger)
         if not upload_result:
             logger.error("メディアアップロード失敗")
-            driver.quit()
             return 1
 
         driver, filepath = upload_result
@@ -456,6 +476,7 @@ def main():
             logger=logger,
             # filepath=filepath,
             process_id=process_id,
+            temp_file_path=description_path,
         )
 
         # フォーム入力と投稿
@@ -465,7 +486,6 @@ def main():
 
         # 投稿完了後の処理
         time.sleep(3)
-        driver.quit()
         logger.info("処理完了")
         return 0
 
@@ -473,6 +493,11 @@ def main():
         logger.error(f"予期せぬエラー: {str(e)}")
         return 1
 
+    finally:
+        # 成功・失敗にかかわらずChromeを終了し、GBP用プロファイルのリースを解放する
+        if driver is not None:
+            close_driver(driver, logger)
+
 
 if __name__ == "__main__":
     result = main()
@@ -0,0 +1,83 @@
+# 標準ライブラリのインポート
+import time
+from datetime import datetime
+
+# サードパーティのライブラリインポート
+from dotenv import load_dotenv
+
+# 自作モジュールのインポート
+from db import connection, transaction
+
+load_dotenv()
+
+# 投稿メタデータテーブル（投稿日時は変わらないため、一度確定したら再取得しない）
+META_TABLE = "POST_META"
+
+
+### メタデータ取得 ###
+def get_post_meta(shortcodes):
+    """shortcodeのリストに対応する保存済みメタデータを返す
+
+    Returns:
+        dict: shortcode -> {shortcode, user_name, posted_at(datetime), pinned, media_type, media_count}
+    """
+    shortcodes = [code for code in shortcodes if code]
+    if not shortcodes:
+        return {}
+
+    with connection() as conn:
+        placeholders = ", ".join("?" for _ in shortcodes)
+        rows = conn.execute(
+            f"SELECT shortcode, user_name, posted_at, pinned, media_type, media_count "
+            f"FROM {META_TABLE} WHERE shortcode IN ({placeholders})",
+            shortcodes,
+        ).fetchall()
+
+    return {
+        row[0]: {
+            "shortcode": row[0],
+            "user_name": row[1],
+            "posted_at": datetime.fromisoformat(row[2]),
+            "pinned": bool(row[3]),
+            "media_type": row[4],
+            "media_count": row[5],
+        }
+        for row in rows
+    }
+
+
+### メタデータ保存 ###
+def save_post_meta(records):
+    """正確な投稿日時が分かった投稿を保存する（ピン留め等は最新の値で上書き）
+
+    Args:
+        records (list): {shortcode, user_name, posted_at(datetime), pinned, media_type, media_count} のリスト
+    """
+    records = [r for r in records if r.get("shortcode") and r.get("posted_at")]
+    if not records:
+        return 0
+
+    now = time.time()
+    with transaction() as conn:
+        conn.executemany(
+            f"INSERT INTO {META_TABLE} (shortcode, user_name, posted_at, pinned, media_type, media_count, updated_at) "
+            f"VALUES (?, ?, ?, ?, ?, ?, ?) "
+            f"ON CONFLICT(shortcode) DO UPDATE SET "
+            f"pinned = excluded.pinned, "
+            f"media_type = COALESCE(excluded.media_type, media_type), "
+            f"media_count = COALESCE(excluded.media_count, media_count), "
+            f"updated_at = excluded.updated_at",
+            [
+                (
+                    r["shortcode"],
+                    r["user_name"],
+                    r["posted_at"].isoformat(),
+                    1 if r.get("pinned") else 0,
+                    r.get("media_type"),
+                    r.get("media_count"),
+                    now,
+                )
+                for r in records
+            ],
+        )
+    return len(records)
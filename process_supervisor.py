@@ -0,0 +1,104 @@
+# 標準ライブラリのインポート
+import subprocess
+
+# サードパーティのライブラリインポート
+import psutil
+
+
+### プロセスツリーの取得 ###
+def snapshot_process_tree(root_pid):
+    """指定したPIDとその子孫プロセスの情報を返す（PID再利用対策に起動時刻を含める）"""
+    records = []
+    try:
+        root = psutil.Process(root_pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return records
+
+    for proc in processes:
+        try:
+            records.append({"pid": proc.pid, "create_time": proc.create_time(), "name": proc.name()})
+        except psutil.Error:
+            continue
+    return records
+
+
+### 記録済みプロセスの終了 ###
+def kill_process_records(records, logger, timeout=5):
+    """記録したプロセスのうち、起動時刻が一致するものを子孫ごと終了する"""
+    targets = {}
+    for record in records or []:
+        try:
+            proc = psutil.Process(record["pid"])
+            if abs(proc.create_time() - float(record.get("create_time") or 0)) >= 1.0:
+                # 同じPIDの別プロセス
+                continue
+            targets[proc.pid] = proc
+            for child in proc.children(recursive=True):
+                targets[child.pid] = child
+        except (psutil.Error, KeyError, ValueError, TypeError):
+            continue
+
+    return _terminate(list(targets.values()), logger, timeout)
+
+
+### プロセスツリーの終了 ###
+def kill_process_tree(root_pid, logger, timeout=5):
+    try:
+        root = psutil.Process(root_pid)
+        processes = root.children(recursive=True) + [root]
+    except psutil.Error:
+        return 0
+    return _terminate(processes, logger, timeout)
+
+
+### 監視付きスクリプト実行 ###
+def run_supervised(cmd, logger, timeout=None, **popen_kwargs):
+    """子プロセスを実行し、タイムアウト・中断時はそのプロセスツリーだけを終了する
+
+    Returns:
+        int: 終了コード（タイムアウト時はNone）
+    """
+    process = subprocess.Popen(cmd, **popen_kwargs)
+    try:
+        return process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logger.error(f"タイムアウト({timeout}秒)のためプロセスツリーを終了します: pid={process.pid}")
+        kill_process_tree(process.pid, logger)
+        process.wait()
+        return None
+    except BaseException:
+        # KeyboardInterrupt 等でも起動したChromeを残さない
+        kill_process_tree(process.pid, logger)
+        process.wait()
+        raise
+
+
+def _terminate(processes, logger, timeout):
+    if not processes:
+        return 0
+
+    for proc in processes:
+        try:
+            proc.terminate()
+        except psutil.Error:
+            continue
+
+    gone, alive = psutil.wait_procs(processes, timeout=timeout)
+    for proc in alive:
+        try:
+            proc.kill()
+        except psutil.Error:
+            continue
+    psutil.wait_procs(alive, timeout=timeout)
+
+    names = sorted({_safe_name(p) for p in processes})
+    logger.info(f"プロセスを終了しました: {len(processes)}件 ({', '.join(names)})")
+    return len(processes)
+
+
+def _safe_name(proc):
+    try:
+        return proc.name()
+    except psutil.Error:
+        return str(proc.pid)
@@ -0,0 +1,121 @@
+# 標準ライブラリのインポート
+import os
+import time
+from datetime import datetime
+
+# サードパーティのライブラリインポート
+from dotenv import load_dotenv
+
+# 自作モジュールのインポート
+from db import connection, transaction
+
+load_dotenv()
+
+# プロファイル状態テーブル
+HEALTH_TABLE = "PROFILE_HEALTH"
+
+# 1回目の隔離時間（分）。以降は連続するごとに2倍にする
+QUARANTINE_BASE_MINUTES = float(os.getenv("QUARANTINE_BASE_MINUTES") or "60")
+
+# 隔離時間の上限（時間）
+QUARANTINE_MAX_HOURS = float(os.getenv("QUARANTINE_MAX_HOURS") or "24")
+
+
+### プロファイルの隔離 ###
+def quarantine_profile(profile_name, logger, reason=""):
+    """ロック・自動化検出されたプロファイルを隔離する（連続するごとに隔離時間を倍にする）
+
+    Returns:
+        float: 隔離の解除時刻（UNIX時間）
+    """
+    now = time.time()
+    with transaction() as conn:
+        row = conn.execute(
+            f"SELECT strikes FROM {HEALTH_TABLE} WHERE profile_name = ?", (profile_name,)
+        ).fetchone()
+        strikes = (row[0] if row else 0) + 1
+        seconds = min(QUARANTINE_BASE_MINUTES * 60 * 2 ** (strikes - 1), QUARANTINE_MAX_HOURS * 3600)
+        until = now + seconds
+
+        conn.execute(
+            f"INSERT OR REPLACE INTO {HEALTH_TABLE} "
+            f"(profile_name, strikes, quarantined_until, last_locked_at, reason) VALUES (?, ?, ?, ?, ?)",
+            (profile_name, strikes, until, now, reason),
+        )
+
+    logger.info(
+        f"プロファイルを隔離しました: {profile_name}（{strikes}回連続, "
+        f"{datetime.fromtimestamp(until).strftime('%Y-%m-%d %H:%M:%S')} まで）"
+    )
+    return until
+
+
+### プロファイルの正常記録 ###
+def mark_profile_healthy(profile_name):
+    """正常に取得できたプロファイルの連続ロック回数をリセットする"""
+    with transaction() as conn:
+        conn.execute(f"UPDATE {HEALTH_TABLE} SET strikes = 0 WHERE profile_name = ? AND strikes > 0", (profile_name,))
+
+
+### 終了コードの反映 ###
+def record_profile_result(profile_name, code, logger):
+    """取得処理の終了コードをプロファイルの状態に反映する（3=隔離 / 0,1,4=正常）"""
+    if not profile_name:
+        return
+    try:
+        if code == 3:
+            quarantine_profile(profile_name, logger, reason="アカウントロック・自動化検出")
+        elif code in (0, 1, 4):
+            mark_profile_healthy(profile_name)
+    except Exception as e:
+        logger.error(f"プロファイル状態の記録に失敗しました: {e}")
+
+
+### 隔離解除時刻の取得 ###
+def get_quarantine_until(profile_name, now=None):
+    """隔離中であれば解除時刻を、隔離されていなければNoneを返す"""
+    now = now or time.time()
+    with connection() as conn:
+        row = conn.execute(
+            f"SELECT quarantined_until FROM {HEALTH_TABLE} WHERE profile_name = ?", (profile_name,)
+        ).fetchone()
+
+    if row and row[0] > now:
+        return row[0]
+    return None
+
+
+### 使用可能なプロファイルの絞り込み ###
+def available_profiles(profile_names, logger=None):
+    """隔離中のプロファイルを除いたリストを返す（順序は維持）"""
+    available = []
+    for profile_name in profile_names:
+        if not profile_name:
+            continue
+        try:
+            until = get_quarantine_until(profile_name)
+        except Exception as e:
+            # 状態が読めない場合は従来どおり使用する
+            if logger:
+                logger.warning(f"プロファイル状態の取得に失敗しました: {e}")
+            until = None
+        if until is None:
+            available.append(profile_name)
+        elif logger:
+            logger.info(
+                f"隔離中のためスキップ: {profile_name}（{datetime.fromtimestamp(until).strftime('%H:%M:%S')} まで）"
+            )
+    return available
+
+
+### 隔離解除待ち ###
+def wait_for_available_profile(profile_names, logger):
+    """すべてのプロファイルが隔離中の場合、最も早く解除されるまで待機する"""
+    untils = [get_quarantine_until(p) for p in profile_names if p]
+    if not untils or any(until is None for until in untils):
+        return
+
+    remaining = min(untils) - time.time()
+    if remaining > 0:
+        logger.info(f"すべてのプロファイルが隔離中のため待機します: sleep({remaining:.0f})")
+        time.sleep(remaining)
@@ -0,0 +1,211 @@
+# 標準ライブラリのインポート
+import os
+import shutil
+import time
+from pathlib import Path
+
+# サードパーティのライブラリインポート
+from dotenv import load_dotenv
+
+# 自作モジュールのインポート
+from db import connection, transaction
+from media_store import release_working_file
+
+load_dotenv()
+
+# 投稿ジョブテーブル
+JOB_TABLE = "PUBLISH_JOB"
+
+# 投稿待ちメディアの保存先（ジョブごとにサブフォルダを作成）
+STAGE_DIR = Path(__file__).parent / "media" / "publish"
+
+# 投稿済みメディアの移動先
+BACKUP_DIR = Path(__file__).parent / "media" / "media_bk"
+
+# 最大試行回数
+PUBLISH_MAX_ATTEMPTS = int(os.getenv("PUBLISH_MAX_ATTEMPTS") or "3")
+
+# 再試行までの待機秒数（失敗するごとに2倍）
+PUBLISH_RETRY_SECONDS = int(os.getenv("PUBLISH_RETRY_SECONDS") or "300")
+
+# メディアの拡張子
+MEDIA_EXTENSIONS = (".jpg", ".jpeg", ".png", ".mp4", ".mov", ".avi")
+
+
+### 冪等キー ###
+def make_idempotency_key(mode, user_name, business_id, process_id):
+    """同じ取得結果を同じGBPに二重投稿しないためのキー"""
+    return f"{mode}:{user_name}:{business_id}:{process_id}"
+
+
+### 投稿ジョブの登録 ###
+def enqueue_publish_jobs(mode, user_name, process_id, business_ids, logger):
+    """取得したメディアと説明文をジョブ用フォルダに移し、GBPごとに投稿ジョブを登録する
+
+    Returns:
+        int: 新たに登録したジョブ数
+    """
+    media_dir = stage_media(user_name, process_id, logger)
+    if media_dir is None:
+        logger.info("投稿対象のメディアがないためジョブを登録しません")
+        return 0
+
+    description = _read_description(user_name, process_id)
+    now = time.time()
+    added = 0
+
+    with transaction() as conn:
+        for business_id in business_ids:
+            cursor = conn.execute(
+                f"INSERT OR IGNORE INTO {JOB_TABLE} "
+                f"(idempotency_key, mode, user_name, business_id, process_id, media_dir, description, created_at, updated_at) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    make_idempotency_key(mode, user_name, business_id, process_id),
+                    mode,
+                    user_name,
+                    business_id,
+                    process_id,
+                    str(media_dir),
+                    description,
+                    now,
+                    now,
+                ),
+            )
+            added += cursor.rowcount
+
+    logger.info(f"投稿ジョブを登録しました: {added}件（{user_name}, {mode}, process_id={process_id}）")
+    return added
+
+
+### メディアの退避 ###
+def stage_media(user_name, process_id, logger):
+    """media/<user_name> のメディアと説明文をジョブ用フォルダに移動する（次の取得で消されないように）"""
+    source_dir = Path(__file__).parent / "media" / user_name
+    if not source_dir.exists():
+        return None
+
+    media_files = [p for p in source_dir.iterdir() if p.is_file() and p.suffix.lower() in MEDIA_EXTENSIONS]
+    if not media_files:
+        return None
+
+    media_dir = STAGE_DIR / f"{user_name}_{process_id}"
+    media_dir.mkdir(parents=True, exist_ok=True)
+    for path in media_files:
+        shutil.move(str(path), str(media_dir / path.name))
+
+    description_path = source_dir / "description" / process_id
+    if description_path.exists():
+        shutil.copy2(description_path, media_dir / "description")
+
+    logger.info(f"メディアを退避しました: {len(media_files)}件 -> {media_dir}")
+    return media_dir
+
+
+def _read_description(user_name, process_id):
+    description_path = Path(__file__).parent / "media" / user_name / "description" / process_id
+    try:
+        return description_path.read_text(encoding="utf-8")
+    except OSError:
+        return None
+
+
+### ジョブの取得 ###
+def claim_next_job():
+    """実行可能なジョブを1件取得し、実行中にする（なければNone）"""
+    # 複数の投稿ワーカーが同じジョブを取らないよう書き込みロックを取ってから選ぶ（BEGIN IMMEDIATE）
+    with transaction() as conn:
+        row = conn.execute(
+            f"SELECT id, idempotency_key, mode, user_name, business_id, process_id, media_dir, description, attempts "
+            f"FROM {JOB_TABLE} WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT 1",
+            (time.time(),),
+        ).fetchone()
+        if row is None:
+            return None
+
+        conn.execute(
+            f"UPDATE {JOB_TABLE} SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+            (time.time(), row[0]),
+        )
+
+    keys = ["id", "idempotency_key", "mode", "user_name", "business_id", "process_id", "media_dir", "description", "attempts"]
+    job = dict(zip(keys, row))
+    job["attempts"] += 1
+    return job
+
+
+### ジョブの完了 ###
+def complete_job(job, logger):
+    _update_job(job["id"], "done", None, 0)
+    logger.info(f"投稿ジョブが完了しました: {job['idempotency_key']}")
+    finalize_media_dir(job["media_dir"], logger)
+
+
+### ジョブの失敗 ###
+def fail_job(job, error, logger):
+    """再試行回数が残っていれば待機後に再実行、なければ失敗として確定する"""
+    if job["attempts"] < PUBLISH_MAX_ATTEMPTS:
+        delay = PUBLISH_RETRY_SECONDS * 2 ** (job["attempts"] - 1)
+        _update_job(job["id"], "pending", error, time.time() + delay)
+        logger.info(f"投稿ジョブを{delay}秒後に再試行します（{job['attempts']}/{PUBLISH_MAX_ATTEMPTS}回目）: {job['idempotency_key']}")
+        return
+
+    _update_job(job["id"], "failed", error, 0)
+    logger.error(f"投稿ジョブが失敗しました: {job['idempotency_key']} - {error}")
+    finalize_media_dir(job["media_dir"], logger)
+
+
+def _update_job(job_id, status, error, next_attempt_at):
+    with transaction() as conn:
+        conn.execute(
+            f"UPDATE {JOB_TABLE} SET status = ?, last_error = ?, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+            (status, error, next_attempt_at, time.time(), job_id),
+        )
+
+
+### 中断したジョブの復旧 ###
+def recover_running_jobs(logger):
+    """前回の実行中に中断されたジョブを再実行待ちに戻す"""
+    with transaction() as conn:
+        cursor = conn.execute(
+            f"UPDATE {JOB_TABLE} SET status = 'pending', next_attempt_at = 0, updated_at = ? WHERE status = 'running'",
+            (time.time(),),
+        )
+
+    if cursor.rowcount:
+        logger.info(f"中断された投稿ジョブを再実行待ちに戻しました: {cursor.rowcount}件")
+    return cursor.rowcount
+
+
+### 投稿済みメディアの片付け ###
+def finalize_media_dir(media_dir, logger):
+    """同じメディアを使うジョブがすべて終わったら、メディアをバックアップに移してフォルダを削除する"""
+    with connection() as conn:
+        remaining = conn.execute(
+            f"SELECT COUNT(*) FROM {JOB_TABLE} WHERE media_dir = ? AND status IN ('pending', 'running')",
+            (media_dir,),
+        ).fetchone()[0]
+
+    if remaining:
+        return
+
+    try:
+        media_path = Path(media_dir)
+        if not media_path.exists():
+            return
+        for path in media_path.iterdir():
+            if path.is_file() and path.suffix.lower() in MEDIA_EXTENSIONS:
+                # ストアに保存済みのものは削除、それ以外はバックアップに移動
+                release_working_file(path, BACKUP_DIR)
+        shutil.rmtree(media_path)
+        logger.info(f"投稿済みメディアをバックアップしました: {media_dir}")
+    except Exception as e:
+        logger.error(f"投稿済みメディアの片付けに失敗しました: {media_dir} - {e}")
+
+
+### 未処理ジョブ数 ###
+def count_pending_jobs():
+    with connection() as conn:
+        return conn.execute(
+            f"SELECT COUNT(*) FROM {JOB_TABLE} WHERE status IN ('pending', 'running')"
+        ).fetchone()[0]
@@ -0,0 +1,312 @@
+# 標準ライブラリのインポート
+import os
+import sqlite3
+import uuid
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+
+# Seleniumに関連するインポート
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+# サードパーティのライブラリインポート
+from dotenv import load_dotenv
+
+# 自作モジュールのインポート
+from db import transaction
+from media_downloader import download_all
+from media_store import add_media
+from perf_log import iter_request_urls
+
+load_dotenv()
+
+# 取得したメディアの保存先（常駐ドライバーで実行した場合も起動時のカレントディレクトリに依存しない）
+MEDIA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "media")
+
+# post.py / story.py 共通の取得・DB・ダウンロード処理
+# 起動を軽くするため、AI・Googleのサービスなど重いライブラリはここでは読み込まない
+
+
+### 動画_URL部分取得_v1 ###
+def extract_request_urls(logs):
+    # メディアURLのフィルタリング（scontent かつ mp4）
+    return list(set(iter_request_urls(logs, "scontent", ".mp4")))
+
+### 動画_URL部分取得_v2 ###
+def extract_request_urls_v2(logs):
+    # メディアURLのフィルタリング - scontentの条件を削除（mp4ファイルのみ）
+    result = list(set(iter_request_urls(logs, ".mp4")))
+    print(f"Found {len(result)} media URLs")
+    return result
+
+### 動画_URL結合 ###
+def get_complete_media_url(urls):
+    # 最大のbyteendを持つURLを見つける
+    max_byteend = 0
+    max_byteend_url = None
+
+    for url in urls:
+        params = parse_qs(urlparse(url).query)
+        byteend = int(params.get("byteend", [0])[0])
+        if byteend > max_byteend:
+            max_byteend = byteend
+            max_byteend_url = url
+
+    if not max_byteend_url:
+        return None
+
+    # 最大byteendのURLのbytestartを0に変更
+    return max_byteend_url.split("bytestart")[0] + f"bytestart=0&byteend={max_byteend}"
+
+
+### 動画_キー取得 ###
+def getkey_blob(url):
+    try:
+        # URLをパスセグメントに分割
+        # クエリパラメータを除去
+        path = url.split("?")[0]
+        # プロトコルとドメインを除去
+        if "//" in path:
+            path = path.split("//")[1].split("/", 1)[1]
+
+        segments = [seg for seg in path.split("/") if seg]
+
+        # キーを含むセグメントは末尾
+        if segments:
+            last_segment = segments[-1]
+
+            # .mp4を除去し、必要に応じて_video_dashinitも除去
+            key = last_segment.split(".mp4")[0]
+            if "_video_dashinit" in key:
+                key = key.split("_video_dashinit")[0]
+
+            if key:
+                return key
+
+        raise ValueError("Could not find key in URL path")
+
+    except Exception as e:
+        print(f"キーの抽出に失敗しました: {str(e)}")
+        return None
+
+
+### 画像_キー取得 ###
+def getkey(url):
+    """URLからキャッシュキーを抽出"""
+    parsed_url = urlparse(url)
+    query_params = parse_qs(parsed_url.query)
+    cache_key = query_params.get("ig_cache_key", [None])[0]
+        
+    # Base64エンコードの終端マーカー(== または %3D%3D)以降をカット
+    if '%3D%3D' in cache_key:
+        return cache_key.split('%3D%3D')[0] + '%3D%3D'
+    elif '==' in cache_key:
+        return cache_key.split('==')[0] + '=='
+    return cache_key
+
+
+### DB重複チェック ###
+def checkRecord(user_name, cache_key, media_url, logger, datetime_value):
+    """データベースでレコードをチェックして保存（重複は非エラー扱い）。"""
+    return checkRecords(user_name, [(cache_key, media_url)], logger, datetime_value)[0]
+
+
+def checkRecords(user_name, items, logger, datetime_value):
+    """1投稿分の [(cache_key, media_url)] をまとめてチェックして保存する（1トランザクション・1コミット）
+
+    Returns:
+        list: items と同じ順序の結果（新規に保存したら True、重複・エラーは False）
+    """
+    import traceback
+    DBNAME = os.getenv("DB_NAME")
+    TABLENAME = os.getenv("TABLE_NAME")
+
+    # 投稿ごとに同じSQL文字列を使い、接続の文キャッシュで解析済みのものを再利用する
+    select_no_key = f"SELECT 1 FROM {TABLENAME} WHERE user_name = ? AND datetime_value = ?"
+    select_with_key = f"SELECT 1 FROM {TABLENAME} WHERE user_name = ? AND datetime_value = ? AND cache_key = ?"
+    insert = f"INSERT INTO {TABLENAME} (user_name, cache_key, media_url, datetime_value) VALUES (?, ?, ?, ?)"
+
+    results = []
+    norm_key = None
+    media_url = None
+    last_sql = None
+    last_params = None
+
+    try:
+        with transaction() as conn:
+            for cache_key, media_url in items:
+                # cache_key の正規化（None / 空文字 / 空白 → None）
+                norm_key = (cache_key or "").strip() or None
+
+                if norm_key is None:
+                    # ★ cache_key が無い → 日付のみで重複チェック（同一投稿は1件だけ許可）
+                    last_sql, last_params = select_no_key, (user_name, datetime_value)
+                else:
+                    # ★ cache_key がある → 投稿内で同一メディアのみ重複扱い
+                    last_sql, last_params = select_with_key, (user_name, datetime_value, norm_key)
+
+                if conn.execute(last_sql, last_params).fetchone() is not None:
+                    if norm_key is None:
+                        logger.info(f"DUP(no-key by date): user={user_name}, dt={datetime_value}")
+                    else:
+                        logger.info(f"DUP(with-key): user={user_name}, key={norm_key}, dt={datetime_value}")
+                    results.append(False)
+                    continue
+
+                last_sql, last_params = insert, (user_name, norm_key, media_url, datetime_value)
+                try:
+                    conn.execute(last_sql, last_params)
+                except sqlite3.IntegrityError:
+                    # ← ここだけ“普通のログ”に変更（stacktrace無し）。失敗した1件のみ取り消され、トランザクションは続く
+                    logger.info(
+                        "DUP(unique): 既存レコードにつき挿入スキップ | "
+                        f"DB={DBNAME}, table={TABLENAME}, user={user_name}, key={norm_key}, "
+                        f"dt={datetime_value}, url={media_url}, sql={last_sql}, params={last_params}"
+                    )
+                    results.append(False)
+                    continue
+
+                if norm_key is None:
+                    logger.info(f"INSERT(no-key): user={user_name}, dt={datetime_value}")
+                else:
+                    logger.info(f"INSERT(with-key): user={user_name}, key={norm_key}, dt={datetime_value}")
+                results.append(True)
+        return results
+
+    except sqlite3.Error as e:
+        # その他のDBエラーは投稿全体をロールバックしてフルログ
+        error_msg = (
+            f"データベースエラーが発生しました: {e}; "
+            f"DB='{DBNAME}', table='{TABLENAME}', "
+            f"user='{user_name}', key='{norm_key}', dt='{datetime_value}', url='{media_url}', "
+            f"sql='{last_sql}', params={last_params}"
+        )
+        logger.error(error_msg)
+        logger.error("Traceback:\n" + traceback.format_exc())
+        print(error_msg)
+        return [False] * len(items)
+
+
+### メディアダウンロード ###
+def download_media(logger, url, username, type, shortcode=None):
+    return download_media_batch(logger, [url], username, type, shortcode)[0]
+
+
+### メディアの一括ダウンロード ###
+def download_media_batch(logger, urls, username, type, shortcode=None):
+    """1投稿分のメディアを並列で取得し、内容のハッシュで保存する
+
+    ファイル名は {username}_{日時}_{連番}_{ハッシュ先頭16桁}.{type}。
+    内容で名前が決まるため重複しない（同じ秒に取得しても待つ必要がない）。
+    並びは完了順に関係なく urls の順序になる。
+
+    Returns:
+        list: urls と同じ順序の保存先（失敗したものは None）
+    """
+    if not urls:
+        return []
+
+    user_dir = os.path.join(MEDIA_DIR, username)
+    if not os.path.exists(user_dir):
+        os.makedirs(user_dir, exist_ok=True)
+        print(f"フォルダを作成しました: {user_dir}")
+
+    # 取得中は拡張子を付けない（GBP投稿の対象に含めない）
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    prefixes = {}
+    jobs = []
+    for i, url in enumerate(urls, 1):
+        prefix = f"{username}_{timestamp}_{i:02d}"
+        temp_name = os.path.join(user_dir, f"{prefix}_{uuid.uuid4().hex}.download")
+        prefixes[temp_name] = prefix
+        jobs.append((url, temp_name))
+
+    def finish(temp_name):
+        if type == "jpg":
+            extend_image_to_size(logger, temp_name)
+        # 加工後の内容でストアに登録し、ハッシュを含む名前にする
+        digest, _ = add_media(temp_name, username, shortcode, logger, ext=f".{type}")
+        filename = os.path.join(user_dir, f"{prefixes[temp_name]}_{digest[:16]}.{type}")
+        os.replace(temp_name, filename)
+        print(f"ダウンロード完了: {filename}")
+        logger.info(f"ダウンロード完了: {filename}")
+        return filename
+
+    return download_all(jobs, logger, on_complete=finish)
+
+
+### 画像リサイズ ###
+def extend_image_to_size(logger, image_path, output_path=None, target_width=400, target_height=300):
+    """
+    画像のサイズが指定サイズより小さい場合、黒で拡張する
+    output_pathが指定されない場合は、元の画像を上書きする
+    """
+    try:
+        # output_pathが指定されていない場合は入力パスを使用
+        output_path = output_path or image_path
+
+        # 画像を開く（Pillowは画像処理時のみ読み込む）
+        from PIL import Image
+
+        img = Image.open(image_path)
+        # 取得中の一時ファイル（.download）は拡張子から形式が分からないため、保存時は形式を指定する
+        original_format = img.format or "JPEG"
+        original_img = img.copy()  # 元の画像のバックアップを作成（copy() は形式を引き継がない）
+
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+
+        current_width, current_height = img.size
+
+        if logger:
+            logger.info(f"元の画像サイズ: {current_width}x{current_height}")
+
+        new_width = max(current_width, target_width)
+        new_height = max(current_height, target_height)
+
+        if new_width > current_width or new_height > current_height:
+            try:
+                new_img = Image.new("RGB", (new_width, new_height), "black")
+                x = (new_width - current_width) // 2
+                y = (new_height - current_height) // 2
+                new_img.paste(img, (x, y))
+
+                # 保存
+                new_img.save(output_path, "JPEG", quality=95)
+                return True
+
+            except Exception as e:
+                if output_path == image_path:
+                    # 処理に失敗した場合、元の画像を復元
+                    original_img.save(image_path, format=original_format)
+                raise e
+        else:
+            if logger:
+                logger.info("サイズ変更は不要です")
+            if output_path != image_path:  # パスが異なる場合のみコピー
+                img.save(output_path, "JPEG", quality=95)
+            return False
+
+    except Exception as e:
+        if logger:
+            logger.error(f"画像処理中にエラーが発生: {str(e)}")
+        raise
+
+
+### datetime属性の抽出 ###
+def extract_datetime(driver, logger, timeout=10):
+    """
+    ストーリーの<time>タグからdatetime属性を抽出する。
+    """
+    try:
+        logger.info("datetime属性の抽出を開始します")
+        time_element = WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((By.XPATH, "//time[@datetime]"))
+        )
+        datetime_value = time_element.get_attribute("datetime")
+        logger.info(f"抽出されたdatetime: {datetime_value}")
+        return datetime_value
+    except Exception as e:
+        logger.warning(f"datetimeの抽出に失敗しました: {str(e)}")
+        return None
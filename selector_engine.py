@@ -0,0 +1,178 @@
+# 標準ライブラリのインポート
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+# Seleniumに関連するインポート
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+# 自作モジュールのインポート
+from db import connection, transaction
+
+# セレクタごとの的中回数の記録テーブル（レイアウトごと）
+STATS_TABLE = "SELECTOR_STATS"
+
+# 一致なしの回数を記録する名前
+MISS_NAME = "(なし)"
+
+# セレクタの段階（広く一致するフォールバックは、正確なセレクタより前には並べない）
+PRECISE = 0
+FALLBACK = 1
+
+# 1回記録するごとに過去の回数に掛ける係数（直近およそ 1/(1-係数) 回分の結果で順位を決める）
+STATS_DECAY = float(os.getenv("SELECTOR_STATS_DECAY") or "0.98")
+
+# 候補のXPathをまとめて評価し、[要素, テキスト] を返す（見つからない候補は null）
+EVALUATE_SCRIPT = """
+const root = arguments[1] || document;
+return arguments[0].map(xp => {
+    try {
+        const el = document.evaluate(xp, root, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        if (!el) return null;
+        return [el, (el.innerText || el.textContent || '').trim()];
+    } catch (e) {
+        return null;
+    }
+});
+"""
+
+
+### セレクタの選択 ###
+def find_by_strategies(driver, layout, strategies, logger=None, timeout=10, root=None, accept=None):
+    """候補のXPathを1回の execute_script でまとめて評価し、採用できた要素を返す
+
+    同じ段階の中では直近の的中率が高いセレクタを優先し、各セレクタが一致したかをレイアウトごとに記録する。
+    候補ごとに待つのではなく、全体で timeout 秒までまとめて再評価する。
+
+    Args:
+        layout: ページのレイアウト（'dialog' / 'article' / 'fallback' など）
+        strategies: [(名前, XPath)] または [(名前, XPath, 段階)] のリスト。正確なものから順に並べる
+            （段階を省略したものは PRECISE。FALLBACK のものは PRECISE のものより前に並べ替えない）
+        root: 相対XPathの起点となる要素（省略時は document）
+        accept: 要素のテキストを受け取り、採用するかを返す関数（省略時は空でなければ採用）
+
+    Returns:
+        tuple: (要素, 名前)。見つからなければ (None, None)
+    """
+    accept = accept or bool
+    ordered = rank_strategies(layout, strategies)
+    names = [s[0] for s in ordered]
+    xpaths = [s[1] for s in ordered]
+
+    def evaluate(d):
+        results = d.execute_script(EVALUATE_SCRIPT, xpaths, root) or []
+        matched = [name for name, result in zip(names, results) if result and accept(result[1])]
+        if not matched:
+            return False
+        return results[names.index(matched[0])][0], matched
+
+    start = time.time()
+    try:
+        element, matched = WebDriverWait(driver, timeout, poll_frequency=0.2).until(evaluate)
+    except TimeoutException:
+        record_result(layout, names, [])
+        if logger:
+            logger.warning(f"[selector] {layout}: いずれのセレクタにも一致しませんでした（{len(ordered)}件）")
+        return None, None
+
+    record_result(layout, names, matched)
+    name = matched[0]
+    if logger:
+        logger.info(f"[selector] {layout}: {name}（優先順位{names.index(name) + 1}位, {time.time() - start:.2f}秒）")
+    return element, name
+
+
+def rank_strategies(layout, strategies):
+    """段階ごとに、直近の的中率が高い順に並べ替える（同率・記録なしは元の順序）
+
+    記録のないセレクタの的中率は 1/2 とみなす（(的中+1)/(試行+2)）。
+    """
+    try:
+        with connection() as conn:
+            stats = {
+                name: (hits, attempts)
+                for name, hits, attempts in conn.execute(
+                    f"SELECT name, hits, attempts FROM {STATS_TABLE} WHERE layout = ?", (layout,)
+                )
+            }
+    except sqlite3.Error:
+        stats = {}
+
+    def key(item):
+        index, strategy = item
+        hits, attempts = stats.get(strategy[0], (0, 0))
+        tier = strategy[2] if len(strategy) > 2 else PRECISE
+        return tier, -(hits + 1) / (attempts + 2), index
+
+    return [strategy for _, strategy in sorted(enumerate(strategies), key=key)]
+
+
+### 結果の記録 ###
+def record_result(layout, names, matched):
+    """1回分の結果を記録する（names: 評価したセレクタ、matched: そのうち一致したセレクタ）
+
+    並び順に関係なく全候補を評価しているため、一致したセレクタはすべて的中として数える
+    （先に並んだセレクタだけが回数を増やし、順位が固定されることがない）。
+    過去の回数は STATS_DECAY を掛けて減らし、直近の結果ほど重く扱う。
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows = [(name, 1 if name in matched else 0) for name in names]
+    rows.append((MISS_NAME, 0 if matched else 1))
+    try:
+        with transaction() as conn:
+            conn.execute(
+                f"UPDATE {STATS_TABLE} SET hits = hits * ?, attempts = attempts * ? WHERE layout = ?",
+                (STATS_DECAY, STATS_DECAY, layout),
+            )
+            conn.executemany(
+                f"INSERT INTO {STATS_TABLE} (layout, name, hits, attempts, last_hit) VALUES (?, ?, ?, 1, ?) "
+                f"ON CONFLICT(layout, name) DO UPDATE SET hits = hits + excluded.hits, attempts = attempts + 1, "
+                f"last_hit = CASE WHEN excluded.hits > 0 THEN excluded.last_hit ELSE last_hit END",
+                [(layout, name, hit, now if hit else None) for name, hit in rows],
+            )
+    except sqlite3.Error:
+        # 記録できなくても取得処理は続ける
+        pass
+
+
+### 的中率の取得 ###
+def get_selector_stats():
+    """レイアウト・セレクタごとの直近の的中率を返す（レイアウト変更の検知用）
+
+    Returns:
+        list: {layout, name, hits, attempts, hit_rate, last_hit} のリスト（一致なしは name='(なし)'）
+    """
+    with connection() as conn:
+        rows = conn.execute(
+            f"SELECT layout, name, hits, attempts, last_hit FROM {STATS_TABLE} "
+            f"ORDER BY layout, name = ?, hits * 1.0 / attempts DESC",
+            (MISS_NAME,),
+        ).fetchall()
+
+    return [
+        {
+            "layout": layout,
+            "name": name,
+            "hits": hits,
+            "attempts": attempts,
+            "hit_rate": hits / attempts if attempts else 0.0,
+            "last_hit": last_hit,
+        }
+        for layout, name, hits, attempts, last_hit in rows
+    ]
+
+
+if __name__ == "__main__":
+    # python selector_engine.py で的中率を表示する
+    rows = get_selector_stats()
+    if not rows:
+        print(f"記録がありません: {STATS_TABLE}")
+        sys.exit(0)
+    for row in rows:
+        print(
+            f"{row['layout']:<10} {row['name']:<20} {row['hits']:>7.1f}/{row['attempts']:<7.1f} "
+            f"{row['hit_rate']:>6.1%}  {row['last_hit'] or ''}"
+        )
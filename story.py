@@ -1,17 +1,12 @@
 # 標準ライブラリのインポート
 import base64
 import io
-import json
 import logging
 import os
-import sqlite3
 import sys
-import time
 import random
 from datetime import datetime
 from pathlib import Path
-from urllib.parse import urlparse, parse_qs
-from PIL import Image
 
 # Seleniumに関連するインポート
 from selenium import webdriver
@@ -20,20 +15,27 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
-from webdriver_manager.chrome import ChromeDriverManager
-
-# AI サービス
-from anthropic import Anthropic
-from openai import OpenAI
-
-# Google サービス
-from google.cloud import videointelligence
-from google.oauth2 import service_account
 
 # サードパーティのライブラリインポート
-import requests
+# AI・Googleのサービスは読み込みに時間がかかるため、使用する関数内でインポートする
 from dotenv import load_dotenv
 
+# 自作モジュールのインポート
+from chrome_lease import acquire_chrome_lease, close_driver, record_driver_processes, release_chrome_lease
+from driver_cache import get_chromedriver_path, invalidate_chromedriver_cache
+from media_capture import MediaCapture, enable_network_logging
+from page_ready import wait_for_profile_ready
+from phash_index import filter_near_duplicates
+from profile_health import available_profiles, record_profile_result
+from scraper_core import (
+    MEDIA_DIR,
+    checkRecord,
+    download_media,
+    extract_datetime,
+    getkey,
+    getkey_blob,
+)
+
 load_dotenv()
 
 
@@ -63,9 +65,10 @@ def setup_logger(username):
     logger = logging.getLogger(f"InstagramScraper_{username}")
     logger.setLevel(logging.INFO)
 
-    # 既存のハンドラをクリア（同じユーザーの複数回の実行で重複を防ぐ）
-    if logger.hasHandlers():
-        logger.handlers.clear()
+    # 既存のハンドラを閉じて外す（同じプロセスでの複数回の実行で重複・ファイルの開きっぱなしを防ぐ）
+    for handler in logger.handlers[:]:
+        handler.close()
+        logger.removeHandler(handler)
 
     logger.addHandler(file_handler)
 
@@ -80,33 +83,44 @@ def setup_logger(username):
 
 
 ### Seleniumセットアップ ###
-def get_chrome_driver_v2(logger):
-    """Chromeドライバーの設定（並列実行対応）"""
+def get_chrome_driver_v2(logger, profile_name=None):
+    """Chromeドライバーの設定（並列実行対応）
+
+    profile_nameを指定した場合はそのプロファイルを使用する（常駐実行用）
+    """
     load_dotenv()
     chrome_options = Options()
      # .envから設定を読み込む
-    base_path = os.getenv("CHROME_PROFILE_PATH")
     
-    # プロファイルをランダムに選択
-    profile_name, cookies_file = random.choice(
-        [
-            [os.getenv("PROFILE_NAME_1"),os.getenv("INSTAGRAM_COOKIE_1")],
-            [os.getenv("PROFILE_NAME_2"),os.getenv("INSTAGRAM_COOKIE_2")],
-            [os.getenv("PROFILE_NAME_3"),os.getenv("INSTAGRAM_COOKIE_3")],
-            [os.getenv("PROFILE_NAME_4"),os.getenv("INSTAGRAM_COOKIE_4")],
-        ]
-    )
+    profiles = [
+        [os.getenv("PROFILE_NAME_1"),os.getenv("INSTAGRAM_COOKIE_1")],
+        [os.getenv("PROFILE_NAME_2"),os.getenv("INSTAGRAM_COOKIE_2")],
+        [os.getenv("PROFILE_NAME_3"),os.getenv("INSTAGRAM_COOKIE_3")],
+        [os.getenv("PROFILE_NAME_4"),os.getenv("INSTAGRAM_COOKIE_4")],
+    ]
+    # 並列実行時はワーカーに割り当てられたプロファイルを使用、それ以外はランダムな順で空きを探す
+    assigned_profile = profile_name or os.getenv("GLINK_PROFILE_NAME")
+    if assigned_profile:
+        candidates = [assigned_profile]
+    else:
+        # 隔離中（ロック・自動化検出後）のプロファイルは使用しない
+        candidates = available_profiles([p[0] for p in profiles], logger)
+        random.shuffle(candidates)
+
+    # 同時実行できるようにポートとユーザーデータディレクトリをリースで確保
+    lease = acquire_chrome_lease(candidates, logger)
+    if lease is None:
+        return None, None
+    profile_name = lease["profile_name"]
+    cookies_file = next((p[1] for p in profiles if p[0] == profile_name), None)
     logger.info(f"選択されたプロファイル: {profile_name}")
+    logger.info(f"使用するパス: {os.path.join(lease['user_data_dir'], profile_name)}")
 
-    # 完全なユーザーデータディレクトリのパスを構築
-    user_data_dir = os.path.join(base_path, profile_name)
-    logger.info(f"使用するパス: {user_data_dir}")
-    
     # オプションを設定
     # リモートデバッグのためのオプション修正
-    chrome_options.add_argument(f"--user-data-dir={base_path}")
-    chrome_options.add_argument(f"--profile-directory={profile_name}")      
-    chrome_options.add_argument("--remote-debugging-port=9222")
+    chrome_options.add_argument(f"--user-data-dir={lease['user_data_dir']}")
+    chrome_options.add_argument(f"--profile-directory={profile_name}")
+    chrome_options.add_argument(f"--remote-debugging-port={lease['port']}")
 
     # その他の必要なオプション
     chrome_options.add_argument("--no-sandbox")
@@ -132,327 +146,28 @@ def get_chrome_driver_v2(logger):
     }
     chrome_options.add_experimental_option("prefs", prefs)
 
-    # パフォーマンスログの設定
-    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    # パフォーマンスログの設定（ネットワークイベントのみ）
+    enable_network_logging(chrome_options)
 
     try:
-        service = Service(ChromeDriverManager().install())
+        service = Service(get_chromedriver_path(logger))
         driver = webdriver.Chrome(service=service, options=chrome_options)
+        record_driver_processes(lease, driver, logger)
+        driver.glink_lease = lease
         return driver, cookies_file
     except Exception as e:
+        # Chrome更新でドライバーが合わなくなった場合は次回取得し直す
+        invalidate_chromedriver_cache(logger, e)
         error_msg = f"Chromeドライバーの設定でエラーが発生しました: {e}"
         logger.error(error_msg)
         logger.error("注意: Chromeを完全に終了してから実行してください")
-        return None
-
-
-### 動画_URL部分取得_v1 ###
-def extract_request_urls(logs):
-    request_urls = set()
-
-    for entry in logs:
-        try:
-            message = json.loads(entry.get("message", "{}"))
-            if "message" not in message:
-                continue
-
-            # Request URLを含む部分を取得
-            params = message.get("message", {}).get("params", {})
-            if "request" in params:
-                request = params["request"]
-                url = request.get("url", "")
-
-                # メディアURLのフィルタリング
-                if (
-                    "scontent" in url
-                    and
-                    # '/v/t16/' in url and
-                    ".mp4" in url
-                ):  # 部分的なリクエストを除外
-
-                    request_urls.add(url)
-
-        except (json.JSONDecodeError, KeyError):
-            continue
-
-    return list(request_urls)
-
-### 動画_URL部分取得_v2 ###
-def extract_request_urls_v2(logs):
-    request_urls = set()
-    for entry in logs:
-        try:
-            message = json.loads(entry.get("message", "{}"))
-            if "message" not in message:
-                continue
-            # Request URLを含む部分を取得
-            params = message.get("message", {}).get("params", {})
-            if "request" in params:
-                request = params["request"]
-                url = request.get("url", "")
-                # メディアURLのフィルタリング - scontentの条件を削除
-                if ".mp4" in url:  # mp4ファイルのみをフィルタリング
-                    #print(f"MP4 URL found: {url}")
-                    request_urls.add(url)
-        except (json.JSONDecodeError, KeyError):
-            continue
-    
-    result = list(request_urls)
-    print(f"Found {len(result)} media URLs")
-    return result
-
-### 動画_URL結合 ###
-def get_complete_media_url(urls):
-    from urllib.parse import urlparse, parse_qs
-
-    # 最大のbyteendを持つURLを見つける
-    max_byteend = 0
-    max_byteend_url = None
-
-    for url in urls:
-        params = parse_qs(urlparse(url).query)
-        byteend = int(params.get("byteend", [0])[0])
-        if byteend > max_byteend:
-            max_byteend = byteend
-            max_byteend_url = url
-
-    if not max_byteend_url:
-        return None
-
-    # 最大byteendのURLのbytestartを0に変更
-    return max_byteend_url.split("bytestart")[0] + f"bytestart=0&byteend={max_byteend}"
-
-
-### 動画_キー取得 ###
-def getkey_blob(url):
-    try:
-        # URLをパスセグメントに分割
-        # クエリパラメータを除去
-        path = url.split("?")[0]
-        # プロトコルとドメインを除去
-        if "//" in path:
-            path = path.split("//")[1].split("/", 1)[1]
-
-        segments = [seg for seg in path.split("/") if seg]
-
-        # キーを含むセグメントは末尾
-        if segments:
-            last_segment = segments[-1]
-
-            # .mp4を除去し、必要に応じて_video_dashinitも除去
-            key = last_segment.split(".mp4")[0]
-            if "_video_dashinit" in key:
-                key = key.split("_video_dashinit")[0]
-
-            if key:
-                return key
-
-        raise ValueError("Could not find key in URL path")
-
-    except Exception as e:
-        print(f"キーの抽出に失敗しました: {str(e)}")
-        return None
-
-
-### 画像_キー取得 ###
-def getkey(url):
-    """URLからキャッシュキーを抽出"""
-    parsed_url = urlparse(url)
-    query_params = parse_qs(parsed_url.query)
-    cache_key = query_params.get("ig_cache_key", [None])[0]
-        
-    # Base64エンコードの終端マーカー(== または %3D%3D)以降をカット
-    if '%3D%3D' in cache_key:
-        return cache_key.split('%3D%3D')[0] + '%3D%3D'
-    elif '==' in cache_key:
-        return cache_key.split('==')[0] + '=='
-    return cache_key
-
-
-### DB重複チェック ###
-def checkRecord(user_name, cache_key, media_url, logger, datetime_value):
-    """データベースでレコードをチェックして保存（重複は非エラー扱い）。"""
-    import traceback
-    DBNAME = os.getenv("DB_NAME")
-    TABLENAME = os.getenv("TABLE_NAME")
-
-    conn = None
-    last_sql = None
-    last_params = None
-
-    try:
-        conn = sqlite3.connect(DBNAME)
-        cursor = conn.cursor()
-
-        # cache_key の正規化（None / 空文字 / 空白 → None）
-        norm_key = (cache_key or "").strip() or None
-
-        if norm_key is None:
-            # ★ cache_key が無い → 日付のみで重複チェック（同一投稿は1件だけ許可）
-            last_sql = f"SELECT 1 FROM {TABLENAME} WHERE user_name = ? AND datetime_value = ?"
-            last_params = (user_name, datetime_value)
-            cursor.execute(last_sql, last_params)
-            exists = cursor.fetchone()
-
-            if exists is None:
-                last_sql = (f"INSERT INTO {TABLENAME} "
-                            f"(user_name, cache_key, media_url, datetime_value) VALUES (?, ?, ?, ?)")
-                last_params = (user_name, None, media_url, datetime_value)
-                cursor.execute(last_sql, last_params)
-                conn.commit()
-                logger.info(f"INSERT(no-key): user={user_name}, dt={datetime_value}")
-                return True
-            else:
-                logger.info(f"DUP(no-key by date): user={user_name}, dt={datetime_value}")
-                return False
-
-        else:
-            # ★ cache_key がある → 投稿内で同一メディアのみ重複扱い
-            last_sql = (f"SELECT 1 FROM {TABLENAME} "
-                        f"WHERE user_name = ? AND datetime_value = ? AND cache_key = ?")
-            last_params = (user_name, datetime_value, norm_key)
-            cursor.execute(last_sql, last_params)
-            exists = cursor.fetchone()
-
-            if exists is None:
-                last_sql = (f"INSERT INTO {TABLENAME} "
-                            f"(user_name, cache_key, media_url, datetime_value) VALUES (?, ?, ?, ?)")
-                last_params = (user_name, norm_key, media_url, datetime_value)
-                cursor.execute(last_sql, last_params)
-                conn.commit()
-                logger.info(f"INSERT(with-key): user={user_name}, key={norm_key}, dt={datetime_value}")
-                return True
-            else:
-                logger.info(f"DUP(with-key): user={user_name}, key={norm_key}, dt={datetime_value}")
-                return False
-
-    except sqlite3.IntegrityError as e:
-        # ← ここだけ“普通のログ”に変更（stacktrace無し）
-        if conn:
-            conn.rollback()
-        logger.info(
-            "DUP(unique): 既存レコードにつき挿入スキップ | "
-            f"DB={DBNAME}, table={TABLENAME}, user={user_name}, key={norm_key}, "
-            f"dt={datetime_value}, url={media_url}, sql={last_sql}, params={last_params}"
-        )
-        return False
-
-    except sqlite3.Error as e:
-        # その他のDBエラーはロールバックしてフルログ
-        error_msg = (
-            f"データベースエラーが発生しました: {e}; "
-            f"DB='{DBNAME}', table='{TABLENAME}', "
-            f"user='{user_name}', key='{norm_key}', dt='{datetime_value}', url='{media_url}', "
-            f"sql='{last_sql}', params={last_params}"
-        )
-        logger.error(error_msg)
-        logger.error("Traceback:\n" + traceback.format_exc())
-        print(error_msg)
-        if conn:
-            conn.rollback()
-        return False
-
-    finally:
-        if conn:
-            conn.close()
-
-
-### メディアダウンロード ###
-def download_media(logger, url, username, type):
-    try:
-        user_dir = os.path.join("media", username)
-        if not os.path.exists(user_dir):
-            os.makedirs(user_dir)
-            print(f"フォルダを作成しました: {user_dir}")
-
-        # ファイル名を生成（ユーザー名フォルダ配下）
-        time.sleep(2)
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        filename = os.path.join(user_dir, f"{username}_{timestamp}.{type}")
-
-        # 動画のダウンロード
-        print(f"ダウンロードを開始します: {filename}")
-        logger.info(f"ダウンロードを開始します: {filename}")
-        response = requests.get(url)
-        response.raise_for_status()
-
-        # ファイルとして保存
-        with open(filename, "wb") as f:
-            f.write(response.content)
-
-        print(f"ダウンロード完了: {filename}")
-        logger.info(f"ダウンロード完了: {filename}")
-
-        if type == "jpg":
-            extend_image_to_size(logger, filename)
-
-        return True
-
-    except Exception as e:
-        print(f"メディアダウンロードでエラーが発生しました: {str(e)}")
-        logger.error(f"メディアダウンロードでエラーが発生しました: {str(e)}")
-        if os.path.exists(filename):
-            os.remove(filename)
-        return False
-
-
-### 画像リサイズ ###
-def extend_image_to_size(logger, image_path, output_path=None, target_width=400, target_height=300):
-    """
-    画像のサイズが指定サイズより小さい場合、黒で拡張する
-    output_pathが指定されない場合は、元の画像を上書きする
-    """
-    try:
-        # output_pathが指定されていない場合は入力パスを使用
-        output_path = output_path or image_path
-
-        # 画像を開く
-        img = Image.open(image_path)
-        original_img = img.copy()  # 元の画像のバックアップを作成
-
-        if img.mode != "RGB":
-            img = img.convert("RGB")
-
-        current_width, current_height = img.size
-
-        if logger:
-            logger.info(f"元の画像サイズ: {current_width}x{current_height}")
-
-        new_width = max(current_width, target_width)
-        new_height = max(current_height, target_height)
-
-        if new_width > current_width or new_height > current_height:
-            try:
-                new_img = Image.new("RGB", (new_width, new_height), "black")
-                x = (new_width - current_width) // 2
-                y = (new_height - current_height) // 2
-                new_img.paste(img, (x, y))
-
-                # 保存
-                new_img.save(output_path, "JPEG", quality=95)
-                return True
-
-            except Exception as e:
-                if output_path == image_path:
-                    # 処理に失敗した場合、元の画像を復元
-                    original_img.save(image_path)
-                raise e
-        else:
-            if logger:
-                logger.info("サイズ変更は不要です")
-            if output_path != image_path:  # パスが異なる場合のみコピー
-                img.save(output_path, "JPEG", quality=95)
-            return False
-
-    except Exception as e:
-        if logger:
-            logger.error(f"画像処理中にエラーが発生: {str(e)}")
-        raise
+        release_chrome_lease(lease, logger)
+        return None, None
 
 
 ### メディア確認 ###
 def check_media(username):
-    media_dir = os.path.join("media", username)
+    media_dir = os.path.join(MEDIA_DIR, username)
 
     # ディレクトリが存在しない場合はNoneを返す
     if not os.path.exists(media_dir) or not os.path.isdir(media_dir):
@@ -472,7 +187,10 @@ def check_media(username):
 ### 説明文取得_動画 ###
 def get_video_description(video_path):
     """動画から0秒時点で表示されているテキストを上から順に抽出する関数"""
-    credentials_path = os.path.join("service_account", "g-link-meo-e7d409a75ece.json")
+    from google.cloud import videointelligence
+    from google.oauth2 import service_account
+
+    credentials_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "service_account", "g-link-meo-e7d409a75ece.json")
 
     try:
         credentials = service_account.Credentials.from_service_account_file(
@@ -541,6 +259,8 @@ def format_description_GPT(text, username, logger):
 
     try:
         # OpenAI クライアントの初期化
+        from openai import OpenAI
+
         client = OpenAI(api_key=api_key)
 
         # メッセージの作成と送信
@@ -595,6 +315,8 @@ def format_description_Claude(text, username, logger):
     """
 
     try:
+        from anthropic import Anthropic
+
         client = Anthropic(api_key=api_key)
 
         # メッセージの作成と送信
@@ -645,6 +367,8 @@ def get_image_description_GPT(image_path, logger):
 
     try:
         # OpenAI クライアントの初期化
+        from openai import OpenAI
+
         client = OpenAI(api_key=api_key)
 
         # 画像のエンコード
@@ -702,6 +426,8 @@ def get_image_description_Claude(image_path, logger):
 
     try:
         # クライアントの初期化
+        from anthropic import Anthropic
+
         client = Anthropic(api_key=api_key)
 
         # 画像のエンコード
@@ -784,24 +510,6 @@ def clean_description(text, USERNAME, logger):
         print(f"Error in clean_description: {e}")
         return text  # エラー時は元の文字列を返す
 
-### datetime属性の抽出 ###
-def extract_datetime(driver, logger, timeout=10):
-    """
-    ストーリーの<time>タグからdatetime属性を抽出する。
-    """
-    try:
-        logger.info("datetime属性の抽出を開始します")
-        time_element = WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((By.XPATH, "//time[@datetime]"))
-        )
-        datetime_value = time_element.get_attribute("datetime")
-        logger.info(f"抽出されたdatetime: {datetime_value}")
-        return datetime_value
-    except Exception as e:
-        logger.warning(f"datetimeの抽出に失敗しました: {str(e)}")
-        return None
-
-
 ########## メイン　##########
 def main():
     # コマンドライン引数の処理
@@ -823,11 +531,27 @@ def main():
         logger.error("Chromeドライバーの初期化に失敗しました")
         return 1
 
+    try:
+        result = scrape_story(driver, USERNAME, process_id, logger)
+        record_profile_result(driver.glink_lease["profile_name"], result, logger)
+        return result
+    finally:
+        close_driver(driver, logger)
+
+
+########## ストーリー取得　##########
+def scrape_story(driver, USERNAME, process_id, logger):
+    """起動済みのドライバーでストーリーを取得する（ドライバーの終了は呼び出し側で行う）
+
+    Returns:
+        int: 0=新規メディアあり / 1=対象なし・エラー / 3=アカウントロック・自動化検出
+    """
     ########## Instagramのプロフィールページにアクセス ##########
     try:
         logger.info(f"{USERNAME} のプロフィールページにアクセスします")
         driver.get(f"https://www.instagram.com/{USERNAME}/?hl=ja")
-        time.sleep(10)
+        # グリッド・投稿なし・エラー・プロフィール写真のいずれかが表示されるまで待つ
+        wait_for_profile_ready(driver, USERNAME, logger, include_profile_image=True)
         # # cookieの読み込み
         # json_open = open(cookies_file, 'r') 
         # cookies = json.load(json_open) 
@@ -836,13 +560,10 @@ def main():
         #     driver.add_cookie(tmp) 
         # driver.get(f"https://www.instagram.com/{USERNAME}/?hl=ja")
 
-        time.sleep(10)
-
     except Exception as e:
         error_msg = f"実行中にエラーが発生しました: {e}"
         logger.error(error_msg)
         print(error_msg)
-        driver.quit()
         return 1
 
     # Facebookのエラーページをチェック
@@ -876,6 +597,9 @@ def main():
     try:
         xpath = f"//img[contains(@alt, '{USERNAME}のプロフィール写真')]"
         profile_image = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, xpath)))
+        # プロフィールページ分のログを捨て、ストーリーの通信だけを対象にする
+        capture = MediaCapture(driver, logger)
+        capture.reset()
         profile_image.click()
         logger.info("プロフィール写真のクリックに成功しました")
 
@@ -883,7 +607,6 @@ def main():
         error_msg = f"プロフィール画像のクリックに失敗しました: {e}"
         logger.error(error_msg)
         print(error_msg)
-        driver.quit()
         return 1
 
     ########## メディア取得 ##########
@@ -916,13 +639,10 @@ def main():
             # driver.quit()
             # urls = get_video_urls(driver)
 
-            time.sleep(1)
-            # ネットワーク取得
-            netlog = driver.get_log("performance")
-            # url(部分的)取得
-            urls = extract_request_urls_v2(netlog)
+            # 動画の分割リクエストが出揃うまでログを少しずつ読み、mp4のURLだけを保持する
+            capture.collect()
             # url結合
-            url = get_complete_media_url(urls)
+            url = capture.complete_url()
             print(url)
             logger.info(f"生成URL:{url}")
 
@@ -932,7 +652,6 @@ def main():
                 cache_key = getkey_blob(url)
                 if cache_key is None:
                     logger.error("Keyの取得に失敗しました")
-                    driver.quit()
                     return 1
 
                 result_blob = checkRecord(USERNAME, cache_key, url, logger, datetime_value)
@@ -941,10 +660,8 @@ def main():
                 # 動画DL
                 download_media(logger, url, USERNAME, "mp4")
             else:
-                driver.quit()
                 return 1
 
-            driver.quit()
             logger.info("処理終了")
             return 0
 
@@ -978,13 +695,14 @@ def main():
             print(image_url)
             # 画像DL
             if result:
-                download_media(logger, image_url, USERNAME, "jpg")
+                path = download_media(logger, image_url, USERNAME, "jpg")
+                # キャッシュキーが変わっただけの再配信・再アップロードはGBPに投稿しない
+                if path and not filter_near_duplicates([path], USERNAME, None, logger):
+                    return 1
 
             else:
-                driver.quit()
                 return 1
 
-            driver.quit()
             logger.info("処理終了")
             return 0
 
@@ -993,7 +711,6 @@ def main():
             error_msg = "画像の取得に失敗しました"
             logger.info(error_msg)
             print(error_msg)
-            driver.quit()
             logger.info("処理終了")
             return 1
 
@@ -1004,7 +721,7 @@ def main():
         print(f"ファイルパス: {filepath}")
 
         # ディレクトリパスを構築
-        description_dir = os.path.join("media", USERNAME, "description")
+        description_dir = os.path.join(MEDIA_DIR, USERNAME, "description")
         if not os.path.exists(description_dir):
             os.makedirs(description_dir)
 
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+アカウントの訪問計画（account_scheduler.py）のテスト用スクリプト
+使用方法: python test_account_scheduler.py
+（一時DBを使うため、.env の DB_NAME は変更しません）
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 訪問履歴の保存先を一時DBにする（db.py の接続より先に設定する）
+TEMP_DIR = tempfile.mkdtemp(prefix="account_scheduler_")
+os.environ["DB_NAME"] = str(Path(TEMP_DIR) / "test.db")
+
+import db
+from account_scheduler import (
+    MAX_REVISIT_SECONDS,
+    MIN_PROBABILITY,
+    ProfileThrottle,
+    get_account_stats,
+    new_content_probability,
+    plan_cycle,
+    record_visit,
+)
+
+logger = logging.getLogger("test_account_scheduler")
+
+HOUR = 3600
+
+
+def _stats(last_visit, median_interval=None, hit_rate=0.5, mean_visit_gap=HOUR):
+    return {
+        "last_visit": last_visit,
+        "median_interval": median_interval,
+        "hit_rate": hit_rate,
+        "mean_visit_gap": mean_visit_gap,
+    }
+
+
+def test_probability_bounds():
+    """未訪問は1.0、訪問直後は0、経過時間とともに増えて1を超えない"""
+    now = 1_000_000_000
+    assert new_content_probability(_stats(None), now) == 1.0
+    assert new_content_probability(_stats(now, median_interval=HOUR), now) == 0.0
+    # 時計が戻った場合も負にならない
+    assert new_content_probability(_stats(now + HOUR, median_interval=HOUR), now) == 0.0
+
+    previous = 0.0
+    for hours in (0.1, 1, 6, 24, 24 * 30):
+        p = new_content_probability(_stats(now - hours * HOUR, median_interval=HOUR), now)
+        assert previous <= p <= 1.0
+        previous = p
+    assert previous > 0.999
+
+
+def test_probability_without_interval():
+    """投稿間隔が分からない場合はヒット率と訪問間隔から求める"""
+    now = 1_000_000_000
+    rare = new_content_probability(_stats(now - HOUR, hit_rate=0.1), now)
+    often = new_content_probability(_stats(now - HOUR, hit_rate=0.9), now)
+    assert 0.0 < rare < often < 1.0
+
+
+def test_min_probability_and_max_revisit():
+    """確率が MIN_PROBABILITY 未満なら見送り、MAX_REVISIT を過ぎたら確率が低くても訪問する"""
+    now = time.time()
+    # 1日おきに投稿するアカウント（投稿間隔の中央値 = 1日、GLINK_v2 は投稿のみ確認する）
+    for user_name in ("sched_recent", "sched_overdue"):
+        for day in range(5, 1, -1):
+            record_visit(user_name, "post", True, visited_at=now - day * 24 * HOUR)
+
+    # 直前に訪問したアカウントは確率が MIN_PROBABILITY 未満
+    record_visit("sched_recent", "post", False, visited_at=now - 60)
+    stats = get_account_stats("sched_recent", "post")
+    assert new_content_probability(stats, now) < MIN_PROBABILITY
+
+    # MAX_REVISIT を過ぎたアカウントは、確率に関係なく訪問する
+    record_visit("sched_overdue", "post", False, visited_at=now - MAX_REVISIT_SECONDS - 60)
+
+    commands = [["GLINK_v2", "sched_recent"], ["GLINK_v2", "sched_overdue"], ["GLINK_v2", "sched_never"], ["broken"]]
+    planned = plan_cycle(commands, logger, now=now)
+    planned_users = [command[-1] for _, command, _ in planned]
+    assert "sched_recent" not in planned_users
+    assert "sched_overdue" in planned_users
+    assert "sched_never" in planned_users
+    # 不正なコマンドは実行側でエラーを出すため残す
+    assert "broken" in planned_users
+    assert [p for _, _, p in planned] == sorted((p for _, _, p in planned), reverse=True)
+
+
+def test_profile_throttle():
+    """同じプロファイルは最低間隔を空け、初回・別のプロファイルは待たない"""
+    original = os.environ.get("PROFILE_MIN_INTERVAL")
+    os.environ["PROFILE_MIN_INTERVAL"] = "0.3"
+    try:
+        throttle = ProfileThrottle()
+        started = time.monotonic()
+        throttle.wait("profile_a", logger)
+        assert time.monotonic() - started < 0.1
+
+        throttle.mark("profile_a")
+        started = time.monotonic()
+        throttle.wait("profile_b", logger)
+        assert time.monotonic() - started < 0.1
+
+        throttle.wait("profile_a", logger)
+        assert time.monotonic() - started >= 0.25
+    finally:
+        if original is None:
+            os.environ.pop("PROFILE_MIN_INTERVAL", None)
+        else:
+            os.environ["PROFILE_MIN_INTERVAL"] = original
+
+
+def main():
+    tests = [
+        test_probability_bounds,
+        test_probability_without_interval,
+        test_min_probability_and_max_revisit,
+        test_profile_throttle,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError:
+            failed += 1
+            print(f"❌ {test.__name__}: {test.__doc__}")
+
+    db.close_connection()
+    print(f"\n結果: {len(tests) - failed}/{len(tests)}件成功（一時DB: {os.environ['DB_NAME']}）")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+スキーマのマイグレーション（db_migrate.py）のテスト用スクリプト
+使用方法: python test_db_migrate.py
+（一時DBを使うため、.env の DB_NAME は変更しません）
+"""
+
+import shutil
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+from db_migrate import MIGRATIONS, current_version, migrate
+
+TEMP_DIR = tempfile.mkdtemp(prefix="db_migrate_")
+LATEST = MIGRATIONS[-1][0]
+
+
+def _connect(name):
+    # migrate は自動コミットの接続を受け取る
+    return sqlite3.connect(str(Path(TEMP_DIR) / name), isolation_level=None)
+
+
+def _schema(conn):
+    return conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+
+
+def test_versions_are_ordered():
+    """バージョンは1から連番で、重複がない"""
+    versions = [version for version, _, _ in MIGRATIONS]
+    assert versions == list(range(1, len(MIGRATIONS) + 1))
+
+
+def test_migrate_twice():
+    """同じDBに2回実行しても、2回目は何も適用せずスキーマも変わらない"""
+    conn = _connect("twice.db")
+    try:
+        assert migrate(conn) == list(range(1, LATEST + 1))
+        assert current_version(conn) == LATEST
+        schema = _schema(conn)
+
+        assert migrate(conn) == []
+        assert current_version(conn) == LATEST
+        assert _schema(conn) == schema
+        assert conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == LATEST
+    finally:
+        conn.close()
+
+
+def test_migrate_from_older_version():
+    """途中のバージョンのDBは残りの手順だけ適用し、最初から作ったDBと同じスキーマになる"""
+    fresh = _connect("fresh.db")
+    older = _connect("older.db")
+    try:
+        migrate(fresh)
+        assert migrate(older, target=LATEST - 1) == list(range(1, LATEST))
+        assert migrate(older) == [LATEST]
+        assert migrate(older) == []
+        assert [row[1:] for row in _schema(older)] == [row[1:] for row in _schema(fresh)]
+    finally:
+        fresh.close()
+        older.close()
+
+
+def main():
+    tests = [
+        test_versions_are_ordered,
+        test_migrate_twice,
+        test_migrate_from_older_version,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError:
+            failed += 1
+            print(f"❌ {test.__name__}: {test.__doc__}")
+
+    shutil.rmtree(TEMP_DIR, ignore_errors=True)
+    print(f"\n結果: {len(tests) - failed}/{len(tests)}件成功")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+常駐ドライバー（--isolation inprocess）のテスト用スクリプト
+使用方法: python test_driver_session.py
+（一時DB・ローカルのHTTPサーバーを使うため、Chromeの起動やInstagramへのアクセスはしません）
+
+スクリプトのフォルダ以外から起動しても、取得したメディアが投稿ジョブ用フォルダに退避されることを確認します。
+"""
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# 一時DBを使う（db.py の接続より先に設定する）
+TEMP_DIR = tempfile.mkdtemp(prefix="driver_session_")
+os.environ["DB_NAME"] = str(Path(TEMP_DIR) / "test.db")
+
+import db
+import driver_session
+import publish_queue
+import scraper_core
+from media_store import file_sha256, store_path
+
+SCRIPT_DIR = Path(__file__).parent.resolve()
+
+# テスト用のメディア（実行ごとに内容を変えてストアの既存ファイルと重ならないようにする）
+MEDIA_BYTES = b"\x00\x00\x00\x18ftypmp42" + uuid.uuid4().bytes * 64
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(len(MEDIA_BYTES)))
+        self.end_headers()
+        self.wfile.write(MEDIA_BYTES)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeDriver:
+    """DriverSession が使う最小限の属性だけを持つドライバー"""
+
+    current_url = "https://www.instagram.com/p/TESTCODE/"
+    glink_lease = {"profile_name": None}
+
+
+def test_paths_do_not_depend_on_cwd():
+    """取得側と投稿ジョブ側のメディアの置き場所・DBファイルがスクリプトのフォルダ基準で一致する"""
+    assert Path(scraper_core.MEDIA_DIR) == SCRIPT_DIR / "media"
+    assert publish_queue.STAGE_DIR.parent.resolve() == SCRIPT_DIR / "media"
+
+    original_name = os.environ["DB_NAME"]
+    try:
+        os.environ["DB_NAME"] = "MEO.db"
+        assert Path(db.db_path()) == SCRIPT_DIR / "MEO.db"
+    finally:
+        os.environ["DB_NAME"] = original_name
+
+
+def test_session_from_other_directory():
+    """別のフォルダから常駐ドライバーで取得しても、stage_media がメディアを見つける"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MediaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/video.mp4"
+
+    user_name = f"test_session_{uuid.uuid4().hex[:8]}"
+    process_id = "20250115_120000"
+    logger = logging.getLogger("test_driver_session")
+
+    def fake_scrape(driver, username, process_id, script_logger):
+        paths = scraper_core.download_media_batch(script_logger, [url], username, "mp4", "TESTCODE")
+        return 0 if all(paths) else 1
+
+    original_cwd = os.getcwd()
+    original_scraper = driver_session.SCRAPERS["post.py"]
+    other_dir = tempfile.mkdtemp(prefix="other_cwd_")
+    media_dir = None
+    try:
+        os.chdir(other_dir)
+        driver_session.SCRAPERS["post.py"] = fake_scrape
+        session = driver_session.DriverSession(None, logger)
+        session.driver = FakeDriver()
+
+        result = session.run("post.py", user_name, process_id)
+        assert result["code"] == 0, result
+        assert not (Path(other_dir) / "media").exists()
+
+        media_dir = publish_queue.stage_media(user_name, process_id, logger)
+        assert media_dir is not None
+        staged = list(media_dir.glob("*.mp4"))
+        assert len(staged) == 1
+        assert staged[0].read_bytes() == MEDIA_BYTES
+    finally:
+        os.chdir(original_cwd)
+        driver_session.SCRAPERS["post.py"] = original_scraper
+        server.shutdown()
+        shutil.rmtree(other_dir, ignore_errors=True)
+        shutil.rmtree(SCRIPT_DIR / "media" / user_name, ignore_errors=True)
+        if media_dir is not None:
+            for path in media_dir.glob("*.mp4"):
+                store_path(file_sha256(path), ".mp4").unlink(missing_ok=True)
+            shutil.rmtree(media_dir, ignore_errors=True)
+
+
+def main():
+    tests = [
+        test_paths_do_not_depend_on_cwd,
+        test_session_from_other_directory,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {test.__doc__} {e}")
+
+    db.close_connection()
+    print(f"\n結果: {len(tests) - failed}/{len(tests)}件成功（一時DB: {os.environ['DB_NAME']}）")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
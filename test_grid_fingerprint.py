@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+グリッドの指紋（grid_fingerprint.py）のテスト用スクリプト
+使用方法: python test_grid_fingerprint.py
+（一時DBを使うため、.env の DB_NAME は変更しません）
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 指紋の保存先を一時DBにする（db.py の接続より先に設定する）
+TEMP_DIR = tempfile.mkdtemp(prefix="grid_fingerprint_")
+os.environ["DB_NAME"] = str(Path(TEMP_DIR) / "test.db")
+
+import db
+from grid_fingerprint import FINGERPRINT_TTL_SECONDS, is_complete, is_unchanged, make_fingerprint, save_fingerprint
+
+
+def test_complete_when_all_confirmed():
+    """すべての候補・メディアを確認できた場合のみ保存してよい"""
+    assert is_complete(6, 6)
+    assert is_complete(3, 3, failed=0)
+
+
+def test_incomplete_when_candidates_missing():
+    """セッション切れ等で日時を取得できなかった候補がある場合は保存しない"""
+    assert not is_complete(6, 4)
+    assert not is_complete(6, 0)
+
+
+def test_incomplete_when_download_failed():
+    """画像・動画の取得に失敗した場合は保存しない"""
+    assert not is_complete(3, 2, failed=1)
+    assert not is_complete(1, 0, failed=1)
+
+
+def test_incomplete_when_nothing_checked():
+    """メディアを1件も確認できなかった（要素の読み込み失敗等）場合は保存しない"""
+    assert not is_complete(0, 0)
+
+
+def test_fingerprint_includes_settings():
+    """開始日・最大経過日数が変わったら別の指紋になる"""
+    a = make_fingerprint(["A", "B"], [True, False], settings="20250101:7")
+    b = make_fingerprint(["A", "B"], [True, False], settings="20250101:30")
+    c = make_fingerprint(["A", "B"], [False, False], settings="20250101:7")
+    assert a != b
+    assert a != c
+
+
+def test_save_and_is_unchanged():
+    """保存した指紋と同じなら変化なし、違う指紋・期限切れなら確認する"""
+    fingerprint = make_fingerprint(["A", "B"], [False, False], settings=":0")
+    assert not is_unchanged("fp_user", fingerprint)
+
+    save_fingerprint("fp_user", fingerprint)
+    assert is_unchanged("fp_user", fingerprint)
+    assert not is_unchanged("fp_user", make_fingerprint(["C", "A"], [False, False], settings=":0"))
+    assert not is_unchanged("other_user", fingerprint)
+    assert not is_unchanged("fp_user", fingerprint, now=time.time() + FINGERPRINT_TTL_SECONDS + 1)
+
+
+def main():
+    tests = [
+        test_complete_when_all_confirmed,
+        test_incomplete_when_candidates_missing,
+        test_incomplete_when_download_failed,
+        test_incomplete_when_nothing_checked,
+        test_fingerprint_includes_settings,
+        test_save_and_is_unchanged,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError:
+            failed += 1
+            print(f"❌ {test.__name__}: {test.__doc__}")
+
+    db.close_connection()
+    print(f"\n結果: {len(tests) - failed}/{len(tests)}件成功（一時DB: {os.environ['DB_NAME']}）")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+アカウント定義（job_registry.py）のテスト用スクリプト
+使用方法: python test_job_registry.py
+（一時フォルダの定義ファイルを使うため、accounts.json・GLINK_LIST.txt・.env は変更しません）
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# プロセス内で共有する定義を一時フォルダのファイルにする（job_registry.py の読み込みより先に設定する）
+TEMP_DIR = Path(tempfile.mkdtemp(prefix="job_registry_"))
+os.environ["GLINK_REGISTRY"] = str(TEMP_DIR / "accounts.json")
+
+import job_registry
+from job_registry import JobRegistry, _parse_bool, get_account_settings
+
+# .env の代わりに使う設定（テスト用のユーザー名なので既存の設定とは重ならない）
+ENV = {
+    "test_legacy_a": "111",
+    "test_legacy_a_num2": "222",
+    "test_legacy_a_num3": "333",
+    "test_legacy_a_start": "20250101",
+    "test_legacy_b": "444",
+    "test_legacy_b_max_age_days": "7",
+}
+
+
+def _write_json(path, data, mtime=None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def _registry(name):
+    """定義ファイルがまだないレジストリ（旧形式のリストは TEMP_DIR/<name>.txt）"""
+    return JobRegistry(path=TEMP_DIR / f"{name}.json", legacy_path=TEMP_DIR / f"{name}.txt")
+
+
+def test_parse_bool():
+    """真偽値・0/1・よく使う文字列は受け付け、それ以外は ValueError"""
+    for value in (True, 1, "true", "TRUE", " yes ", "on", "1"):
+        assert _parse_bool(value, "test") is True
+    for value in (False, 0, "false", "No", "off", "0"):
+        assert _parse_bool(value, "test") is False
+    for value in (2, -1, "", "enabled", None, 1.0):
+        try:
+            _parse_bool(value, "test")
+        except ValueError:
+            continue
+        raise AssertionError(f"{value!r} が受け付けられました")
+
+
+def test_legacy_list_with_env():
+    """定義ファイルがなければ GLINK_LIST.txt と .env から組み立てる"""
+    registry = _registry("legacy")
+    with open(registry.legacy_path, "w", encoding="utf-8") as f:
+        f.write("GLINK_v3 test_legacy_a\n\nbroken line here\nGLINK test_legacy_b\n")
+
+    assert registry.reload_if_changed()
+    assert registry.source == registry.legacy_path
+    assert registry.commands() == [["GLINK_v3", "test_legacy_a"], ["GLINK", "test_legacy_b"]]
+
+    a = registry.get_account("test_legacy_a")
+    assert a["business_ids"] == ["111", "222", "333"]
+    assert a["start_date"] == "20250101"
+    b = registry.get_account("test_legacy_b")
+    assert b["business_ids"] == ["444"]
+    assert b["max_age_days"] == 7
+    assert b["enabled"] is True
+
+    # 変更がなければ読み直さない
+    assert not registry.reload_if_changed()
+
+
+def test_registry_file_takes_precedence():
+    """定義ファイルができたらそちらを使い、既定値・優先度・無効化を反映する"""
+    registry = _registry("precedence")
+    with open(registry.legacy_path, "w", encoding="utf-8") as f:
+        f.write("GLINK test_legacy_a\n")
+    assert registry.reload_if_changed()
+
+    _write_json(registry.path, {
+        "defaults": {"mode": "GLINK_v2", "max_age_days": 30},
+        "accounts": [
+            {"username": "low", "business_ids": "1"},
+            {"username": "high", "priority": 5},
+            {"username": "off", "enabled": "false"},
+        ],
+    })
+    assert registry.reload_if_changed()
+    assert registry.source == registry.path
+    assert registry.commands() == [["GLINK_v2", "high"], ["GLINK_v2", "low"]]
+    assert registry.get_account("low")["business_ids"] == ["1"]
+    assert registry.get_account("low")["max_age_days"] == 30
+    assert registry.get_account("off")["enabled"] is False
+
+
+def test_broken_file_keeps_previous():
+    """編集途中などで読めない定義は無視し、前回の定義で続行する"""
+    registry = _registry("broken")
+    mtime = time.time() - 10
+    _write_json(registry.path, {"accounts": [{"username": "keep"}]}, mtime=mtime)
+    assert registry.reload_if_changed()
+
+    for broken in ('{"accounts": [', '{"accounts": [{"username": "x", "enabled": "maybe"}]}'):
+        mtime += 1
+        with open(registry.path, "w", encoding="utf-8") as f:
+            f.write(broken)
+        os.utime(registry.path, (mtime, mtime))
+        assert not registry.reload_if_changed()
+        assert registry.commands() == [["GLINK_v3", "keep"]]
+
+
+def test_get_account_settings_env_fallback():
+    """共有の定義にないユーザーは .env の設定を使う"""
+    _write_json(job_registry.REGISTRY_PATH, {"accounts": [{"username": "listed", "business_ids": ["9"]}]})
+    assert get_account_settings("listed")["business_ids"] == ["9"]
+
+    settings = get_account_settings("test_legacy_a")
+    assert settings["business_ids"] == ["111", "222", "333"]
+    assert settings["start_date"] == "20250101"
+    assert settings["mode"] == "GLINK_v3"
+
+
+def main():
+    tests = [
+        test_parse_bool,
+        test_legacy_list_with_env,
+        test_registry_file_takes_precedence,
+        test_broken_file_keeps_previous,
+        test_get_account_settings_env_fallback,
+    ]
+
+    original_env = {key: os.environ.get(key) for key in ENV}
+    os.environ.update(ENV)
+    failed = 0
+    try:
+        for test in tests:
+            try:
+                test()
+                print(f"✅ {test.__name__}")
+            except AssertionError as e:
+                failed += 1
+                print(f"❌ {test.__name__}: {test.__doc__} {e}")
+    finally:
+        for key, value in original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    print(f"\n結果: {len(tests) - failed}/{len(tests)}件成功")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+メディアのダウンロード（media_downloader.py）のテスト用スクリプト
+使用方法: python test_media_downloader.py
+（ローカルのHTTPサーバーを使うため、Instagramへのアクセスはしません）
+"""
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+# 途中ファイルの置き場所を一時フォルダにする（media_downloader.py の読み込みより先に設定する）
+TEMP_DIR = Path(tempfile.mkdtemp(prefix="media_downloader_"))
+os.environ["DOWNLOAD_PARTIAL_DIR"] = str(TEMP_DIR / "partial")
+
+from media_downloader import (
+    byte_range_of,
+    download_ranged,
+    download_stream,
+    partial_paths,
+    stream_partial_path,
+    with_byte_range,
+)
+
+logger = logging.getLogger("test_media_downloader")
+
+MEDIA_BYTES = bytes(range(256)) * 20
+CHUNK_BYTES = 1000
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """bytestart / byteend（URL）と Range ヘッダーの両方に応じるサーバー"""
+
+    # 失敗させる区間の開始位置と、受け取った区間・Rangeヘッダーの記録
+    fail_starts = set()
+    requests = []
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        range_header = self.headers.get("Range")
+        status = 200
+        start, end = 0, len(MEDIA_BYTES) - 1
+        if "bytestart" in params:
+            start, end = int(params["bytestart"][0]), int(params["byteend"][0])
+        elif range_header:
+            start = int(range_header.split("=", 1)[1].rstrip("-"))
+            status = 206
+        MediaHandler.requests.append((start, end, range_header))
+
+        if start in MediaHandler.fail_starts:
+            self.send_error(404)
+            return
+
+        body = MEDIA_BYTES[start:end + 1]
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(MEDIA_BYTES)}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MediaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    MediaHandler.fail_starts = set()
+    MediaHandler.requests = []
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_with_byte_range():
+    """bytestart / byteend だけを差し替え、他のパラメータは表記・順序のまま残す"""
+    url = "https://cdn.example.com/v/t.mp4?efg=abc%3D%3D&bytestart=100&_nc_ht=x&byteend=200&oh=sig"
+    replaced = with_byte_range(url, 0, 4999)
+    assert replaced == "https://cdn.example.com/v/t.mp4?efg=abc%3D%3D&_nc_ht=x&oh=sig&bytestart=0&byteend=4999"
+    assert byte_range_of(replaced) == (0, 4999)
+    assert byte_range_of(with_byte_range("https://cdn.example.com/a.mp4", 5, 9)) == (5, 9)
+    assert byte_range_of("https://cdn.example.com/a.mp4?bytestart=x&byteend=1") is None
+    assert byte_range_of("https://cdn.example.com/a.mp4") is None
+
+
+def test_partial_paths_ignore_signature():
+    """署名やホスト名が変わっても同じ動画なら同じ途中ファイルを使う"""
+    a = partial_paths("https://a.example.com/v/t.mp4?oh=1&bytestart=0&byteend=99", 100)
+    b = partial_paths("https://b.example.com/v/t.mp4?oh=2&bytestart=0&byteend=99", 100)
+    c = partial_paths("https://a.example.com/v/t.mp4?oh=1&bytestart=0&byteend=199", 200)
+    assert a == b
+    assert a != c
+
+
+def test_ranged_resume():
+    """失敗した区間だけを次回に取得し、元と同じ内容になる"""
+    server, base = _serve()
+    try:
+        url = with_byte_range(f"{base}/v/ranged.mp4?oh=sig", 0, len(MEDIA_BYTES) - 1)
+        filename = TEMP_DIR / "ranged.mp4"
+        MediaHandler.fail_starts = {2000}
+        try:
+            download_ranged(url, str(filename), logger, chunk_bytes=CHUNK_BYTES, workers=2)
+            raise AssertionError("失敗した区間があるのに完了しました")
+        except IOError:
+            pass
+        assert not filename.exists()
+        part_path, progress_path = partial_paths(url, len(MEDIA_BYTES))
+        assert os.path.exists(part_path) and os.path.exists(progress_path)
+
+        MediaHandler.fail_starts = set()
+        MediaHandler.requests = []
+        assert download_ranged(url, str(filename), logger, chunk_bytes=CHUNK_BYTES, workers=2)
+        assert [(start, end) for start, end, _ in MediaHandler.requests] == [(2000, 2999)]
+        assert filename.read_bytes() == MEDIA_BYTES
+        assert not os.path.exists(part_path) and not os.path.exists(progress_path)
+    finally:
+        server.shutdown()
+
+
+def test_stream_resume_with_range_header():
+    """一括取得の途中ファイルがあれば Range ヘッダーで続きから取得する"""
+    server, base = _serve()
+    try:
+        url = f"{base}/v/stream.jpg"
+        part_path = stream_partial_path(url)
+        os.makedirs(os.path.dirname(part_path), exist_ok=True)
+        with open(part_path, "wb") as f:
+            f.write(MEDIA_BYTES[:1234])
+
+        filename = TEMP_DIR / "stream.jpg"
+        assert download_stream(url, str(filename))
+        assert [header for _, _, header in MediaHandler.requests] == ["bytes=1234-"]
+        assert filename.read_bytes() == MEDIA_BYTES
+        assert not os.path.exists(part_path)
+    finally:
+        server.shutdown()
+
+
+def main():
+    tests = [
+        test_with_byte_range,
+        test_partial_paths_ignore_signature,
+        test_ranged_resume,
+        test_stream_resume_with_range_header,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {test.__doc__} {e}")
+
+    shutil.rmtree(TEMP_DIR, ignore_errors=True)
+    print(f"\n結果: {len(tests) - failed}/{len(tests)}件成功")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+類似画像の索引（phash_index.py）のテスト用スクリプト
+使用方法: python test_phash_index.py
+（一時DBを使うため、.env の DB_NAME は変更しません）
+"""
+
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+# 一時DBを使う（db.py の接続より先に設定する）
+TEMP_DIR = tempfile.mkdtemp(prefix="phash_index_")
+os.environ["DB_NAME"] = str(Path(TEMP_DIR) / "test.db")
+
+import db
+from phash_index import CHUNK_BITS, DUPLICATE_DISTANCE, HASH_BITS, MultiIndexHashTable, hamming
+
+
+def _flip(value, bits):
+    """指定した位置のビットを反転したハッシュ"""
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def test_threshold_is_inclusive():
+    """距離がちょうど閾値のハッシュは見つかり、閾値+1は見つからない"""
+    base = 0x0123456789ABCDEF
+    index = MultiIndexHashTable()
+    index.add(base, "base")
+
+    # 分割ごとに1ビットずつ反転する（どの分割も一致しない最も厳しい位置）
+    at_threshold = _flip(base, [i * CHUNK_BITS for i in range(DUPLICATE_DISTANCE)])
+    over_threshold = _flip(base, [i * CHUNK_BITS for i in range(DUPLICATE_DISTANCE + 1)])
+    assert hamming(base, at_threshold) == DUPLICATE_DISTANCE
+    assert hamming(base, over_threshold) == DUPLICATE_DISTANCE + 1
+
+    assert index.query(at_threshold) == [(DUPLICATE_DISTANCE, "base")]
+    assert index.query(over_threshold) == []
+
+
+def test_same_as_full_scan():
+    """分割索引の結果は全件比較と一致する（閾値以上の距離も含む）"""
+    rng = random.Random(0)
+    index = MultiIndexHashTable()
+    hashes = []
+    for i in range(2000):
+        value = rng.getrandbits(HASH_BITS)
+        hashes.append(value)
+        index.add(value, i)
+
+    # 登録済みハッシュの近くを検索する
+    for i in range(0, len(hashes), 50):
+        query = _flip(hashes[i], rng.sample(range(HASH_BITS), rng.randint(0, DUPLICATE_DISTANCE + 2)))
+        for max_distance in (DUPLICATE_DISTANCE, DUPLICATE_DISTANCE + 2):
+            expected = sorted(
+                (hamming(query, value), label) for label, value in enumerate(hashes) if hamming(query, value) <= max_distance
+            )
+            assert sorted(index.query(query, max_distance)) == expected
+
+
+def test_results_sorted_by_distance():
+    """結果は距離の近い順"""
+    base = 0
+    index = MultiIndexHashTable()
+    index.add(_flip(base, [0, 20]), "two")
+    index.add(base, "zero")
+    index.add(_flip(base, [40]), "one")
+    assert [label for _, label in index.query(base)] == ["zero", "one", "two"]
+
+
+def main():
+    tests = [
+        test_threshold_is_inclusive,
+        test_same_as_full_scan,
+        test_results_sorted_by_distance,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError:
+            failed += 1
+            print(f"❌ {test.__name__}: {test.__doc__}")
+
+    db.close_connection()
+    print(f"\n結果: {len(tests) - failed}/{len(tests)}件成功（一時DB: {os.environ['DB_NAME']}）")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
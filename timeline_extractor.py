@@ -0,0 +1,163 @@
+# 標準ライブラリのインポート
+import base64
+import json
+import re
+from datetime import datetime, timezone
+
+# 自作モジュールのインポート
+from perf_log import iter_events
+
+# プロフィールの投稿一覧（タイムライン）を返すAPIのURL
+TIMELINE_URL_PATTERNS = (
+    "/api/v1/feed/user/",
+    "/api/graphql",
+    "/graphql/query",
+    "/api/v1/users/web_profile_info/",
+    "/api/v1/media/",
+)
+
+# media_type の値（Instagram API）
+MEDIA_TYPES = {1: "image", 2: "video", 8: "carousel"}
+GRAPH_TYPES = {"GraphImage": "image", "GraphVideo": "video", "GraphSidecar": "carousel"}
+
+SHORTCODE_PATTERN = re.compile(r"/(?:p|reel)/([^/?#]+)")
+
+
+### タイムラインの投稿情報取得 ###
+def extract_timeline_posts(driver, logger, logs=None):
+    """プロフィールページ読み込み時のタイムラインAPIの応答から投稿情報を取り出す
+
+    パフォーマンスログから該当する応答を探し、CDPの Network.getResponseBody で本文を取得する。
+    ページ遷移せずに投稿日時・ピン留め・カルーセルのメディアが分かる。
+
+    Args:
+        driver: WebDriver（goog:loggingPrefs で performance を有効にしていること）
+        logger: ロガー
+        logs: 取得済みのパフォーマンスログ（省略時はここで取得）
+
+    Returns:
+        dict: shortcode -> {shortcode, taken_at, pinned, media_type, media}
+    """
+    if logs is None:
+        logs = driver.get_log("performance")
+
+    posts = {}
+    for request_id, url in find_timeline_responses(logs):
+        try:
+            result = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+        except Exception as e:
+            # ページ遷移等で本文が破棄されている場合
+            logger.info(f"タイムライン応答の本文を取得できませんでした: {url} - {e}")
+            continue
+
+        body = result.get("body", "")
+        if result.get("base64Encoded"):
+            body = base64.b64decode(body).decode("utf-8", errors="replace")
+        try:
+            data = json.loads(body)
+        except json.JSONDecodeError:
+            continue
+
+        for post in iter_media_nodes(data):
+            # 同じ投稿が複数の応答に含まれる場合は情報の多い方を残す
+            current = posts.get(post["shortcode"])
+            if current is None or len(post["media"]) > len(current["media"]):
+                posts[post["shortcode"]] = post
+
+    logger.info(f"タイムライン応答から投稿情報を取得しました: {len(posts)}件")
+    return posts
+
+
+### タイムライン応答の検索 ###
+def find_timeline_responses(logs):
+    """パフォーマンスログから、タイムラインAPIの応答の (requestId, URL) を返す"""
+    responses = []
+    # 全件のJSON解析を避けるため、文字列で先に絞り込む
+    for event in iter_events(logs, "Network.responseReceived", methods=("Network.responseReceived",)):
+        params = event.get("params", {})
+        response = params.get("response", {})
+        url = response.get("url", "")
+        if "json" not in (response.get("mimeType") or "") and "graphql" not in url:
+            continue
+        if any(pattern in url for pattern in TIMELINE_URL_PATTERNS):
+            responses.append((params.get("requestId"), url))
+    return responses
+
+
+### 投稿ノードの列挙 ###
+def iter_media_nodes(data):
+    """応答JSONを再帰的にたどり、投稿（shortcodeと投稿時刻を持つノード）を返す"""
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, dict):
+            continue
+
+        post = parse_media_node(node)
+        if post:
+            yield post
+            # カルーセルの子要素は投稿として数えない
+            continue
+        stack.extend(node.values())
+
+
+def parse_media_node(node):
+    shortcode = node.get("code") or node.get("shortcode")
+    taken_at = node.get("taken_at") or node.get("taken_at_timestamp")
+    if not shortcode or not isinstance(taken_at, (int, float)):
+        return None
+
+    if "media_type" in node:
+        media_type = MEDIA_TYPES.get(node.get("media_type"), "image")
+    else:
+        media_type = GRAPH_TYPES.get(node.get("__typename"), "image")
+
+    return {
+        "shortcode": shortcode,
+        "taken_at": datetime.fromtimestamp(taken_at, timezone.utc),
+        "pinned": is_pinned_node(node),
+        "media_type": media_type,
+        "media": extract_media_urls(node),
+    }
+
+
+def is_pinned_node(node):
+    if node.get("pinned_for_users") or node.get("timeline_pinned_user_ids"):
+        return True
+    return bool(node.get("is_pinned"))
+
+
+### メディアURLの取得 ###
+def extract_media_urls(node):
+    """投稿のメディアを [{type, url}] で返す（カルーセルは子要素ごと）"""
+    children = node.get("carousel_media")
+    if children is None:
+        sidecar = node.get("edge_sidecar_to_children", {}).get("edges")
+        if sidecar:
+            children = [edge.get("node", {}) for edge in sidecar]
+    if not children:
+        children = [node]
+
+    media = []
+    for child in children:
+        video_versions = child.get("video_versions") or []
+        candidates = child.get("image_versions2", {}).get("candidates") or []
+        if video_versions:
+            media.append({"type": "mp4", "url": video_versions[0].get("url")})
+        elif child.get("video_url"):
+            media.append({"type": "mp4", "url": child["video_url"]})
+        elif candidates:
+            # 先頭が最大解像度
+            media.append({"type": "jpg", "url": candidates[0].get("url")})
+        elif child.get("display_url"):
+            media.append({"type": "jpg", "url": child["display_url"]})
+    return [m for m in media if m["url"]]
+
+
+### URLからshortcode取得 ###
+def shortcode_from_url(url):
+    match = SHORTCODE_PATTERN.search(url or "")
+    return match.group(1) if match else None